@@ -0,0 +1,324 @@
+"""
+Audit Log Partitions for KMED Backend
+Monthly partition maintenance, archival and archive queries for audit_logs
+
+On PostgreSQL audit_logs is range-partitioned by month on created_at (see
+migration 0002). `maintain` creates the partitions for the coming months;
+`archive` detaches every partition older than AUDIT_RETENTION_MONTHS, writes it
+to AUDIT_ARCHIVE_DIR as gzip-compressed NDJSON and drops it. On other databases
+the same months are exported and then deleted from the plain table. Archived
+rows stay searchable with `query` or GET /admin/audit-archive.
+
+Usage:
+    python audit_partitions.py maintain [--months-ahead N]
+    python audit_partitions.py archive [--retention-months N]
+    python audit_partitions.py list
+    python audit_partitions.py query [--user-id U] [--action A] [--resource-id R] [--start DATE] [--end DATE]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select, delete, text
+
+from database import engine, AuditLog
+
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "3"))
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "audit_archive")
+AUDIT_ARCHIVE_BATCH_SIZE = 5000
+
+PARENT_TABLE = "audit_logs"
+DEFAULT_PARTITION = "audit_logs_default"
+PARTITION_PATTERN = re.compile(r"^audit_logs_y(\d{4})m(\d{2})$")
+ARCHIVE_PATTERN = re.compile(r"^audit_logs_(\d{4})_(\d{2})\.ndjson\.gz$")
+
+COLUMNS = [column.name for column in AuditLog.__table__.columns]
+
+
+def add_months(month: date, count: int) -> date:
+    """First day of the month ``count`` months after ``month``"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(value=None) -> date:
+    value = value or datetime.utcnow()
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"audit_logs_y{month.year:04d}m{month.month:02d}"
+
+
+def archive_path(month: date, archive_dir: str = AUDIT_ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"audit_logs_{month.year:04d}_{month.month:02d}.ndjson.gz")
+
+
+def is_partitioned(bind=engine) -> bool:
+    """Whether audit_logs is a partitioned PostgreSQL table"""
+    if bind.dialect.name != "postgresql":
+        return False
+    with bind.connect() as connection:
+        return connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name)"
+        ), {"name": PARENT_TABLE}).scalar()
+
+
+def list_partitions(bind=engine) -> List[Dict[str, Any]]:
+    """Monthly partition tables, attached or detached but not yet archived"""
+    with bind.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT c.relname, i.inhparent IS NOT NULL, c.reltuples::bigint FROM pg_class c "
+            "LEFT JOIN pg_inherits i ON i.inhrelid = c.oid "
+            "WHERE c.relkind = 'r' AND c.relname LIKE 'audit\\_logs\\_y%' ORDER BY c.relname"
+        )).all()
+
+    partitions = []
+    for name, attached, estimated_rows in rows:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append({
+                "name": name,
+                "month": date(int(match.group(1)), int(match.group(2)), 1),
+                "attached": attached,
+                "estimated_rows": max(estimated_rows, 0)
+            })
+    return partitions
+
+
+def ensure_partitions(months_ahead: int = AUDIT_PARTITION_MONTHS_AHEAD, bind=engine) -> List[str]:
+    """Create missing partitions from this month through ``months_ahead`` months ahead
+
+    Each partition is built detached, takes over any rows that landed in the
+    default partition for its range, and is then attached, so the default
+    partition never blocks the new range.
+    """
+    existing = {partition["name"] for partition in list_partitions(bind)}
+    created = []
+    current = month_start()
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        bounds = {"start": month, "end": add_months(month, 1)}
+        with bind.begin() as connection:
+            connection.execute(text(
+                f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ))
+            connection.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                f"WHERE created_at >= :start AND created_at < :end RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ), bounds)
+            connection.execute(text(
+                f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+            ))
+        created.append(name)
+    return created
+
+
+def _row_to_dict(row) -> Dict[str, Any]:
+    data = dict(row._mapping)
+    if data.get("created_at") is not None:
+        data["created_at"] = data["created_at"].isoformat()
+    return data
+
+
+def _export(connection, statement, path: str) -> Dict[str, Any]:
+    """Stream the rows of ``statement`` into a gzip NDJSON file, replacing it atomically"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = path + ".partial"
+    digest = hashlib.sha256()
+    rows = 0
+    result = connection.execution_options(stream_results=True, yield_per=AUDIT_ARCHIVE_BATCH_SIZE).execute(statement)
+    with gzip.open(partial, "wt", encoding="utf-8") as archive:
+        for row in result:
+            line = json.dumps(_row_to_dict(row), separators=(",", ":")) + "\n"
+            archive.write(line)
+            digest.update(line.encode())
+            rows += 1
+    os.replace(partial, path)
+    return {"path": path, "rows": rows, "sha256": digest.hexdigest()}
+
+
+def _write_manifest(month: date, export: Dict[str, Any], archive_dir: str):
+    manifest = {**export, "month": month.isoformat(), "archived_at": datetime.utcnow().isoformat()}
+    with open(archive_path(month, archive_dir)[:-len(".ndjson.gz")] + ".manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def archive_partition(name: str, archive_dir: str = AUDIT_ARCHIVE_DIR, bind=engine) -> Dict[str, Any]:
+    """Detach one monthly partition, export it and drop it
+
+    A partition whose export fails stays detached; the next run picks it up.
+    """
+    match = PARTITION_PATTERN.match(name)
+    if not match:
+        raise ValueError(f"Not an audit log partition: {name}")
+    month = date(int(match.group(1)), int(match.group(2)), 1)
+
+    with bind.begin() as connection:
+        attached = connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:name AS regclass))"
+        ), {"name": name}).scalar()
+        if attached:
+            connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+
+    with bind.connect() as connection:
+        export = _export(connection, text(f"SELECT {', '.join(COLUMNS)} FROM {name} ORDER BY created_at, id"),
+                         archive_path(month, archive_dir))
+    with bind.begin() as connection:
+        expected = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        if expected != export["rows"]:
+            raise RuntimeError(f"Archive of {name} has {export['rows']} rows, table has {expected}")
+        _write_manifest(month, export, archive_dir)
+        connection.execute(text(f"DROP TABLE {name}"))
+    return {"month": month.isoformat(), **export}
+
+
+def archive_month(month: date, archive_dir: str = AUDIT_ARCHIVE_DIR, bind=engine) -> Dict[str, Any]:
+    """Export one month from an unpartitioned audit_logs table and delete it"""
+    in_month = (AuditLog.created_at >= month) & (AuditLog.created_at < add_months(month, 1))
+    with bind.begin() as connection:
+        export = _export(connection, select(*AuditLog.__table__.columns).where(in_month)
+                         .order_by(AuditLog.created_at, AuditLog.id), archive_path(month, archive_dir))
+        deleted = connection.execute(delete(AuditLog).where(in_month)).rowcount
+        if deleted != export["rows"]:
+            raise RuntimeError(f"Archive of {month:%Y-%m} has {export['rows']} rows, deleted {deleted}")
+        _write_manifest(month, export, archive_dir)
+    return {"month": month.isoformat(), **export}
+
+
+def archive_expired(retention_months: int = AUDIT_RETENTION_MONTHS, archive_dir: str = AUDIT_ARCHIVE_DIR,
+                    bind=engine) -> List[Dict[str, Any]]:
+    """Archive every month that ended more than ``retention_months`` months ago"""
+    cutoff = add_months(month_start(), -retention_months)
+    if is_partitioned(bind):
+        return [
+            archive_partition(partition["name"], archive_dir, bind)
+            for partition in list_partitions(bind) if partition["month"] < cutoff
+        ]
+
+    with bind.connect() as connection:
+        oldest = connection.execute(
+            select(AuditLog.created_at).where(AuditLog.created_at < cutoff)
+            .order_by(AuditLog.created_at).limit(1)
+        ).scalar()
+    archived = []
+    month = month_start(oldest) if oldest else cutoff
+    while month < cutoff:
+        archived.append(archive_month(month, archive_dir, bind))
+        month = add_months(month, 1)
+    return archived
+
+
+def list_archives(archive_dir: str = AUDIT_ARCHIVE_DIR) -> List[Dict[str, Any]]:
+    """Archived months available in ``archive_dir``, oldest first"""
+    if not os.path.isdir(archive_dir):
+        return []
+    archives = []
+    for filename in sorted(os.listdir(archive_dir)):
+        match = ARCHIVE_PATTERN.match(filename)
+        if match:
+            path = os.path.join(archive_dir, filename)
+            archives.append({
+                "month": date(int(match.group(1)), int(match.group(2)), 1),
+                "path": path,
+                "bytes": os.path.getsize(path)
+            })
+    return archives
+
+
+def query_archives(user_id: Optional[str] = None, action: Optional[str] = None,
+                   resource_type: Optional[str] = None, resource_id: Optional[str] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   limit: Optional[int] = None, archive_dir: str = AUDIT_ARCHIVE_DIR) -> Iterator[Dict[str, Any]]:
+    """Stream archived audit rows matching every given filter, oldest first
+
+    Only the files for months overlapping [start, end) are read.
+    """
+    filters = {"user_id": user_id, "action": action, "resource_type": resource_type, "resource_id": resource_id}
+    filters = {name: value for name, value in filters.items() if value is not None}
+    first_month = month_start(start) if start else None
+    last_month = month_start(end) if end else None
+    matched = 0
+    for archive in list_archives(archive_dir):
+        if (first_month and archive["month"] < first_month) or (last_month and archive["month"] > last_month):
+            continue
+        with gzip.open(archive["path"], "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if any(record.get(name) != value for name, value in filters.items()):
+                    continue
+                created_at = datetime.fromisoformat(record["created_at"]) if record.get("created_at") else None
+                if start is not None and (created_at is None or created_at < start):
+                    continue
+                if end is not None and (created_at is None or created_at >= end):
+                    continue
+                yield record
+                matched += 1
+                if limit is not None and matched >= limit:
+                    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain, archive and search audit log partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    maintain = commands.add_parser("maintain", help="Create partitions for the coming months")
+    maintain.add_argument("--months-ahead", type=int, default=AUDIT_PARTITION_MONTHS_AHEAD)
+    archive = commands.add_parser("archive", help="Archive and drop months past retention")
+    archive.add_argument("--retention-months", type=int, default=AUDIT_RETENTION_MONTHS)
+    commands.add_parser("list", help="List partitions and archives")
+    query = commands.add_parser("query", help="Search archived audit rows as NDJSON")
+    query.add_argument("--user-id")
+    query.add_argument("--action")
+    query.add_argument("--resource-type")
+    query.add_argument("--resource-id")
+    query.add_argument("--start", type=datetime.fromisoformat, help="Inclusive ISO date or datetime")
+    query.add_argument("--end", type=datetime.fromisoformat, help="Exclusive ISO date or datetime")
+    query.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "maintain":
+            if not is_partitioned():
+                print("⚠️  audit_logs is not partitioned (PostgreSQL with migration 0002 required)")
+                return 0
+            created = ensure_partitions(args.months_ahead)
+            print(f"✅ Created {len(created)} partitions" + (f": {', '.join(created)}" if created else ""))
+        elif args.command == "archive":
+            print(f"📦 Archiving audit logs older than {args.retention_months} months to {AUDIT_ARCHIVE_DIR}")
+            results = archive_expired(args.retention_months)
+            for result in results:
+                print(f"✅ {result['month'][:7]}: {result['rows']:,} rows -> {result['path']}")
+            if not results:
+                print("✅ Nothing to archive")
+        elif args.command == "list":
+            if is_partitioned():
+                for partition in list_partitions():
+                    state = "attached" if partition["attached"] else "detached"
+                    print(f"🗂️  {partition['name']} ({state}, ~{partition['estimated_rows']:,} rows)")
+            for archive_file in list_archives():
+                print(f"📦 {archive_file['month']:%Y-%m} {archive_file['path']} ({archive_file['bytes']:,} bytes)")
+        elif args.command == "query":
+            for record in query_archives(args.user_id, args.action, args.resource_type, args.resource_id,
+                                         args.start, args.end, args.limit):
+                print(json.dumps(record))
+    except Exception as e:
+        print(f"❌ {args.command} failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,89 @@
+"""
+Audit Trail Queries for KMED Backend
+Filtered reads of audit_logs for the /audit page and export endpoints
+
+Each filter combination is served by one of the (..., created_at, id)
+composite indexes on audit_logs. Exports stream rows oldest first through a
+server-side cursor in AUDIT_EXPORT_BATCH_SIZE batches, so memory stays flat
+however many rows match.
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from database import AuditLog
+
+AUDIT_EXPORT_BATCH_SIZE = int(os.getenv("AUDIT_EXPORT_BATCH_SIZE", "5000"))
+AUDIT_PAGE_MAX_SIZE = 1000
+
+# Roles allowed to read the audit trail
+AUDIT_READ_ROLES = ("admin", "regulator")
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+EXPORT_COLUMNS = [column.name for column in AuditLog.__table__.columns]
+
+
+def audit_conditions(user_id: Optional[str] = None, action: Optional[str] = None,
+                     resource_type: Optional[str] = None, resource_id: Optional[str] = None,
+                     start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Any]:
+    """WHERE clauses for the given filters; ``start`` is inclusive, ``end`` exclusive"""
+    conditions = []
+    if user_id:
+        conditions.append(AuditLog.user_id == user_id)
+    if action:
+        conditions.append(AuditLog.action == action)
+    if resource_type:
+        conditions.append(AuditLog.resource_type == resource_type)
+    if resource_id:
+        conditions.append(AuditLog.resource_id == resource_id)
+    if start:
+        conditions.append(AuditLog.created_at >= start)
+    if end:
+        conditions.append(AuditLog.created_at < end)
+    return conditions
+
+
+def _format_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_export(bind, conditions: List[Any], fmt: str = "ndjson",
+                  batch_size: int = AUDIT_EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Yield the matching rows as NDJSON or CSV text, one chunk per fetched batch
+
+    Opens its own connection on ``bind`` so the stream does not depend on the
+    request's session staying open.
+    """
+    statement = (
+        select(*AuditLog.__table__.columns)
+        .where(*conditions)
+        .order_by(AuditLog.created_at, AuditLog.id)
+    )
+    with bind.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(statement)
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+        for rows in result.partitions():
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows([[_format_value(value) for value in row] for row in rows])
+                yield buffer.getvalue()
+            else:
+                yield "".join(
+                    json.dumps({name: _format_value(value) for name, value in row._mapping.items()}) + "\n"
+                    for row in rows
+                )
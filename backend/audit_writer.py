@@ -0,0 +1,366 @@
+"""
+Audit Log Writer for KMED Backend
+Write-behind batching of audit_logs rows with a background flush thread
+
+Routine events are queued and inserted in batches of AUDIT_BATCH_SIZE rows or
+every AUDIT_FLUSH_INTERVAL_MS, whichever comes first. Actions listed in
+AUDIT_SYNC_ACTIONS are critical: they are written in the caller's transaction
+(or immediately, when no session is given) so they commit with the change they
+describe. A full queue falls back to a synchronous write. Any write that still
+fails after AUDIT_FLUSH_RETRIES attempts is retried row by row, and rows that
+cannot be inserted are appended to AUDIT_SPILL_FILE (fsynced NDJSON). The
+writer thread loads the spill file when it starts and after the next
+successful flush; audit rows are never dropped.
+
+Every worker process shares the spill file, so appends and replays hold an
+flock on AUDIT_SPILL_FILE.lock. Spilled rows the database rejects on replay
+(constraint or data errors) are moved to AUDIT_DEAD_LETTER_FILE for manual
+review instead of blocking the rest.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+
+try:
+    import fcntl  # POSIX only; elsewhere the spill file is guarded per process
+except ImportError:
+    fcntl = None
+
+from database import engine, AuditLog
+from ids import new_id
+
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_FLUSH_RETRIES = int(os.getenv("AUDIT_FLUSH_RETRIES", "3"))
+AUDIT_SPILL_FILE = os.getenv("AUDIT_SPILL_FILE", "audit_spill.ndjson")
+AUDIT_DEAD_LETTER_FILE = os.getenv("AUDIT_DEAD_LETTER_FILE", "audit_dead_letter.ndjson")
+AUDIT_REPLAY_BATCH_SIZE = 500
+AUDIT_SYNC_ACTIONS = {
+    action.strip() for action in os.getenv("AUDIT_SYNC_ACTIONS", "update_status,flag_claim,resolve_alert").split(",")
+    if action.strip()
+}
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def build_audit_row(user_id: str, action: str, resource_type: str, resource_id: str,
+                    details: str = None, ip_address: str = None, user_agent: str = None) -> Dict[str, Any]:
+    """Column values for one audit_logs row, timestamped now"""
+    now = datetime.utcnow()
+    return {
+        "id": new_id("AUD"),
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "details": details,
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "created_at": now
+    }
+
+
+class AuditWriter:
+    """Queues audit rows and flushes them from a background thread"""
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE, flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS,
+                 queue_size: int = AUDIT_QUEUE_SIZE, sync_actions=AUDIT_SYNC_ACTIONS, bind=engine,
+                 spill_file: str = AUDIT_SPILL_FILE, dead_letter_file: str = AUDIT_DEAD_LETTER_FILE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.sync_actions = set(sync_actions)
+        self.bind = bind
+        self.spill_file = spill_file
+        self.dead_letter_file = dead_letter_file
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.sync_writes = 0
+        self.overflow_writes = 0
+        self.row_writes = 0
+        self.spilled = 0
+        self.dead_lettered = 0
+        self.failed = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def record(self, user_id: str, action: str, resource_type: str, resource_id: str,
+               details: str = None, ip_address: str = None, user_agent: str = None,
+               db=None, critical: bool = None):
+        """Record an audit event
+
+        Critical events join ``db``'s transaction when a session is given (the
+        caller commits) and are written immediately otherwise.
+        """
+        row = build_audit_row(user_id, action, resource_type, resource_id, details, ip_address, user_agent)
+        if critical is None:
+            critical = action in self.sync_actions
+        if critical:
+            self.sync_writes += 1
+            if db is not None:
+                db.add(AuditLog(**row))
+            else:
+                self._flush([row])
+            return
+        if not self._enqueue(row):
+            self.overflow_writes += 1
+            self._flush([row])
+
+    async def record_async(self, user_id: str, action: str, resource_type: str, resource_id: str,
+                           details: str = None, ip_address: str = None, user_agent: str = None):
+        """Queue a routine event from async code without blocking the event loop"""
+        row = build_audit_row(user_id, action, resource_type, resource_id, details, ip_address, user_agent)
+        if not self._enqueue(row):
+            self.overflow_writes += 1
+            await asyncio.get_running_loop().run_in_executor(None, self._flush, [row])
+
+    def _enqueue(self, row: Dict[str, Any]) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            return False
+        self.enqueued += 1
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self._replay_spill_safely()
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._drain()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        with self.bind.begin() as connection:
+            connection.execute(insert(AuditLog), rows)
+
+    def _flush(self, rows: List[Dict[str, Any]]):
+        """Insert rows with a multi-row INSERT, retrying transient failures, then spilling"""
+        start = time.perf_counter()
+        for attempt in range(1, AUDIT_FLUSH_RETRIES + 1):
+            try:
+                self._write(rows)
+                break
+            except Exception as e:
+                if attempt == AUDIT_FLUSH_RETRIES:
+                    logger.error("Audit flush failed after %d attempts: %s", attempt, e)
+                    self._write_rows(rows)
+                    return
+                time.sleep(0.1 * 2 ** attempt)
+
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        self.written += len(rows)
+        self.batches += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+        # The database is accepting writes again
+        if os.path.exists(self.spill_file):
+            self._replay_spill_safely()
+
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        """Write a failed batch one row at a time and spill the rows that still fail"""
+        failed = []
+        for row in rows:
+            try:
+                self._write([row])
+                self.row_writes += 1
+            except Exception:
+                failed.append(row)
+        if failed:
+            self._spill(failed)
+
+    @contextmanager
+    def _spill_lock(self):
+        """Serialize spill appends and replays across threads and worker processes"""
+        with self._lock, open(f"{self.spill_file}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _append(path: str, rows: List[Dict[str, Any]]):
+        with open(path, "a", encoding="utf-8") as spill:
+            for row in rows:
+                spill.write(json.dumps(row, default=str) + "\n")
+            spill.flush()
+            os.fsync(spill.fileno())
+
+    def _spill(self, rows: List[Dict[str, Any]]):
+        """Append rows to the spill file and fsync it"""
+        try:
+            with self._spill_lock():
+                self._append(self.spill_file, rows)
+            self.spilled += len(rows)
+            logger.error("Spilled %d audit rows to %s", len(rows), self.spill_file)
+        except OSError as e:
+            self.failed += len(rows)
+            # Last resort: keep the rows recoverable from the error log
+            logger.error("Audit spill to %s failed: %s - rows: %s", self.spill_file, e, rows)
+
+    def replay_spill(self) -> int:
+        """Insert spilled rows and remove the spill file; returns the number of rows loaded
+
+        Rows are inserted in batches that fall back to single rows. A row the
+        database rejects while others go in is moved to the dead-letter file;
+        when no row of a batch can be written, the spill file is left in place
+        for the next replay.
+        """
+        if not os.path.exists(self.spill_file):
+            return 0
+        # Holding the lock keeps new spills out until the file is removed
+        with self._spill_lock():
+            if not os.path.exists(self.spill_file):
+                return 0
+            rows, dead = [], []
+            with open(self.spill_file, encoding="utf-8") as spill:
+                for line in spill:
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                        row["created_at"] = datetime.fromisoformat(row["created_at"])
+                        rows.append(row)
+                    except (ValueError, TypeError, KeyError):
+                        dead.append({"line": line.rstrip("\n")})
+
+            loaded = 0
+            for start in range(0, len(rows), AUDIT_REPLAY_BATCH_SIZE):
+                batch = rows[start:start + AUDIT_REPLAY_BATCH_SIZE]
+                with self.bind.begin() as connection:
+                    # Skip rows that were written after all, e.g. by an interrupted replay
+                    existing = set(connection.scalars(
+                        select(AuditLog.id).where(AuditLog.id.in_([row["id"] for row in batch]))
+                    ))
+                pending = [row for row in batch if row["id"] not in existing]
+                if not pending:
+                    continue
+                try:
+                    self._write(pending)
+                    loaded += len(pending)
+                    continue
+                except Exception:
+                    pass
+                failures = []
+                for row in pending:
+                    try:
+                        self._write([row])
+                        loaded += 1
+                    except (IntegrityError, DataError) as e:
+                        dead.append({"row": row, "error": str(e)})
+                    except Exception as e:
+                        failures.append((row, e))
+                if len(failures) == len(pending):
+                    # Nothing went in, so the database is still unavailable
+                    raise failures[0][1]
+                dead.extend({"row": row, "error": str(e)} for row, e in failures)
+
+            if dead:
+                self._append(self.dead_letter_file, dead)
+                self.dead_lettered += len(dead)
+                logger.error("Moved %d unloadable audit rows to %s", len(dead), self.dead_letter_file)
+            os.remove(self.spill_file)
+        logger.info("Replayed %d spilled audit rows from %s", loaded, self.spill_file)
+        return loaded
+
+    def _replay_spill_safely(self):
+        try:
+            self.replay_spill()
+        except Exception as e:
+            logger.error("Replaying %s failed, will retry: %s", self.spill_file, e)
+
+    def flush(self, timeout: float = 10.0):
+        """Write everything queued so far and stop the writer thread"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self._drain()
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "sync_writes": self.sync_writes,
+            "overflow_writes": self.overflow_writes,
+            "row_writes": self.row_writes,
+            "spilled": self.spilled,
+            "dead_lettered": self.dead_lettered,
+            "spill_pending": os.path.exists(self.spill_file),
+            "failed": self.failed,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": self._total_flush_ms / self.batches if self.batches else 0.0,
+            "max_flush_ms": self.max_flush_ms
+        }
+
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.flush)
@@ -0,0 +1,880 @@
+"""
+Benchmark Suite for KMED Backend
+Measures throughput of API endpoints against a running server
+"""
+
+import requests
+import sys
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Configuration
+BASE_URL = "http://localhost:8000"
+
+def login(username="admin", password="password"):
+    """Log in and return authorization headers"""
+    response = requests.post(f"{BASE_URL}/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def make_claims(count):
+    """Build sample claim payloads"""
+    providers = ["Dr. Smith", "Dr. Johnson", "Dr. Brown", "Dr. Davis", "Dr. Wilson"]
+    return [
+        {
+            "patient_name": f"Benchmark Patient {i}",
+            "provider_name": random.choice(providers),
+            "amount": round(random.uniform(100, 5000), 2),
+            "date": (datetime.utcnow() - timedelta(days=random.randint(1, 30))).isoformat(),
+            "description": "Benchmark claim"
+        }
+        for i in range(count)
+    ]
+
+def benchmark_claims_batch(count=1000, batch_size=500):
+    """Compare claims/sec for POST /claims against POST /claims/batch"""
+    headers = login()
+    claims = make_claims(count)
+
+    session = requests.Session()
+    start = time.perf_counter()
+    for claim in claims:
+        session.post(f"{BASE_URL}/claims", json=claim, headers=headers).raise_for_status()
+    single_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, count, batch_size):
+        session.post(
+            f"{BASE_URL}/claims/batch",
+            json={"claims": claims[offset:offset + batch_size]},
+            headers=headers
+        ).raise_for_status()
+    batch_elapsed = time.perf_counter() - start
+
+    print(f"Submitted {count} claims")
+    print(f"POST /claims:       {count / single_elapsed:,.0f} claims/sec")
+    print(f"POST /claims/batch: {count / batch_elapsed:,.0f} claims/sec (batch size {batch_size})")
+
+def benchmark_pagination(page=10000, limit=100, repeats=5):
+    """Compare latency of page 1 and a deep page for offset and cursor pagination
+
+    Runs directly against DATABASE_URL; seed it first, e.g. with import_claims.py.
+    """
+    from database import SessionLocal, Claim
+    from pagination import paginate, encode_cursor
+
+    db = SessionLocal()
+    try:
+        # Cursor pointing at the last row of the page before the target page
+        anchor = db.query(Claim).order_by(Claim.created_at.desc(), Claim.id.desc()).offset((page - 1) * limit - 1).first()
+        if anchor is None:
+            print(f"Not enough claims to reach page {page}; seed the claims table first")
+            return
+        deep_cursor = encode_cursor(anchor.created_at, anchor.id)
+
+        def timed(**kwargs):
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                paginate(db.query(Claim), Claim, limit, **kwargs)
+                samples.append(time.perf_counter() - start)
+            return 1000 * min(samples)
+
+        first_page, first_cursor = paginate(db.query(Claim), Claim, limit)
+        print(f"Offset page {1:>8}: {timed():.2f} ms")
+        print(f"Offset page {page:>8}: {timed(skip=(page - 1) * limit):.2f} ms")
+        print(f"Cursor page {2:>8}: {timed(cursor=first_cursor):.2f} ms")
+        print(f"Cursor page {page:>8}: {timed(cursor=deep_cursor):.2f} ms")
+    finally:
+        db.close()
+
+def check_query_plans():
+    """EXPLAIN the hot claim and alert queries and check each one uses its index
+
+    Runs directly against DATABASE_URL (PostgreSQL or SQLite).
+    """
+    from sqlalchemy import select, func, text
+    from database import engine, Claim, FraudAlert
+
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    checks = [
+        ("claims by provider, newest first", "ix_claims_provider_id_created_at_id",
+         select(Claim.id).where(Claim.provider_id == "USR004").order_by(Claim.created_at.desc(), Claim.id.desc()).limit(100)),
+        ("claims by patient, newest first", "ix_claims_patient_id_created_at_id",
+         select(Claim.id).where(Claim.patient_id == "USR005").order_by(Claim.created_at.desc(), Claim.id.desc()).limit(100)),
+        ("claims by provider and status", "ix_claims_provider_id_status",
+         select(func.count()).select_from(Claim).where(Claim.provider_id == "USR004", Claim.status == "flagged")),
+        ("high risk claims", "ix_claims_risk_level",
+         select(func.count()).select_from(Claim).where(Claim.risk_level == "high")),
+        ("unresolved alerts by severity", "ix_fraud_alerts_unresolved_severity",
+         select(FraudAlert.id).where(FraudAlert.is_resolved == False, FraudAlert.severity == "high")),
+        ("alerts resolved today", ("ix_fraud_alerts_resolved_at", "ix_fraud_alerts_is_resolved_created_at_id"),
+         select(func.count()).select_from(FraudAlert).where(FraudAlert.is_resolved == True, FraudAlert.resolved_at >= today)),
+        ("analyst cases", "ix_fraud_alerts_user_id_is_resolved_resolved_at",
+         select(func.count()).select_from(FraudAlert).where(FraudAlert.user_id == "USR001", FraudAlert.is_resolved == False)),
+        ("claims by status", "ix_claims_status",
+         select(func.count()).select_from(Claim).where(Claim.status == "flagged")),
+        ("claims by patient and status", "ix_claims_patient_id_status",
+         select(func.count()).select_from(Claim).where(Claim.patient_id == "USR005", Claim.status == "approved")),
+        ("all claims, newest first", "ix_claims_created_at_id",
+         select(Claim.id).order_by(Claim.created_at.desc(), Claim.id.desc()).limit(100)),
+        ("alerts for a claim", "ix_fraud_alerts_claim_id",
+         select(FraudAlert.id).where(FraudAlert.claim_id == "CLM001")),
+        ("all alerts, newest first", "ix_fraud_alerts_created_at_id",
+         select(FraudAlert.id).order_by(FraudAlert.created_at.desc(), FraudAlert.id.desc()).limit(100)),
+        ("open alerts, newest first", "ix_fraud_alerts_is_resolved_created_at_id",
+         select(FraudAlert.id).where(FraudAlert.is_resolved == False)
+         .order_by(FraudAlert.created_at.desc(), FraudAlert.id.desc()).limit(100)),
+    ]
+
+    failures = 0
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            # Small tables would otherwise be sequentially scanned
+            connection.execute(text("SET enable_seqscan = off"))
+            explain = "EXPLAIN "
+        else:
+            explain = "EXPLAIN QUERY PLAN "
+
+        for description, index_names, query in checks:
+            # Some queries can be served equally well by more than one index
+            if isinstance(index_names, str):
+                index_names = (index_names,)
+            sql = str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+            plan = "\n".join(str(row[-1]) for row in connection.execute(text(explain + sql)))
+            used = next((name for name in index_names if name in plan), None)
+            failures += used is None
+            print(f"{'✅' if used else '❌'} {description}: {used or ' or '.join(index_names)}")
+            if not used:
+                print(f"   Plan: {plan}")
+
+    print(f"\n{len(checks) - failures}/{len(checks)} queries use their index")
+    if failures:
+        raise SystemExit(1)
+
+def benchmark_dashboard(requests_per_role=200):
+    """Count queries and time dashboard metrics in-process for every role
+
+    The uncached time calls compute_dashboard_metrics directly; the cached
+    time goes through GET /dashboard/metrics and its snapshot cache. Runs
+    directly against DATABASE_URL with the main_db service.
+    """
+    from sqlalchemy import event
+    from database import engine, SessionLocal, User
+    from dashboard_cache import dashboard_cache
+    import main_db
+
+    statements = []
+
+    def listener(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    def per_request_ms(call):
+        start = time.perf_counter()
+        for _ in range(requests_per_role):
+            call()
+        return 1000 * (time.perf_counter() - start) / requests_per_role
+
+    event.listen(engine, "before_cursor_execute", listener)
+
+    db = SessionLocal()
+    try:
+        for role in ["admin", "investigator", "regulator", "analyst", "provider", "patient"]:
+            user = db.query(User).filter(User.role == role).first()
+            if user is None:
+                print(f"{role:>12}: no user with this role")
+                continue
+
+            statements.clear()
+            main_db.compute_dashboard_metrics(user, db)
+            queries = len(statements)
+
+            uncached = per_request_ms(lambda: main_db.compute_dashboard_metrics(user, db))
+            dashboard_cache.invalidate()
+            cached = per_request_ms(lambda: main_db.get_dashboard_metrics(current_user=user, db=db))
+
+            status = "✅" if queries == 1 else "❌"
+            print(f"{status} {role:>12}: {queries} quer{'y' if queries == 1 else 'ies'}/request, "
+                  f"uncached {uncached:.2f} ms/request, cached {cached:.3f} ms/request")
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", listener)
+
+def benchmark_login_concurrency(logins=50, interval=0.01):
+    """Measure GET /health latency while concurrent logins run bcrypt
+
+    Needs a running main_production server; every login uses the admin account.
+    """
+    samples = []
+    done = threading.Event()
+
+    def probe():
+        session = requests.Session()
+        while not done.is_set():
+            start = time.perf_counter()
+            session.get(f"{BASE_URL}/health").raise_for_status()
+            samples.append(time.perf_counter() - start)
+            time.sleep(interval)
+
+    def percentile(values, fraction):
+        ordered = sorted(values)
+        return 1000 * ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    # Baseline with no logins in flight
+    prober = threading.Thread(target=probe)
+    prober.start()
+    time.sleep(1)
+    done.set()
+    prober.join()
+    idle = list(samples)
+
+    samples.clear()
+    done.clear()
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as pool:
+        list(pool.map(lambda _: login(), range(logins)))
+    login_elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+
+    print(f"{logins} concurrent logins finished in {login_elapsed:.2f} s")
+    print(f"/health idle:         p50 {percentile(idle, 0.5):.1f} ms, p99 {percentile(idle, 0.99):.1f} ms ({len(idle)} requests)")
+    print(f"/health under logins: p50 {percentile(samples, 0.5):.1f} ms, p99 {percentile(samples, 0.99):.1f} ms ({len(samples)} requests)")
+
+def benchmark_pool_exhaustion(clients=20, pool_size=2, max_overflow=2, pool_timeout=1.0, hold=0.5):
+    """Hold more connections than the pool allows and report waits and timeouts
+
+    Runs directly against DATABASE_URL with a deliberately small pool.
+    """
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+    from database import DATABASE_URL, get_pool_options, describe_pool
+
+    options = get_pool_options(DATABASE_URL)
+    options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    engine = create_engine(DATABASE_URL, **options)
+    waits, timeouts = [], []
+    peak = {}
+    lock = threading.Lock()
+
+    def client(_):
+        start = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                waited = time.perf_counter() - start
+                connection.execute(text("SELECT 1"))
+                with lock:
+                    waits.append(waited)
+                    status = describe_pool("benchmark", engine.pool)
+                    if status["checked_out"] >= peak.get("checked_out", 0):
+                        peak.update(status)
+                time.sleep(hold)
+        except PoolTimeoutError:
+            with lock:
+                timeouts.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    capacity = pool_size + max_overflow
+    print(f"{clients} clients holding a connection for {hold}s; pool {pool_size} + {max_overflow} overflow, "
+          f"timeout {pool_timeout}s")
+    print(f"Peak: {peak.get('checked_out', 0)}/{capacity} checked out, {peak.get('overflow', 0)} overflow")
+    if waits:
+        print(f"Served {len(waits)}: max checkout wait {1000 * max(waits):.0f} ms")
+    print(f"Timed out {len(timeouts)} after waiting {pool_timeout}s for a connection")
+    print(f"Finished in {elapsed:.2f} s")
+
+def benchmark_user_cache(requests_per_path=500):
+    """Compare requests/sec on /auth/me and /claims with and without the user cache
+
+    Runs in-process against DATABASE_URL with the main_production app.
+    """
+    from fastapi.testclient import TestClient
+    from user_cache import user_cache
+    import main_production
+
+    client = TestClient(main_production.app)
+    token = client.post("/auth/login", json={"username": "admin", "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    ttl = user_cache.ttl
+
+    try:
+        for path in ["/auth/me", "/claims?limit=20"]:
+            results = {}
+            for label, cache_ttl in [("no cache", 0), ("cached", ttl or 60)]:
+                user_cache.ttl = cache_ttl
+                user_cache.clear()
+                client.get(path, headers=headers).raise_for_status()
+                start = time.perf_counter()
+                for _ in range(requests_per_path):
+                    client.get(path, headers=headers)
+                results[label] = requests_per_path / (time.perf_counter() - start)
+            print(f"{path:>18}: {results['no cache']:,.0f} req/s without cache, "
+                  f"{results['cached']:,.0f} req/s cached ({results['cached'] / results['no cache']:.2f}x)")
+    finally:
+        user_cache.ttl = ttl
+    print(f"Cache stats: {user_cache.stats()}")
+
+def benchmark_auth_overhead(iterations=20000):
+    """Microbenchmark of per-request JWT work: two decodes versus one cached verification"""
+    import jwt
+    from tokens import TokenVerifier
+
+    secret, algorithm = "benchmark-secret-key-of-32-bytes", "HS256"
+    token = jwt.encode({"sub": "admin", "exp": datetime.utcnow() + timedelta(minutes=30)}, secret, algorithm=algorithm)
+    uncached = TokenVerifier(secret, algorithm, max_entries=0)
+    cached = TokenVerifier(secret, algorithm)
+
+    def per_request(work):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            work()
+        return 1e6 * (time.perf_counter() - start) / iterations
+
+    cases = [
+        ("decode in middleware and verify_token", lambda: (jwt.decode(token, secret, algorithms=[algorithm]),
+                                                           jwt.decode(token, secret, algorithms=[algorithm]))),
+        ("verify once per request", lambda: uncached.decode(token)),
+        ("verify once, token cache hit", lambda: cached.decode(token)),
+    ]
+    for description, work in cases:
+        print(f"{description:>38}: {per_request(work):6.2f} µs/request")
+
+def benchmark_logging(requests_per_mode=300):
+    """Compare GET /claims throughput with logging off, synchronous and queued
+
+    Runs in-process against DATABASE_URL with the main_production app; log
+    files go to a temporary directory.
+    """
+    import logging
+    import os
+    import tempfile
+    from fastapi.testclient import TestClient
+    import logging_config
+    import main_production
+
+    client = TestClient(main_production.app)
+    token = client.post("/auth/login", json={"username": "admin", "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    root = logging.getLogger()
+    formatter = logging_config.build_formatter()
+
+    def run():
+        client.get("/claims?limit=20", headers=headers).raise_for_status()
+        start = time.perf_counter()
+        for _ in range(requests_per_mode):
+            client.get("/claims?limit=20", headers=headers)
+        return requests_per_mode / (time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as directory:
+        logging.disable(logging.CRITICAL)
+        off = run()
+        logging.disable(logging.NOTSET)
+
+        # The previous setup: handlers write on the request thread
+        sync_handler = logging.FileHandler(os.path.join(directory, "sync.log"))
+        sync_handler.setFormatter(formatter)
+        saved = list(root.handlers)
+        root.handlers = [sync_handler]
+        synchronous = run()
+        sync_handler.close()
+
+        logging_config.configure_logging(
+            logging_config.build_handlers(os.path.join(directory, "queued.log"), console=False)
+        )
+        queued = run()
+        stats = logging_config.get_logging_stats()
+        logging_config.stop_logging()
+        root.handlers = saved
+
+    print(f"Logging off:           {off:,.0f} req/s")
+    print(f"Synchronous file:      {synchronous:,.0f} req/s")
+    print(f"Queue + writer thread: {queued:,.0f} req/s (dropped {stats['dropped']}, queue depth {stats['queue_depth']})")
+
+def _generate_ids(count):
+    from ids import new_id
+    return [new_id("CLM") for _ in range(count)]
+
+def check_ids(processes=8, per_process=100000):
+    """Generate IDs in parallel processes, check they never collide and time throughput"""
+    import multiprocessing
+    import os
+    from ids import new_id, id_timestamp
+
+    start = time.perf_counter()
+    single = _generate_ids(per_process)
+    elapsed = time.perf_counter() - start
+    print(f"Single process: {per_process / elapsed:,.0f} IDs/sec")
+    monotonic = all(a < b for a, b in zip(single, single[1:]))
+    print(f"{'✅' if monotonic else '❌'} IDs from one process are strictly increasing")
+    drift = abs((id_timestamp(single[-1]) - datetime.utcnow()).total_seconds())
+    print(f"{'✅' if drift < 5 else '❌'} Embedded timestamp within {drift:.3f} s of now")
+
+    failures = not monotonic
+    for method in ["spawn", "fork"]:
+        if method not in multiprocessing.get_all_start_methods():
+            continue
+        context = multiprocessing.get_context(method)
+        start = time.perf_counter()
+        with context.Pool(processes) as pool:
+            batches = pool.map(_generate_ids, [per_process] * processes)
+        elapsed = time.perf_counter() - start
+        ids = [record_id for batch in batches for record_id in batch]
+        duplicates = len(ids) - len(set(ids))
+        failures += duplicates > 0
+        print(f"{'✅' if duplicates == 0 else '❌'} {method}: {len(ids):,} IDs from {processes} processes, "
+              f"{duplicates} duplicates, {len(ids) / elapsed:,.0f} IDs/sec")
+
+    if hasattr(os, "fork"):
+        # A child forked mid-millisecond must not continue the parent's sequence
+        duplicates = 0
+        for _ in range(300):
+            new_id("CLM")
+            read_end, write_end = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.write(write_end, new_id("CLM").encode())
+                os._exit(0)
+            parent_id = new_id("CLM")
+            os.waitpid(pid, 0)
+            duplicates += os.read(read_end, 64).decode() == parent_id
+            os.close(read_end)
+            os.close(write_end)
+        failures += duplicates > 0
+        print(f"{'✅' if duplicates == 0 else '❌'} fork race: {duplicates} duplicates in 300 forks")
+
+    if failures:
+        raise SystemExit(1)
+
+def _scratch_claims_db(count):
+    """Create a throwaway SQLite database holding ``count`` claims; returns (engine, path, claims)"""
+    import os
+    import tempfile
+    from sqlalchemy import create_engine, insert
+    from database import Base, Claim
+
+    path = os.path.join(tempfile.mkdtemp(), "chain.db")
+    bind = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind)
+    claims = [
+        Claim(id=f"CLM{i:08d}", patient_id="USR005", provider_id="USR004", patient_name=f"Patient {i}",
+              provider_name="Dr. Smith", amount=round(random.uniform(100, 5000), 2),
+              date=datetime(2026, 1, 1) + timedelta(minutes=i), risk_score=0.1, risk_level="low",
+              status="approved", description="Benchmark claim")
+        for i in range(count)
+    ]
+    if claims:
+        with bind.begin() as connection:
+            connection.execute(insert(Claim), [
+                {column.name: getattr(claim, column.name) for column in Claim.__table__.columns} for claim in claims
+            ])
+    return bind, path, claims
+
+def benchmark_blockchain_verify(blocks=100000, processes=4):
+    """Time incremental and full chain verification in blocks/sec on a scratch SQLite chain"""
+    import os
+    from sqlalchemy import update
+    from database import SessionLocal, Claim
+    import blockchain
+
+    bind, path, claims = _scratch_claims_db(blocks)
+    db = SessionLocal(bind=bind)
+    try:
+        blockchain.append_blocks(db, claims[:blocks // 2])
+        db.commit()
+        result = blockchain.verify_new_blocks(bind)
+        print(f"Incremental, first {blocks // 2:,} blocks: {result['blocks_per_second']:,.0f} blocks/sec")
+
+        blockchain.append_blocks(db, claims[blocks // 2:])
+        db.commit()
+        result = blockchain.verify_new_blocks(bind)
+        print(f"Incremental, {result['blocks_verified']:,} new blocks: {result['blocks_per_second']:,.0f} blocks/sec")
+        result = blockchain.verify_new_blocks(bind)
+        print(f"Incremental, nothing new: {result['blocks_verified']} blocks in {1000 * result['seconds']:.1f} ms")
+
+        for count in sorted({1, processes}):
+            result = blockchain.verify_chain(count, bind)
+            print(f"Full, {count} process{'es' if count > 1 else ''}: {result['blocks_per_second']:,.0f} blocks/sec")
+        ok = result["failure"] is None and result["checkpoint"] == blocks
+        print(f"{'✅' if ok else '❌'} Chain of {blocks:,} blocks verified")
+
+        tampered = blocks * 3 // 4
+        with bind.begin() as connection:
+            connection.execute(update(Claim).where(Claim.id == f"CLM{tampered - 1:08d}").values(amount=1.0))
+        result = blockchain.verify_chain(processes, bind)
+        caught = result["failure"] is not None and result["failure"]["block_number"] == tampered
+        print(f"{'✅' if caught else '❌'} Edited claim detected at block {result['failure'] and result['failure']['block_number']}")
+    finally:
+        db.close()
+        bind.dispose()
+        os.remove(path)
+    if not (ok and caught):
+        raise SystemExit(1)
+
+def benchmark_merkle_anchoring(claims=100000, window=10000, proofs=1000):
+    """Compare per-claim blocks with Merkle batch blocks: blocks written, anchoring, verification and proofs
+
+    Each window of ``window`` claims becomes one batch block.
+    """
+    import os
+    from database import SessionLocal
+    import blockchain
+    import merkle
+
+    failures = 0
+    for mode in ["per_claim", "merkle"]:
+        bind, path, rows = _scratch_claims_db(claims)
+        db = SessionLocal(bind=bind)
+        try:
+            start = time.perf_counter()
+            blocks = 0
+            for first in range(0, claims, window):
+                blocks += len(blockchain.anchor(db, rows[first:first + window], mode))
+                db.commit()
+            anchor_seconds = time.perf_counter() - start
+            result = blockchain.verify_chain(1, bind)
+
+            sample = random.sample(range(claims), min(proofs, claims))
+            start = time.perf_counter()
+            fetched = [blockchain.get_claim_proof(db, f"CLM{i:08d}") for i in sample]
+            fetch_ms = 1000 * (time.perf_counter() - start) / len(sample)
+
+            start = time.perf_counter()
+            for proof in fetched:
+                if mode == "merkle":
+                    compact = b"".join(bytes.fromhex(step["hash"]) for step in proof["proof"])
+                    valid = merkle.verify_proof(proof["claim_hash"], compact, proof["leaf_index"],
+                                                proof["tree_size"], proof["merkle_root"])
+                else:
+                    valid = blockchain.block_hash(proof["block_number"], proof["previous_hash"],
+                                                  proof["claim_hash"]) == proof["block_hash"]
+                failures += not valid
+            verify_us = 1e6 * (time.perf_counter() - start) / len(fetched)
+            steps = max(len(proof["proof"]) for proof in fetched)
+
+            ok = result["failure"] is None
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {mode:>9}: {blocks:,} blocks for {claims:,} claims, "
+                  f"anchored at {claims / anchor_seconds:,.0f} claims/sec, "
+                  f"full verification {1000 * result['seconds']:,.0f} ms")
+            print(f"{'':>12} proof: {steps} hashes max, {fetch_ms:.2f} ms to fetch, {verify_us:.1f} µs to verify")
+        finally:
+            db.close()
+            bind.dispose()
+            os.remove(path)
+    if failures:
+        raise SystemExit(1)
+
+def benchmark_feature_store(claims=200000, providers=500, patients=20000, lookups=20000):
+    """Time the pandas backfill and feature lookups, and check the backfill matches incremental updates"""
+    import os
+    import math
+    from dataclasses import astuple
+    from sqlalchemy import insert
+    from database import SessionLocal, Claim
+    import features
+
+    bind, path, _ = _scratch_claims_db(0)
+    db = SessionLocal(bind=bind)
+    store = features.feature_store
+    try:
+        now = datetime.utcnow()
+        rows = [
+            {"id": f"CLM{i:08d}", "patient_id": f"PAT{random.randrange(patients):06d}",
+             "provider_id": f"PRV{random.randrange(providers):04d}", "patient_name": f"Patient {i}",
+             "provider_name": "Dr. Smith", "amount": round(random.uniform(100, 5000), 2),
+             "date": now, "risk_score": 0.1, "risk_level": "low",
+             "status": random.choice(["pending", "approved", "flagged", "investigation"]),
+             "description": "Benchmark claim", "created_at": now - timedelta(minutes=random.randrange(40 * 1440)),
+             "updated_at": now}
+            for i in range(claims)
+        ]
+        start = time.perf_counter()
+        for first in range(0, claims, 5000):
+            chunk = rows[first:first + 5000]
+            db.execute(insert(Claim), chunk)
+            features.record_claims(db, chunk)
+            db.commit()
+        print(f"Incremental updates: {claims / (time.perf_counter() - start):,.0f} claims/sec (with inserts)")
+
+        keys = [("provider", f"PRV{i:04d}") for i in range(providers)] + \
+               [("patient", f"PAT{i:06d}") for i in random.sample(range(patients), min(1000, patients))]
+        store.clear()
+        incremental = {key: store.get(db, *key) for key in keys}
+
+        start = time.perf_counter()
+        counts = features.backfill(db)
+        print(f"Backfill: {counts['provider']:,} providers and {counts['patient']:,} patients "
+              f"in {time.perf_counter() - start:.2f}s")
+        backfilled = {key: store.get(db, *key) for key in keys}
+        mismatches = sum(
+            not all(math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-6)
+                    for a, b in zip(astuple(incremental[key]), astuple(backfilled[key])))
+            for key in keys
+        )
+        print(f"{'✅' if not mismatches else '❌'} Backfill matches incremental updates "
+              f"({mismatches} of {len(keys)} entities differ)")
+
+        sample = [random.choice(keys) for _ in range(lookups)]
+        store.clear()
+        start = time.perf_counter()
+        for key in sample:
+            store.invalidate(*key)
+            store.get(db, *key)
+        cold = lookups / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for key in sample:
+            store.get(db, *key)
+        warm = lookups / (time.perf_counter() - start)
+        print(f"Lookups: {cold:,.0f}/sec from the table, {warm:,.0f}/sec from memory ({warm / cold:,.0f}x)")
+    finally:
+        db.close()
+        bind.dispose()
+        os.remove(path)
+        store.clear()
+    if mismatches:
+        raise SystemExit(1)
+
+def benchmark_model_serving(single_calls=2000, batch_calls=200, batch_size=64, swap_calls=2000):
+    """Compare rule and model scoring latency and throughput, then hot-swap models under load"""
+    import shutil
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    import scoring
+    import model_serving
+
+    model_dir = tempfile.mkdtemp()
+    rng = np.random.default_rng(42)
+    names = model_serving.MODEL_FEATURES
+
+    def make_batch(rows):
+        claims = pd.DataFrame({
+            "amount": rng.uniform(100, 5000, rows),
+            "provider_name": rng.choice(["Dr. Smith", "Dr. Johnson", "Dr. Brown"], rows)
+        })
+        history = pd.DataFrame({column: rng.uniform(0, 10, rows) for column in scoring.FEATURE_COLUMNS})
+        return claims, history
+
+    try:
+        for version in ["v1", "v2"]:
+            claims, history = make_batch(2000)
+            labels = (claims["amount"] > rng.uniform(2000, 4000)).astype(int)
+            estimator = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+            estimator.fit(model_serving.feature_matrix(claims, history, names), labels)
+            model_serving.publish(estimator, {
+                "version": version, "features": names, "trained_at": datetime.utcnow().isoformat(),
+                "metrics": {"accuracy": float(estimator.score(model_serving.feature_matrix(claims, history, names), labels))}
+            }, model_dir)
+
+        singles = [make_batch(1) for _ in range(single_calls)]
+        batches = [make_batch(batch_size) for _ in range(batch_calls)]
+        model_serving.write_pointer("v1", model_dir)
+        for engine_name in ["rules", "auto"]:
+            for calls, size in [(singles, 1), (batches, batch_size)]:
+                engine = model_serving.ModelEngine(model_dir, engine_name, reload_interval=3600)
+                engine.reload()
+                label = f"model {engine.model.version}" if engine_name == "auto" else "rules"
+                for claims, history in calls:
+                    engine.predict(claims, history)
+                stats = next(iter(engine.status()["engines"].values()))
+                print(f"{label:>9}, batch {size:>3}: {stats['rows_per_second']:>10,.0f} claims/sec, "
+                      f"p50 {stats['latency_ms_p50']:.3f} ms, p99 {stats['latency_ms_p99']:.3f} ms")
+
+        # Swap v1 -> v2 while another thread keeps scoring
+        engine = model_serving.ModelEngine(model_dir, "auto", reload_interval=0)
+        engine.reload()
+        seen, errors = [], []
+        stop = threading.Event()
+
+        def score_continuously():
+            claims, history = make_batch(1)
+            while not stop.is_set():
+                try:
+                    engine.predict(claims, history)
+                    seen.append(engine.model.version)
+                except Exception as e:
+                    errors.append(e)
+
+        worker = threading.Thread(target=score_continuously)
+        worker.start()
+        time.sleep(0.2)
+        swapped_at = time.perf_counter()
+        model_serving.write_pointer("v2", model_dir)
+        while engine.model.version != "v2" and time.perf_counter() - swapped_at < 10:
+            time.sleep(0.001)
+        swap_ms = 1000 * (time.perf_counter() - swapped_at)
+        time.sleep(0.2)
+        stop.set()
+        worker.join()
+
+        ok = not errors and engine.fallbacks == 0 and seen[-1] == "v2" and "v1" in seen
+        print(f"{'✅' if ok else '❌'} Hot swap v1 -> v2 live after {swap_ms:.1f} ms "
+              f"(warm-up {engine.model.warmup_ms:.1f} ms); {len(seen):,} calls during the swap, "
+              f"{len(errors)} errors, {engine.fallbacks} rule fallbacks")
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+    if not ok:
+        raise SystemExit(1)
+
+def benchmark_scoring_batcher(callers=32, calls_per_caller=200):
+    """Throughput against p99 latency for concurrent single-claim scoring, direct and micro-batched
+
+    Each configuration runs ``callers`` threads that score one claim at a time,
+    as create_claim does from the worker thread pool.
+    """
+    import numpy as np
+    import scoring
+    from scoring_batcher import ScoringBatcher
+
+    rng = np.random.default_rng(42)
+    claims = [
+        ({"amount": float(amount), "provider_name": "Dr. Smith"},
+         {column: float(value) for column, value in zip(scoring.FEATURE_COLUMNS, rng.uniform(0, 10, 6))})
+        for amount in rng.uniform(100, 5000, calls_per_caller)
+    ]
+    configs = [("direct", None, None), ("batched", 8, 1), ("batched", 32, 2), ("batched", 64, 5)]
+
+    for mode, max_size, max_wait_ms in configs:
+        batcher = ScoringBatcher(max_size or 1, max_wait_ms or 0, enabled=mode == "batched")
+        latencies = []
+        lock = threading.Lock()
+
+        def caller():
+            mine = []
+            for claim, features in claims:
+                start = time.perf_counter()
+                batcher.score(claim, features)
+                mine.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(mine)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            for future in [executor.submit(caller) for _ in range(callers)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+        batcher.stop()
+
+        stats = batcher.stats()
+        label = "direct" if mode == "direct" else f"M={max_size:<3} T={max_wait_ms}ms"
+        extra = "" if mode == "direct" else (
+            f", fill {100 * stats['fill_ratio']:.0f}%, queue wait p99 {stats['queue_wait_ms_p99']:.2f} ms"
+        )
+        print(f"{label:>14}: {len(latencies) / elapsed:>8,.0f} claims/sec, "
+              f"p50 {1000 * np.percentile(latencies, 50):.2f} ms, p99 {1000 * np.percentile(latencies, 99):.2f} ms{extra}")
+
+def benchmark_scoring_memo(calls=5000, repeat_fractions=(0.0, 0.5, 0.9)):
+    """Time single-claim model scoring with and without the score memo
+
+    Each call scores one claim, as create_claim does; a fraction of the calls
+    repeat an input row already scored (re-imported or replayed claims).
+    Checks that memoized scores equal fresh ones and that deterministic rule
+    scoring is repeatable.
+    """
+    import shutil
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    import scoring
+    import model_serving
+
+    model_dir = tempfile.mkdtemp()
+    rng = np.random.default_rng(42)
+    names = model_serving.MODEL_FEATURES
+
+    def make_batch(rows):
+        claims = pd.DataFrame({
+            "amount": rng.uniform(100, 5000, rows),
+            "provider_name": rng.choice(["Dr. Smith", "Dr. Johnson", "Dr. Brown"], rows)
+        })
+        history = pd.DataFrame({column: rng.integers(0, 20, rows).astype(float) for column in scoring.FEATURE_COLUMNS})
+        return claims, history
+
+    try:
+        claims, history = make_batch(2000)
+        estimator = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000))
+        estimator.fit(model_serving.feature_matrix(claims, history, names), (claims["amount"] > 3000).astype(int))
+        model_serving.publish(estimator, {"version": "v1", "features": names, "metrics": {}}, model_dir)
+        model_serving.write_pointer("v1", model_dir)
+
+        identical = True
+        for fraction in repeat_fractions:
+            stream = []
+            for _ in range(calls):
+                repeated = stream and rng.random() < fraction
+                stream.append(stream[rng.integers(len(stream))] if repeated else make_batch(1))
+
+            results = {}
+            for memo_size in [0, model_serving.SCORING_MEMO_SIZE]:
+                engine = model_serving.ModelEngine(model_dir, "auto", reload_interval=3600)
+                engine.memo = model_serving.ScoreMemo(memo_size)
+                engine.reload()
+                start = time.perf_counter()
+                scores = [engine.predict(claims, history)[0] for claims, history in stream]
+                results[memo_size] = (calls / (time.perf_counter() - start), scores, engine.memo.stats())
+            (plain, plain_scores, _), (memoized, memo_scores, stats) = results.values()
+            identical = identical and plain_scores == memo_scores
+            print(f"{100 * fraction:>3.0f}% repeated inputs: {plain:>7,.0f} claims/sec without the memo, "
+                  f"{memoized:>7,.0f} with it ({memoized / plain:.2f}x, hit ratio {stats['hit_ratio']:.0%})")
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+    claims = [
+        {"patient_name": f"Patient {i}", "provider_name": "Dr. Smith", "amount": 100.0 + i,
+         "date": datetime(2026, 1, 1), "description": "Benchmark claim"}
+        for i in range(1000)
+    ]
+    repeatable = scoring.score_claims(claims).equals(scoring.score_claims(claims))
+    print(f"{'✅' if identical else '❌'} Memoized model scores equal fresh ones")
+    print(f"{'✅' if repeatable else '❌'} Deterministic rule scoring is repeatable")
+    if not (identical and repeatable):
+        raise SystemExit(1)
+
+BENCHMARKS = {
+    "claims-batch": benchmark_claims_batch,
+    "pagination": benchmark_pagination,
+    "query-plans": check_query_plans,
+    "dashboard": benchmark_dashboard,
+    "login-concurrency": benchmark_login_concurrency,
+    "pool-exhaustion": benchmark_pool_exhaustion,
+    "user-cache": benchmark_user_cache,
+    "auth-overhead": benchmark_auth_overhead,
+    "logging": benchmark_logging,
+    "ids": check_ids,
+    "blockchain-verify": benchmark_blockchain_verify,
+    "merkle-anchoring": benchmark_merkle_anchoring,
+    "feature-store": benchmark_feature_store,
+    "model-serving": benchmark_model_serving,
+    "scoring-batcher": benchmark_scoring_batcher,
+    "scoring-memo": benchmark_scoring_memo,
+}
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name}. Available: {', '.join(BENCHMARKS)}")
+            return 1
+        print(f"\n⏱️ {name}")
+        print("=" * 50)
+        BENCHMARKS[name]()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
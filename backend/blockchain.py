@@ -0,0 +1,502 @@
+"""
+Blockchain Verification for KMED Backend
+Hash-chained claim records with checkpointed, parallel chain verification
+
+Block N stores SHA-256 over its number, the hash of block N-1 and a content
+digest, so editing a claim or any earlier block breaks the chain from that
+point on. A per-claim block's digest covers the canonical content of its one
+claim; a batch block's digest is the Merkle root over every claim anchored in
+that window, and each claim's inclusion proof is kept in claim_proofs.
+`verify_new_blocks` only checks blocks after the stored checkpoint;
+`verify_chain` re-verifies the whole history across a process pool.
+
+Usage:
+    python blockchain.py anchor [--all] [--every SECONDS]
+    python blockchain.py verify
+    python blockchain.py verify --full [--processes N]
+    python blockchain.py status
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, select, update, insert, func, exists
+
+from database import engine, SessionLocal, get_pool_options, Claim, BlockchainRecord, BlockchainCheckpoint, ClaimProof
+from ids import new_id
+import merkle
+
+BLOCKCHAIN_VERIFY_BATCH_SIZE = int(os.getenv("BLOCKCHAIN_VERIFY_BATCH_SIZE", "1000"))
+BLOCKCHAIN_VERIFY_PROCESSES = int(os.getenv("BLOCKCHAIN_VERIFY_PROCESSES", str(os.cpu_count() or 1)))
+BLOCKCHAIN_MODE = os.getenv("BLOCKCHAIN_MODE", "merkle").lower()  # merkle, per_claim
+BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS = float(os.getenv("BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS", "60"))
+BLOCKCHAIN_ANCHOR_LOOKBACK_SECONDS = float(os.getenv("BLOCKCHAIN_ANCHOR_LOOKBACK_SECONDS", "86400"))
+BLOCKCHAIN_BATCH_MAX_CLAIMS = int(os.getenv("BLOCKCHAIN_BATCH_MAX_CLAIMS", "100000"))
+
+GENESIS_HASH = "0" * 64
+CHECKPOINT_ID = "claims"
+
+# Claim columns covered by the block hash; they do not change after submission
+CLAIM_HASH_FIELDS = ("id", "patient_id", "provider_id", "patient_name", "provider_name", "amount", "date", "description")
+
+# Chunks per worker process, so a slow chunk does not hold up the whole run
+CHUNKS_PER_PROCESS = 4
+
+
+def canonical_claim(claim) -> bytes:
+    """Stable serialization of the hashed claim fields
+
+    ``claim`` may be a Claim, a row or a dict with those fields.
+    """
+    values = claim if isinstance(claim, dict) else {name: getattr(claim, name) for name in CLAIM_HASH_FIELDS}
+    content = {}
+    for name in CLAIM_HASH_FIELDS:
+        value = values.get(name)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif name == "amount" and value is not None:
+            value = repr(float(value))
+        content[name] = value
+    return json.dumps(content, sort_keys=True, separators=(",", ":")).encode()
+
+
+def claim_hash(claim) -> str:
+    return hashlib.sha256(canonical_claim(claim)).hexdigest()
+
+
+def block_hash(block_number: int, previous_hash: Optional[str], content_hash: str) -> str:
+    """Hash of one block, linking it to its predecessor"""
+    payload = f"{block_number}:{previous_hash or GENESIS_HASH}:{content_hash}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _tip(db):
+    tip = db.execute(
+        select(BlockchainRecord.block_number, BlockchainRecord.hash_value)
+        .order_by(BlockchainRecord.block_number.desc()).limit(1)
+    ).first()
+    return tip if tip else (0, None)
+
+
+def append_blocks(db, claims) -> List[BlockchainRecord]:
+    """Add one block per claim after the current chain tip; the caller commits"""
+    block_number, previous_hash = _tip(db)
+
+    records = []
+    for claim in claims:
+        block_number += 1
+        hash_value = block_hash(block_number, previous_hash, claim_hash(claim))
+        records.append(BlockchainRecord(
+            id=new_id("BLK"),
+            claim_id=claim.id,
+            hash_value=hash_value,
+            previous_hash=previous_hash,
+            block_number=block_number,
+            is_verified=False
+        ))
+        previous_hash = hash_value
+    db.add_all(records)
+    return records
+
+
+def append_batch_block(db, claims) -> BlockchainRecord:
+    """Anchor ``claims`` as one block over their Merkle root; the caller commits
+
+    Writes one claim_proofs row per claim with its leaf index and proof.
+    """
+    levels = merkle.build_levels([merkle.leaf_hash(claim_hash(claim)) for claim in claims])
+    root = levels[-1][0].hex()
+    block_number, previous_hash = _tip(db)
+    block_number += 1
+    record = BlockchainRecord(
+        id=new_id("BLK"),
+        hash_value=block_hash(block_number, previous_hash, root),
+        previous_hash=previous_hash,
+        block_number=block_number,
+        merkle_root=root,
+        claim_count=len(claims),
+        is_verified=False
+    )
+    db.add(record)
+    db.execute(insert(ClaimProof), [
+        {
+            "claim_id": claim.id,
+            "block_number": block_number,
+            "leaf_index": index,
+            "proof": merkle.build_proof(levels, index)
+        }
+        for index, claim in enumerate(claims)
+    ])
+    return record
+
+
+def anchor(db, claims, mode: str = BLOCKCHAIN_MODE) -> List[BlockchainRecord]:
+    """Anchor ``claims`` in the configured mode; the caller commits"""
+    if not claims:
+        return []
+    if mode == "per_claim":
+        return append_blocks(db, claims)
+    return [append_batch_block(db, claims)]
+
+
+def pending_claims(db, since: Optional[datetime] = None, limit: int = BLOCKCHAIN_BATCH_MAX_CLAIMS) -> List[Any]:
+    """Hashed fields of claims created since ``since`` that no block covers yet, oldest first"""
+    statement = select(*[getattr(Claim, name) for name in CLAIM_HASH_FIELDS]).where(
+        ~exists().where(ClaimProof.claim_id == Claim.id),
+        ~exists().where(BlockchainRecord.claim_id == Claim.id)
+    )
+    if since is not None:
+        statement = statement.where(Claim.created_at >= since)
+    return db.execute(statement.order_by(Claim.created_at, Claim.id).limit(limit)).all()
+
+
+def anchor_pending(mode: str = BLOCKCHAIN_MODE, lookback_seconds: Optional[float] = BLOCKCHAIN_ANCHOR_LOOKBACK_SECONDS,
+                   bind=engine) -> Dict[str, Any]:
+    """Anchor the claims committed since the last run
+
+    Claims older than ``lookback_seconds`` are not rescanned; pass None to
+    scan every claim.
+    """
+    since = datetime.utcnow() - timedelta(seconds=lookback_seconds) if lookback_seconds is not None else None
+    start = time.perf_counter()
+    db = SessionLocal(bind=bind)
+    try:
+        claims = pending_claims(db, since)
+        blocks = anchor(db, claims, mode)
+        db.commit()
+        block_numbers = [block.block_number for block in blocks]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return {
+        "mode": mode,
+        "claims": len(claims),
+        "blocks": block_numbers,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def _check_range(bind, first: int, last: int, previous_number: int, previous_hash: Optional[str],
+                 batch_size: int = BLOCKCHAIN_VERIFY_BATCH_SIZE) -> Dict[str, Any]:
+    """Verify blocks ``first``..``last`` in order, starting from a trusted predecessor
+
+    Blocks are streamed ``batch_size`` at a time and checking stops at the first
+    block whose number, link or hash does not match. The verified blocks are
+    then marked is_verified with a single range UPDATE.
+    """
+    statement = (
+        select(
+            BlockchainRecord.block_number,
+            BlockchainRecord.hash_value,
+            BlockchainRecord.previous_hash,
+            BlockchainRecord.merkle_root,
+            BlockchainRecord.claim_count,
+            *[getattr(Claim, name) for name in CLAIM_HASH_FIELDS]
+        )
+        .join(Claim, Claim.id == BlockchainRecord.claim_id, isouter=True)
+        .where(BlockchainRecord.block_number.between(first, last))
+        .order_by(BlockchainRecord.block_number)
+    )
+    verified = 0
+    failure = None
+    with bind.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(statement)
+        for row in result:
+            if row.block_number != previous_number + 1:
+                failure = {"block_number": previous_number + 1, "reason": f"missing block (next is {row.block_number})"}
+            elif (row.previous_hash or GENESIS_HASH) != (previous_hash or GENESIS_HASH):
+                failure = {"block_number": row.block_number, "reason": "previous_hash does not match the preceding block"}
+            elif row.merkle_root is not None:
+                reason = _check_batch(bind, row.block_number, row.claim_count, row.merkle_root)
+                if reason is None and block_hash(row.block_number, previous_hash, row.merkle_root) != row.hash_value:
+                    reason = "hash does not match block content"
+                if reason:
+                    failure = {"block_number": row.block_number, "reason": reason}
+            elif row.id is None:
+                failure = {"block_number": row.block_number, "reason": "claim not found"}
+            elif block_hash(row.block_number, previous_hash, claim_hash(dict(row._mapping))) != row.hash_value:
+                failure = {"block_number": row.block_number, "reason": "hash does not match block content"}
+            if failure:
+                break
+            previous_number, previous_hash = row.block_number, row.hash_value
+            verified += 1
+        result.close()
+
+    if failure is None and previous_number < last:
+        failure = {"block_number": previous_number + 1, "reason": "missing block"}
+
+    # Written after the read so SQLite's reader lock does not block the update
+    now = datetime.utcnow()
+    with bind.begin() as connection:
+        if verified:
+            connection.execute(
+                update(BlockchainRecord)
+                .where(BlockchainRecord.block_number.between(first, previous_number))
+                .values(is_verified=True, verification_timestamp=now)
+            )
+        if failure:
+            connection.execute(
+                update(BlockchainRecord)
+                .where(BlockchainRecord.block_number == failure["block_number"])
+                .values(is_verified=False, verification_timestamp=now)
+            )
+    return {"verified": verified, "last_number": previous_number, "last_hash": previous_hash, "failure": failure}
+
+
+def _check_batch(bind, block_number: int, claim_count: int, merkle_root: str) -> Optional[str]:
+    """Rebuild a batch block's Merkle root from its claims; return why it fails, if it does"""
+    statement = (
+        select(ClaimProof.leaf_index, *[getattr(Claim, name) for name in CLAIM_HASH_FIELDS])
+        .join(Claim, Claim.id == ClaimProof.claim_id)
+        .where(ClaimProof.block_number == block_number)
+        .order_by(ClaimProof.leaf_index)
+    )
+    leaves = []
+    with bind.connect() as connection:
+        for row in connection.execution_options(yield_per=BLOCKCHAIN_VERIFY_BATCH_SIZE).execute(statement):
+            if row.leaf_index != len(leaves):
+                return f"claim missing at leaf {len(leaves)}"
+            leaves.append(merkle.leaf_hash(claim_hash(dict(row._mapping))))
+    if len(leaves) != claim_count:
+        return f"block anchors {claim_count} claims, found {len(leaves)}"
+    if merkle.build_levels(leaves)[-1][0].hex() != merkle_root:
+        return "merkle root does not match block claims"
+    return None
+
+
+def _chain_tip(connection) -> int:
+    return connection.execute(select(func.coalesce(func.max(BlockchainRecord.block_number), 0))).scalar()
+
+
+def _stored_hash(connection, block_number: int) -> Optional[str]:
+    return connection.execute(
+        select(BlockchainRecord.hash_value).where(BlockchainRecord.block_number == block_number)
+    ).scalar()
+
+
+def _save_checkpoint(bind, mode: str, result: Dict[str, Any], blocks: int, elapsed: float) -> Dict[str, Any]:
+    db = SessionLocal(bind=bind)
+    try:
+        checkpoint = db.get(BlockchainCheckpoint, CHECKPOINT_ID) or BlockchainCheckpoint(id=CHECKPOINT_ID)
+        checkpoint.block_number = result["last_number"]
+        checkpoint.hash_value = result["last_hash"]
+        checkpoint.status = "broken" if result["failure"] else "ok"
+        checkpoint.failed_block_number = result["failure"]["block_number"] if result["failure"] else None
+        checkpoint.failure_reason = result["failure"]["reason"] if result["failure"] else None
+        checkpoint.last_run_mode = mode
+        checkpoint.last_run_blocks = blocks
+        checkpoint.last_run_seconds = elapsed
+        checkpoint.blocks_per_second = blocks / elapsed if elapsed > 0 else 0.0
+        checkpoint.last_run_at = datetime.utcnow()
+        db.merge(checkpoint)
+        db.commit()
+    finally:
+        db.close()
+    return {
+        "mode": mode,
+        "blocks_verified": blocks,
+        "seconds": elapsed,
+        "blocks_per_second": blocks / elapsed if elapsed > 0 else 0.0,
+        "checkpoint": result["last_number"],
+        "failure": result["failure"]
+    }
+
+
+def verify_new_blocks(bind=engine) -> Dict[str, Any]:
+    """Verify the blocks appended since the last checkpoint"""
+    start = time.perf_counter()
+    db = SessionLocal(bind=bind)
+    try:
+        checkpoint = db.get(BlockchainCheckpoint, CHECKPOINT_ID)
+        previous_number = checkpoint.block_number if checkpoint else 0
+        previous_hash = checkpoint.hash_value if checkpoint else None
+    finally:
+        db.close()
+
+    with bind.connect() as connection:
+        tip = _chain_tip(connection)
+        stored = _stored_hash(connection, previous_number) if previous_number else None
+
+    if previous_number and stored != previous_hash:
+        # The checkpointed block itself changed; only a full run can say where
+        result = {"verified": 0, "last_number": 0, "last_hash": None, "failure": {
+            "block_number": previous_number, "reason": "checkpointed block was modified; run a full verification"
+        }}
+    else:
+        result = _check_range(bind, previous_number + 1, tip, previous_number, previous_hash)
+    return _save_checkpoint(bind, "incremental", result, result["verified"], time.perf_counter() - start)
+
+
+_worker_engine = None
+
+
+def _init_worker(url: str):
+    global _worker_engine
+    _worker_engine = create_engine(url, **get_pool_options(url))
+
+
+def _verify_chunk(bounds) -> Dict[str, Any]:
+    first, last = bounds
+    with _worker_engine.connect() as connection:
+        previous_hash = _stored_hash(connection, first - 1) if first > 1 else None
+    return _check_range(_worker_engine, first, last, first - 1, previous_hash)
+
+
+def verify_chain(processes: int = BLOCKCHAIN_VERIFY_PROCESSES, bind=engine) -> Dict[str, Any]:
+    """Re-verify every block, split into contiguous ranges across worker processes
+
+    Each range is checked against the stored hash of the block before it, and
+    that block is checked by the preceding range, so together the ranges
+    cover every link.
+    """
+    start = time.perf_counter()
+    with bind.connect() as connection:
+        tip = _chain_tip(connection)
+
+    chunk_size = max(BLOCKCHAIN_VERIFY_BATCH_SIZE, -(-tip // max(processes * CHUNKS_PER_PROCESS, 1)))
+    chunks = [(first, min(first + chunk_size - 1, tip)) for first in range(1, tip + 1, chunk_size)]
+    url = bind.url.render_as_string(hide_password=False)
+    if processes <= 1 or len(chunks) <= 1:
+        _init_worker(url)
+        results = [_verify_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.get_context().Pool(processes, initializer=_init_worker, initargs=(url,)) as pool:
+            results = pool.map(_verify_chunk, chunks)
+
+    # The chain is verified up to the first failure
+    combined = {"verified": 0, "last_number": 0, "last_hash": None, "failure": None}
+    for result in results:
+        combined.update(last_number=result["last_number"], last_hash=result["last_hash"])
+        if result["failure"]:
+            combined["failure"] = result["failure"]
+            break
+    blocks = sum(result["verified"] for result in results)
+    return _save_checkpoint(bind, "full", combined, blocks, time.perf_counter() - start)
+
+
+def get_verification_status(db) -> Dict[str, Any]:
+    """Checkpoint, chain tip and last run throughput"""
+    checkpoint = db.get(BlockchainCheckpoint, CHECKPOINT_ID)
+    tip = _chain_tip(db)
+    verified_through = checkpoint.block_number if checkpoint else 0
+    return {
+        "chain_length": tip,
+        "verified_through": verified_through,
+        "verified_hash": checkpoint.hash_value if checkpoint else None,
+        "pending_blocks": max(tip - verified_through, 0),
+        "status": checkpoint.status if checkpoint else "unverified",
+        "failed_block_number": checkpoint.failed_block_number if checkpoint else None,
+        "failure_reason": checkpoint.failure_reason if checkpoint else None,
+        "last_run": {
+            "mode": checkpoint.last_run_mode,
+            "blocks": checkpoint.last_run_blocks,
+            "seconds": checkpoint.last_run_seconds,
+            "blocks_per_second": checkpoint.blocks_per_second,
+            "at": checkpoint.last_run_at
+        } if checkpoint and checkpoint.last_run_at else None
+    }
+
+
+def get_claim_proof(db, claim_id: str) -> Optional[Dict[str, Any]]:
+    """Inclusion proof linking a claim's current content to its block, or None if not anchored"""
+    claim = db.get(Claim, claim_id)
+    if claim is None:
+        return None
+    content_hash = claim_hash(claim)
+
+    proof = db.get(ClaimProof, claim_id)
+    if proof is not None:
+        block = db.query(BlockchainRecord).filter(BlockchainRecord.block_number == proof.block_number).first()
+        steps = merkle.proof_steps(proof.proof, proof.leaf_index, block.claim_count)
+        verified = merkle.verify_proof(content_hash, proof.proof, proof.leaf_index, block.claim_count, block.merkle_root)
+        leaf_index, tree_size = proof.leaf_index, block.claim_count
+    else:
+        block = db.query(BlockchainRecord).filter(BlockchainRecord.claim_id == claim_id).first()
+        if block is None:
+            return None
+        # A per-claim block hashes the claim digest directly
+        steps, leaf_index, tree_size = [], 0, 1
+        verified = block_hash(block.block_number, block.previous_hash, content_hash) == block.hash_value
+
+    return {
+        "claim_id": claim_id,
+        "claim_hash": content_hash,
+        "leaf_hash": merkle.leaf_hash(content_hash).hex() if block.merkle_root else None,
+        "leaf_index": leaf_index,
+        "tree_size": tree_size,
+        "proof": steps,
+        "merkle_root": block.merkle_root,
+        "block_number": block.block_number,
+        "block_hash": block.hash_value,
+        "previous_hash": block.previous_hash,
+        "block_verified": block.is_verified,
+        "verified": verified
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anchor and verify the claim blockchain")
+    commands = parser.add_subparsers(dest="command", required=True)
+    anchor_command = commands.add_parser("anchor", help="Anchor claims not yet covered by a block")
+    anchor_command.add_argument("--mode", choices=["merkle", "per_claim"], default=BLOCKCHAIN_MODE)
+    anchor_command.add_argument("--all", action="store_true", help="Scan every claim, not just the lookback window")
+    anchor_command.add_argument("--every", type=float, nargs="?", const=BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS,
+                                help="Keep running, anchoring one batch every SECONDS")
+    verify = commands.add_parser("verify", help="Verify new blocks, or the whole chain with --full")
+    verify.add_argument("--full", action="store_true", help="Re-verify every block")
+    verify.add_argument("--processes", type=int, default=BLOCKCHAIN_VERIFY_PROCESSES)
+    commands.add_parser("status", help="Show the verification checkpoint")
+    args = parser.parse_args()
+
+    if args.command == "anchor":
+        lookback = None if args.all else BLOCKCHAIN_ANCHOR_LOOKBACK_SECONDS
+        while True:
+            try:
+                result = anchor_pending(args.mode, lookback)
+            except Exception as e:
+                print(f"❌ Anchoring failed: {e}")
+                if not args.every:
+                    return 1
+            else:
+                blocks = ", ".join(str(number) for number in result["blocks"][:5])
+                more = f" (+{len(result['blocks']) - 5} more)" if len(result["blocks"]) > 5 else ""
+                print(f"✅ Anchored {result['claims']:,} claims in {len(result['blocks']):,} block(s)"
+                      + (f": {blocks}{more}" if blocks else "") + f" in {result['seconds']:.2f}s")
+            if not args.every:
+                return 0
+            time.sleep(args.every)
+
+    if args.command == "status":
+        db = SessionLocal()
+        try:
+            print(json.dumps(get_verification_status(db), indent=2, default=str))
+        finally:
+            db.close()
+        return 0
+
+    print(f"🔗 Verifying {'the whole chain' if args.full else 'new blocks'}")
+    try:
+        result = verify_chain(args.processes) if args.full else verify_new_blocks()
+    except Exception as e:
+        print(f"❌ Verification failed: {e}")
+        return 1
+
+    print(f"Blocks: {result['blocks_verified']:,} in {result['seconds']:.2f}s "
+          f"({result['blocks_per_second']:,.0f} blocks/sec)")
+    if result["failure"]:
+        print(f"❌ Chain broken at block {result['failure']['block_number']}: {result['failure']['reason']}")
+        return 1
+    print(f"✅ Chain verified through block {result['checkpoint']:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
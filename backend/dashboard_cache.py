@@ -0,0 +1,255 @@
+"""
+Dashboard Snapshot Cache for KMED Backend
+TTL/LRU cache for dashboard metrics with write invalidation and pluggable backends
+
+Backends are chosen with DASHBOARD_CACHE_BACKEND:
+    memory  - per-process LRU (default)
+    sqlite  - file shared by every worker on the host (DASHBOARD_CACHE_URL is the path)
+    redis   - shared Redis server (DASHBOARD_CACHE_URL is the redis:// URL)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "1024"))
+DASHBOARD_CACHE_BACKEND = os.getenv("DASHBOARD_CACHE_BACKEND", "memory")
+DASHBOARD_CACHE_URL = os.getenv("DASHBOARD_CACHE_URL", "")
+
+# Roles whose metrics depend on the requesting user
+PER_USER_ROLES = {"provider", "patient", "analyst"}
+
+GENERATION_KEY = "dashboard:generation"
+
+
+class MemoryCacheBackend:
+    """In-process cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, max_entries: int = DASHBOARD_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}  # kept out of the LRU so eviction never resets them
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """Cache stored in a local SQLite file so several workers can share snapshots
+
+    Stands in for a shared cache server in development and tests.
+    """
+
+    def __init__(self, path: str, max_entries: int = DASHBOARD_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS dashboard_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[Any]:
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value, expires_at FROM dashboard_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            connection.execute("DELETE FROM dashboard_cache WHERE key = ?", (key,))
+            return None
+        connection.execute("UPDATE dashboard_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        connection = self._connect()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO dashboard_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, default=str), now + ttl if ttl else None, now)
+        )
+        connection.execute(
+            "DELETE FROM dashboard_cache WHERE key IN (SELECT key FROM dashboard_cache "
+            "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def incr(self, key: str) -> int:
+        connection = self._connect()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT value FROM dashboard_cache WHERE key = ?", (key,)).fetchone()
+            value = (json.loads(row[0]) if row else 0) + 1
+            connection.execute(
+                "INSERT OR REPLACE INTO dashboard_cache (key, value, expires_at, accessed_at) VALUES (?, ?, NULL, ?)",
+                (key, json.dumps(value), now)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return value
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM dashboard_cache").fetchone()[0]
+
+
+class RedisCacheBackend:
+    """Cache shared through a Redis server; requires the redis package"""
+
+    def __init__(self, url: str, max_entries: int = DASHBOARD_CACHE_MAX_ENTRIES):
+        import redis  # optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.max_entries = max_entries  # Redis enforces eviction through its own maxmemory policy
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.client.set(key, json.dumps(value, default=str), px=int(ttl * 1000) if ttl else None)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def __len__(self):
+        return int(self.client.dbsize())
+
+
+class DashboardCache:
+    """Per-role dashboard snapshots, invalidated as a whole on every write
+
+    Invalidation bumps a generation counter held in the backend; cache keys
+    embed the generation, so every worker sharing the backend stops reading
+    the stale snapshots at once.
+    """
+
+    def __init__(self, backend, ttl: float = DASHBOARD_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _key(self, role: str, user_id: str) -> str:
+        generation = self.backend.get(GENERATION_KEY) or 0
+        scope = user_id if role in PER_USER_ROLES else "all"
+        return f"dashboard:{generation}:{role}:{scope}"
+
+    def get_or_compute(self, role: str, user_id: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached snapshot for this role/user or compute and store it"""
+        if not self.enabled:
+            return compute()
+
+        try:
+            key = self._key(role, user_id)
+            snapshot = self.backend.get(key)
+        except Exception:
+            # A cache outage must never take the dashboard down
+            self.errors += 1
+            return compute()
+
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        self.misses += 1
+        snapshot = compute()
+        try:
+            self.backend.set(key, snapshot, self.ttl)
+        except Exception:
+            self.errors += 1
+        return snapshot
+
+    def invalidate(self):
+        """Drop every snapshot after a claim or alert write commits"""
+        if not self.enabled:
+            return
+        try:
+            self.backend.incr(GENERATION_KEY)
+            self.invalidations += 1
+        except Exception:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        try:
+            entries = len(self.backend)
+        except Exception:
+            entries = None
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl_seconds": self.ttl,
+            "max_entries": self.backend.max_entries,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "errors": self.errors
+        }
+
+
+def create_backend(name: str = DASHBOARD_CACHE_BACKEND, url: str = DASHBOARD_CACHE_URL):
+    """Build the configured cache backend"""
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "sqlite":
+        return SQLiteCacheBackend(url or "dashboard_cache.db")
+    if name == "redis":
+        return RedisCacheBackend(url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown dashboard cache backend: {name}")
+
+
+dashboard_cache = DashboardCache(create_backend())
@@ -234,11 +234,28 @@ class KMEDTester:
         
         headers = {"Authorization": f"Bearer {admin_token}"}
         
-        # Test that audit logs are created (we can't directly test this without an endpoint)
-        # But we can verify our previous actions were logged by checking the database
-        self.log_test("Audit Trail Creation", True, "Actions logged during previous tests")
+        # Previous tests logged in and changed claims, so the trail is not empty
+        response = self.make_request("GET", "/audit?limit=50", headers=headers)
+        logs = response.json() if response and response.status_code == 200 else []
+        self.log_test("Audit Trail Query", len(logs) > 0, f"Found {len(logs)} audit entries")
+        
+        # Follow the keyset cursor to the next page when there is one
+        next_cursor = response.headers.get("X-Next-Cursor") if response else None
+        if next_cursor:
+            response = self.make_request("GET", f"/audit?limit=50&cursor={next_cursor}", headers=headers)
+            self.log_test("Audit Trail Pagination", response and response.status_code == 200)
+        
+        response = self.make_request("GET", "/audit/export?format=ndjson&action=login", headers=headers)
+        exported = response.text.splitlines() if response and response.status_code == 200 else []
+        self.log_test("Audit Trail Export", len(exported) > 0, f"Exported {len(exported)} login entries")
+        
+        # Patients cannot read the audit trail
+        patient_token = self.tokens.get("patient")
+        if patient_token:
+            response = self.make_request("GET", "/audit", headers={"Authorization": f"Bearer {patient_token}"})
+            self.log_test("Audit Trail Access Control", response and response.status_code == 403)
         
-        return True
+        return len(logs) > 0
     
     def test_compliance_workflows(self):
         """Test compliance workflows"""
@@ -4,14 +4,11 @@ from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from typing import Union
 import logging
-import traceback
 import time
+from logging_config import setup_logging, is_sampled, request_id_var, username_var
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 class KMEDException(Exception):
@@ -50,9 +47,8 @@ class BusinessLogicError(KMEDException):
 
 async def kmed_exception_handler(request: Request, exc: KMEDException):
     """Handle custom KMED exceptions"""
-    logger.error(f"KMED Exception: {exc.error_code} - {exc.message}")
-    logger.error(f"Details: {exc.details}")
-    logger.error(f"Request: {request.method} {request.url}")
+    log_structured(logging.ERROR, "exception", f"KMED Exception: {exc.error_code} - {exc.message}",
+                   method=request.method, path=request.url.path, status=400, details=exc.details)
     
     return JSONResponse(
         status_code=400,
@@ -71,8 +67,8 @@ async def kmed_exception_handler(request: Request, exc: KMEDException):
 
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions"""
-    logger.warning(f"HTTP Exception: {exc.status_code} - {exc.detail}")
-    logger.warning(f"Request: {request.method} {request.url}")
+    log_structured(logging.WARNING, "exception", f"HTTP Exception: {exc.status_code} - {exc.detail}",
+                   method=request.method, path=request.url.path, status=exc.status_code)
     
     return JSONResponse(
         status_code=exc.status_code,
@@ -90,8 +86,9 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle validation exceptions"""
-    logger.warning(f"Validation Error: {exc.errors()}")
-    logger.warning(f"Request: {request.method} {request.url}")
+    log_structured(logging.WARNING, "exception", "Validation Error",
+                   method=request.method, path=request.url.path, status=422,
+                   details={"validation_errors": exc.errors()})
     
     return JSONResponse(
         status_code=422,
@@ -112,9 +109,9 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle all other exceptions"""
-    logger.error(f"Unhandled Exception: {type(exc).__name__} - {str(exc)}")
-    logger.error(f"Traceback: {traceback.format_exc()}")
-    logger.error(f"Request: {request.method} {request.url}")
+    log_structured(logging.ERROR, "exception", f"Unhandled Exception: {type(exc).__name__} - {str(exc)}",
+                   exc_info=(type(exc), exc, exc.__traceback__),
+                   method=request.method, path=request.url.path, status=500)
     
     return JSONResponse(
         status_code=500,
@@ -166,26 +163,58 @@ def create_success_response(data: any = None, message: str = "Operation successf
 
 
 # Logging utilities
-def log_api_request(request: Request, user_id: str = None):
+def request_username(request: Request) -> str:
+    """Username from the request's verified auth context, if any"""
+    auth = getattr(request.state, "auth", None)
+    return auth.username if auth is not None else None
+
+
+def log_structured(level: int, category: str, message: str, exc_info=None, **fields):
+    """Emit a structured record unless its level is disabled or it is sampled out
+
+    The record is serialized later, on the logging thread.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    request_id = fields.pop("request_id", None) or request_id_var.get()
+    if not is_sampled(category, request_id):
+        return
+    fields["category"] = category
+    fields["request_id"] = request_id
+    # user_id is the caller's user ID where known; username comes from the token
+    fields["username"] = fields.get("username") or username_var.get()
+    logger.log(level, message, exc_info=exc_info, extra={"fields": fields})
+
+
+def log_api_request(request: Request, username: str = None):
     """Log API request"""
-    logger.info(f"API Request: {request.method} {request.url.path} - User: {user_id or 'anonymous'}")
+    log_structured(logging.INFO, "api_request", "API Request",
+                   username=username or request_username(request),
+                   method=request.method, path=request.url.path)
 
 
-def log_api_response(request: Request, status_code: int, user_id: str = None):
+def log_api_response(request: Request, status_code: int, username: str = None, duration_ms: float = None):
     """Log API response"""
-    logger.info(f"API Response: {request.method} {request.url.path} - Status: {status_code} - User: {user_id or 'anonymous'}")
+    log_structured(logging.INFO, "api_response" if status_code < 400 else "api_error", "API Response",
+                   username=username or request_username(request),
+                   method=request.method, path=request.url.path,
+                   status=status_code, duration_ms=duration_ms)
 
 
 def log_business_action(action: str, user_id: str, resource_id: str = None, details: dict = None):
     """Log business actions for audit trail"""
-    logger.info(f"Business Action: {action} - User: {user_id} - Resource: {resource_id or 'N/A'} - Details: {details or {}}")
+    log_structured(logging.INFO, "business", "Business Action",
+                   user_id=user_id, action=action, resource_id=resource_id, details=details)
 
 
 def log_security_event(event: str, user_id: str = None, ip_address: str = None, details: dict = None):
     """Log security events"""
-    logger.warning(f"Security Event: {event} - User: {user_id or 'anonymous'} - IP: {ip_address or 'N/A'} - Details: {details or {}}")
+    if ip_address:
+        details = {**(details or {}), "ip_address": ip_address}
+    log_structured(logging.WARNING, "security", f"Security Event: {event}",
+                   user_id=user_id, action=event, details=details)
 
 
 def log_system_error(error: str, context: dict = None):
     """Log system errors"""
-    logger.error(f"System Error: {error} - Context: {context or {}}")
+    log_structured(logging.ERROR, "system", f"System Error: {error}", details=context)
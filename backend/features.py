@@ -0,0 +1,527 @@
+"""
+Claim Feature Store for KMED Backend
+Rolling-window provider and patient history for risk scoring
+
+Per-day counters for each provider and patient (claim count, amount sum and
+sum of squares, flagged count) live in claim_feature_days and are updated in
+the same transaction as the claim write. Only reviewer decisions count as
+flagged: the status the scoring engine assigns at creation never feeds back
+into the flag rate. Each worker keeps the derived 7- and
+30-day features per entity in memory, so scoring looks them up in O(1); the
+counters are re-read after FEATURE_CACHE_TTL seconds or when the day rolls
+over. Commits made through this process are applied to the cached entries
+directly; other workers pick them up when their entry expires.
+
+Usage:
+    python features.py backfill
+    python features.py prune
+    python features.py show provider USR004
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, delete, insert, event, or_
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Claim, ClaimFeatureDay
+from rollups import upsert_counters_many
+
+FEATURE_CACHE_TTL = float(os.getenv("FEATURE_CACHE_TTL", "300"))
+FEATURE_CACHE_MAX_ENTRIES = int(os.getenv("FEATURE_CACHE_MAX_ENTRIES", "100000"))
+FEATURE_BACKFILL_CHUNK_SIZE = int(os.getenv("FEATURE_BACKFILL_CHUNK_SIZE", "50000"))
+
+SHORT_WINDOW_DAYS = 7
+LONG_WINDOW_DAYS = 30
+
+# Reviewer decisions counted towards the flag rate
+FLAGGED_STATUSES = ("flagged", "investigation")
+
+# Claim column holding the key for each entity type
+ENTITY_COLUMNS = {"provider": "provider_id", "patient": "patient_id"}
+ENTITY_FEATURES = {
+    "provider": ["provider_claims_30d", "provider_amount_mean", "provider_amount_std", "provider_flag_rate"],
+    "patient": ["patient_claims_7d", "patient_claims_30d"]
+}
+
+_PENDING_KEY = "feature_deltas"
+
+
+@dataclass(frozen=True)
+class EntityFeatures:
+    """Window features for one provider or patient"""
+    claims_7d: int = 0
+    claims_30d: int = 0
+    amount_mean_30d: float = 0.0
+    amount_std_30d: float = 0.0
+    flag_rate_30d: float = 0.0
+
+    @classmethod
+    def from_buckets(cls, buckets: Dict[date, List[float]], today: date) -> "EntityFeatures":
+        """Sum the daily [count, amount, amount², flagged] buckets inside each window"""
+        short_start = today - timedelta(days=SHORT_WINDOW_DAYS - 1)
+        claims_7d = claims_30d = flagged = 0
+        amount_sum = amount_sq_sum = 0.0
+        for day, (count, amount, amount_sq, flagged_count) in buckets.items():
+            claims_30d += count
+            amount_sum += amount
+            amount_sq_sum += amount_sq
+            flagged += flagged_count
+            if day >= short_start:
+                claims_7d += count
+        if claims_30d <= 0:
+            return cls()
+        mean = amount_sum / claims_30d
+        variance = max(amount_sq_sum / claims_30d - mean * mean, 0.0)
+        return cls(
+            claims_7d=int(claims_7d),
+            claims_30d=int(claims_30d),
+            amount_mean_30d=mean,
+            amount_std_30d=math.sqrt(variance),
+            flag_rate_30d=flagged / claims_30d
+        )
+
+
+def _window_start(today: date) -> date:
+    return today - timedelta(days=LONG_WINDOW_DAYS - 1)
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def _claim_day(created_at) -> date:
+    # Claims not yet flushed have no created_at
+    if created_at is None:
+        return _today()
+    return created_at.date() if isinstance(created_at, datetime) else created_at
+
+
+class FeatureStore:
+    """Per-worker window features with expiry, an entry cap and write-through deltas"""
+
+    def __init__(self, ttl: float = FEATURE_CACHE_TTL, max_entries: int = FEATURE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (entity_type, entity_id) -> [buckets, features, as_of, expires_at]
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _cached(self, key: Tuple[str, str], today: date) -> Optional[EntityFeatures]:
+        entry = self._entries.get(key)
+        if entry is None or entry[2] != today or entry[3] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key: Tuple[str, str], buckets: Dict[date, List[float]], today: date) -> EntityFeatures:
+        features = EntityFeatures.from_buckets(buckets, today)
+        if self.enabled:
+            self._entries[key] = [buckets, features, today, time.monotonic() + self.ttl]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return features
+
+    def get_many(self, db, entity_type: str, entity_ids: Iterable[str]) -> Dict[str, EntityFeatures]:
+        """Features for each id, reading all cache misses in one query"""
+        today = _today()
+        result, missing = {}, []
+        with self._lock:
+            for entity_id in set(entity_ids):
+                features = self._cached((entity_type, entity_id), today) if self.enabled else None
+                if features is None:
+                    missing.append(entity_id)
+                else:
+                    result[entity_id] = features
+            self.hits += len(result)
+            self.misses += len(missing)
+        if not missing:
+            return result
+
+        buckets = {entity_id: {} for entity_id in missing}
+        rows = db.execute(
+            select(
+                ClaimFeatureDay.entity_id, ClaimFeatureDay.day, ClaimFeatureDay.claim_count,
+                ClaimFeatureDay.amount_sum, ClaimFeatureDay.amount_sq_sum, ClaimFeatureDay.flagged_count
+            ).where(
+                ClaimFeatureDay.entity_type == entity_type,
+                ClaimFeatureDay.entity_id.in_(missing),
+                ClaimFeatureDay.day >= _window_start(today)
+            )
+        )
+        for entity_id, day, count, amount, amount_sq, flagged in rows:
+            buckets[entity_id][day] = [count, amount, amount_sq, flagged]
+        with self._lock:
+            for entity_id, entity_buckets in buckets.items():
+                result[entity_id] = self._store((entity_type, entity_id), entity_buckets, today)
+        return result
+
+    def get(self, db, entity_type: str, entity_id: str) -> EntityFeatures:
+        return self.get_many(db, entity_type, [entity_id])[entity_id]
+
+    def apply(self, deltas: Iterable[Tuple[str, str, date, List[float]]]):
+        """Add committed counter deltas to the entries this worker already holds"""
+        today = _today()
+        with self._lock:
+            touched = set()
+            for entity_type, entity_id, day, increments in deltas:
+                entry = self._entries.get((entity_type, entity_id))
+                if entry is None or entry[2] != today or day < _window_start(today):
+                    continue
+                bucket = entry[0].setdefault(day, [0, 0.0, 0.0, 0])
+                for index, value in enumerate(increments):
+                    bucket[index] += value
+                touched.add((entity_type, entity_id))
+            for key in touched:
+                entry = self._entries[key]
+                entry[1] = EntityFeatures.from_buckets(entry[0], today)
+
+    def invalidate(self, entity_type: str, entity_id: str):
+        with self._lock:
+            self._entries.pop((entity_type, entity_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+feature_store = FeatureStore()
+
+
+def scoring_history(provider: bool, patient: bool) -> str:
+    """Claim.scoring_history value for a score that used the given histories"""
+    used = [entity_type for entity_type, flag in (("provider", provider), ("patient", patient)) if flag]
+    return ",".join(used) or "none"
+
+
+def claim_features(db, provider_id: Optional[str], patient_id: Optional[str]) -> Dict[str, float]:
+    """Scoring features for a single claim; a None ID counts as no history"""
+    empty = EntityFeatures()
+    provider = feature_store.get(db, "provider", provider_id) if provider_id else empty
+    patient = feature_store.get(db, "patient", patient_id) if patient_id else empty
+    return {
+        "provider_claims_30d": provider.claims_30d,
+        "provider_amount_mean": provider.amount_mean_30d,
+        "provider_amount_std": provider.amount_std_30d,
+        "provider_flag_rate": provider.flag_rate_30d,
+        "patient_claims_7d": patient.claims_7d,
+        "patient_claims_30d": patient.claims_30d
+    }
+
+
+def feature_frame(db, claims) -> pd.DataFrame:
+    """Scoring features row-aligned with a DataFrame or list of claim dicts holding provider_id and patient_id"""
+    if not isinstance(claims, pd.DataFrame):
+        claims = pd.DataFrame.from_records(list(claims), columns=list(ENTITY_COLUMNS.values()))
+    providers = feature_store.get_many(db, "provider", claims["provider_id"].dropna())
+    patients = feature_store.get_many(db, "patient", claims["patient_id"].dropna())
+    empty = EntityFeatures()
+    provider = claims["provider_id"].map(lambda key: providers.get(key, empty))
+    patient = claims["patient_id"].map(lambda key: patients.get(key, empty))
+    return pd.DataFrame({
+        "provider_claims_30d": provider.map(lambda f: f.claims_30d),
+        "provider_amount_mean": provider.map(lambda f: f.amount_mean_30d),
+        "provider_amount_std": provider.map(lambda f: f.amount_std_30d),
+        "provider_flag_rate": provider.map(lambda f: f.flag_rate_30d),
+        "patient_claims_7d": patient.map(lambda f: f.claims_7d),
+        "patient_claims_30d": patient.map(lambda f: f.claims_30d)
+    }, index=claims.index)
+
+
+def _window_sums(times: np.ndarray, values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Sum ``values`` over times in [start, end) for each window; ``times`` must be sorted"""
+    prefix = np.concatenate([[0.0], np.cumsum(values)])
+    return prefix[np.searchsorted(times, ends, side="left")] - prefix[np.searchsorted(times, starts, side="left")]
+
+
+def _reviewed_counts(created: np.ndarray, reviewed: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                     days: int) -> np.ndarray:
+    """Count items created on or after each start and reviewed before each end
+
+    ``starts`` are midnights and every window spans ``days`` days, so each
+    count is a sum over those days of items from that creation day reviewed
+    before the end. Keying items by (creation day, rank of review time) makes
+    each term an upper minus a lower searchsorted bound.
+    """
+    order = np.sort(reviewed)
+    rank = np.searchsorted(order, reviewed, side="left")
+    limit = np.searchsorted(order, ends, side="left")
+    first = created.astype("datetime64[D]").min()
+    created_day = (created.astype("datetime64[D]") - first).astype(np.int64)
+    start_day = (starts.astype("datetime64[D]") - first).astype(np.int64)
+    width = len(reviewed) + 1
+    keys = np.sort(created_day * width + rank)
+    counts = np.zeros(len(ends), dtype=np.int64)
+    for offset in range(days):
+        lower = (start_day + offset) * width
+        counts += np.searchsorted(keys, lower + limit) - np.searchsorted(keys, lower)
+    return counts
+
+
+def point_in_time_frame(db, claims: pd.DataFrame) -> pd.DataFrame:
+    """feature_frame() as it stood when each claim was created
+
+    ``claims`` holds provider_id, patient_id and created_at, and optionally
+    scoring_history, whose unused histories are left empty. Each row only
+    sees claims created before it and reviews made before it, in the same
+    day-aligned windows as the live store, so training and replays never see
+    the claim itself or anything after it. A review later overturned by
+    another reviewer is not visible before the later decision either.
+    """
+    created = pd.to_datetime(claims["created_at"])
+    days = created.dt.normalize()
+    long_start = (days - pd.Timedelta(days=LONG_WINDOW_DAYS - 1)).to_numpy()
+    short_start = (days - pd.Timedelta(days=SHORT_WINDOW_DAYS - 1)).to_numpy()
+    ends = created.to_numpy()
+
+    history = pd.DataFrame(columns=["provider_id", "patient_id", "created_at", "amount", "reviewed_status", "reviewed_at"])
+    if len(claims):
+        query = select(
+            Claim.provider_id, Claim.patient_id, Claim.created_at, Claim.amount,
+            Claim.reviewed_status, Claim.reviewed_at
+        ).where(
+            Claim.created_at >= pd.Timestamp(long_start.min()).to_pydatetime(),
+            Claim.created_at < pd.Timestamp(ends.max()).to_pydatetime()
+        )
+        entity_ids = {column: set(claims[column].dropna()) for column in ENTITY_COLUMNS.values()}
+        # Small requests (a replay page) read only their entities; training reads the whole range
+        if sum(map(len, entity_ids.values())) <= 1000:
+            query = query.where(or_(*[getattr(Claim, column).in_(ids) for column, ids in entity_ids.items()]))
+        history = pd.DataFrame.from_records(db.execute(query).all(), columns=history.columns)
+    history["created_at"] = pd.to_datetime(history["created_at"])
+    history["reviewed_at"] = pd.to_datetime(history["reviewed_at"])
+    history["amount"] = pd.to_numeric(history["amount"], errors="coerce").fillna(0.0)
+    history["flagged"] = history["reviewed_status"].isin(FLAGGED_STATUSES)
+
+    sums = {}
+    for entity_type, column in ENTITY_COLUMNS.items():
+        count_30d, count_7d, amount, amount_sq, flagged = (np.zeros(len(claims)) for _ in range(5))
+        groups = history.sort_values("created_at").groupby(column)
+        positions = pd.Series(np.arange(len(claims))).groupby(claims[column].to_numpy()).indices
+        for entity_id, rows in positions.items():
+            if entity_id not in groups.groups:
+                continue
+            group = groups.get_group(entity_id)
+            times = group["created_at"].to_numpy()
+            ones = np.ones(len(group))
+            count_30d[rows] = _window_sums(times, ones, long_start[rows], ends[rows])
+            count_7d[rows] = _window_sums(times, ones, short_start[rows], ends[rows])
+            amount[rows] = _window_sums(times, group["amount"].to_numpy(), long_start[rows], ends[rows])
+            amount_sq[rows] = _window_sums(times, group["amount"].to_numpy() ** 2, long_start[rows], ends[rows])
+            reviews = group[group["flagged"] & group["reviewed_at"].notna()]
+            if entity_type == "provider" and len(reviews):
+                flagged[rows] = _reviewed_counts(
+                    reviews["created_at"].to_numpy(), reviews["reviewed_at"].to_numpy(),
+                    long_start[rows], ends[rows], LONG_WINDOW_DAYS
+                )
+        sums[entity_type] = (count_30d, count_7d, amount, amount_sq, flagged)
+
+    count_30d, _, amount, amount_sq, flagged = sums["provider"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count_30d > 0, amount / count_30d, 0.0)
+        variance = np.where(count_30d > 0, np.maximum(amount_sq / count_30d - mean * mean, 0.0), 0.0)
+        flag_rate = np.where(count_30d > 0, flagged / count_30d, 0.0)
+    frame = pd.DataFrame({
+        "provider_claims_30d": count_30d.astype(int),
+        "provider_amount_mean": mean,
+        "provider_amount_std": np.sqrt(variance),
+        "provider_flag_rate": flag_rate,
+        "patient_claims_7d": sums["patient"][1].astype(int),
+        "patient_claims_30d": sums["patient"][0].astype(int)
+    }, index=claims.index)
+    if "scoring_history" in claims:
+        used = claims["scoring_history"].fillna("provider,patient").str.split(",")
+        for entity_type, columns in ENTITY_FEATURES.items():
+            frame.loc[~used.map(lambda entities: entity_type in entities), columns] = 0
+    return frame
+
+
+# Incremental updates
+def _record(db, buckets: Dict[Tuple[str, str, date], List[float]]):
+    """Upsert counter deltas and queue them for the in-memory tier
+
+    On a Session the deltas reach the cache after commit and are dropped on
+    rollback; a Connection has no such hook, so its entities are invalidated.
+    """
+    window_start = _window_start(_today())
+    rows, deltas = [], []
+    for (entity_type, entity_id, day), (count, amount, amount_sq, flagged) in buckets.items():
+        if entity_id is None or day < window_start:
+            continue
+        rows.append({
+            "entity_type": entity_type, "entity_id": entity_id, "day": day,
+            "claim_count": count, "amount_sum": amount, "amount_sq_sum": amount_sq, "flagged_count": flagged
+        })
+        deltas.append((entity_type, entity_id, day, [count, amount, amount_sq, flagged]))
+    upsert_counters_many(db, ClaimFeatureDay, ["entity_type", "entity_id", "day"], rows)
+
+    if isinstance(db, Session):
+        db.info.setdefault(_PENDING_KEY, []).extend(deltas)
+    else:
+        for entity_type, entity_id, _, _ in deltas:
+            feature_store.invalidate(entity_type, entity_id)
+
+
+def _field(claim, name: str):
+    return claim.get(name) if isinstance(claim, dict) else getattr(claim, name)
+
+
+def _entities(claim) -> List[Tuple[str, str]]:
+    return [(entity_type, _field(claim, column)) for entity_type, column in ENTITY_COLUMNS.items()]
+
+
+def record_claims(db, claims: Iterable[Any]):
+    """Count new claims (ORM objects or row dicts) into their provider and patient buckets
+
+    New claims are never flagged here; see record_review().
+    """
+    buckets = defaultdict(lambda: [0, 0.0, 0.0, 0])
+    for claim in claims:
+        amount = float(_field(claim, "amount") or 0.0)
+        day = _claim_day(_field(claim, "created_at"))
+        for entity_type, entity_id in _entities(claim):
+            bucket = buckets[(entity_type, entity_id, day)]
+            bucket[0] += 1
+            bucket[1] += amount
+            bucket[2] += amount * amount
+    _record(db, buckets)
+
+
+def record_claim(db, claim):
+    record_claims(db, [claim])
+
+
+def record_review(db, claim, old_reviewed_status: Optional[str]):
+    """Move a claim in or out of the flagged count after a reviewer changed its reviewed_status"""
+    change = int(claim.reviewed_status in FLAGGED_STATUSES) - int(old_reviewed_status in FLAGGED_STATUSES)
+    if not change:
+        return
+    day = _claim_day(claim.created_at)
+    _record(db, {
+        (entity_type, entity_id, day): [0, 0.0, 0.0, change] for entity_type, entity_id in _entities(claim)
+    })
+
+
+@event.listens_for(Session, "after_commit")
+def apply_committed_deltas(session):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas:
+        feature_store.apply(deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_pending_deltas(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# Batch jobs
+def backfill(db, chunk_size: int = FEATURE_BACKFILL_CHUNK_SIZE) -> Dict[str, int]:
+    """Rebuild every feature row from the claims table with vectorized group-bys
+
+    Claims are read in chunks; each chunk is reduced to per-entity daily sums
+    and the partial sums are combined before the table is replaced.
+    """
+    since = datetime.combine(_window_start(_today()), datetime.min.time())
+    query = (
+        select(Claim.provider_id, Claim.patient_id, Claim.created_at, Claim.amount, Claim.reviewed_status)
+        .where(Claim.created_at >= since)
+    )
+    columns = ["provider_id", "patient_id", "created_at", "amount", "reviewed_status"]
+    partials = {entity_type: [] for entity_type in ENTITY_COLUMNS}
+    result = db.execute(query.execution_options(yield_per=chunk_size))
+    for rows in result.partitions():
+        chunk = pd.DataFrame.from_records(rows, columns=columns)
+        chunk["day"] = pd.to_datetime(chunk["created_at"]).dt.date
+        chunk["amount"] = pd.to_numeric(chunk["amount"], errors="coerce").fillna(0.0)
+        chunk["amount_sq"] = chunk["amount"] ** 2
+        chunk["flagged"] = chunk["reviewed_status"].isin(FLAGGED_STATUSES).astype(int)
+        for entity_type, column in ENTITY_COLUMNS.items():
+            partials[entity_type].append(
+                chunk.groupby([column, "day"]).agg(
+                    claim_count=("amount", "size"),
+                    amount_sum=("amount", "sum"),
+                    amount_sq_sum=("amount_sq", "sum"),
+                    flagged_count=("flagged", "sum")
+                )
+            )
+
+    db.execute(delete(ClaimFeatureDay))
+    counts = {}
+    for entity_type, frames in partials.items():
+        if not frames:
+            counts[entity_type] = 0
+            continue
+        totals = pd.concat(frames).groupby(level=[0, 1]).sum().reset_index()
+        totals = totals.rename(columns={ENTITY_COLUMNS[entity_type]: "entity_id"}).assign(entity_type=entity_type)
+        rows = totals.to_dict("records")
+        if rows:
+            db.execute(insert(ClaimFeatureDay), rows)
+        counts[entity_type] = totals["entity_id"].nunique()
+    db.commit()
+    feature_store.clear()
+    return counts
+
+
+def prune(db) -> int:
+    """Delete counter rows that have left the longest window"""
+    result = db.execute(delete(ClaimFeatureDay).where(ClaimFeatureDay.day < _window_start(_today())))
+    db.commit()
+    return result.rowcount
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("backfill", "prune", "show"):
+        print(__doc__)
+        return 1
+
+    db = SessionLocal()
+    try:
+        if sys.argv[1] == "backfill":
+            start = time.perf_counter()
+            counts = backfill(db)
+            print(f"✅ Backfilled features for {counts['provider']} providers and {counts['patient']} patients "
+                  f"in {time.perf_counter() - start:.2f}s")
+        elif sys.argv[1] == "prune":
+            print(f"✅ Pruned {prune(db)} expired feature rows")
+        else:
+            if len(sys.argv) != 4 or sys.argv[2] not in ENTITY_COLUMNS:
+                print(__doc__)
+                return 1
+            features = feature_store.get(db, sys.argv[2], sys.argv[3])
+            for name, value in asdict(features).items():
+                print(f"{name}: {value}")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
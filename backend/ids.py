@@ -0,0 +1,82 @@
+"""
+ID Generation for KMED Backend
+Monotonic, time-sortable ULID-style record IDs with a type prefix
+
+An ID is the prefix followed by 26 Crockford base32 characters: 48 bits of
+Unix time in milliseconds and 80 random bits. IDs from one process are
+strictly increasing (within a millisecond the random part is incremented),
+so new rows land at the right-hand edge of the primary key B-tree; across
+processes, the 80 random bits make collisions practically impossible.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+ENCODING = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ULID_LENGTH = 26
+RANDOM_BITS = 80
+RANDOM_MAX = (1 << RANDOM_BITS) - 1
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def _reset_after_fork():
+    # A forked worker must not continue the parent's random sequence
+    global _last_ms, _last_random, _lock
+    _lock = threading.Lock()
+    _last_ms = 0
+    _last_random = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(ULID_LENGTH):
+        chars.append(ENCODING[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def _random() -> int:
+    return int.from_bytes(os.urandom(10), "big")
+
+
+def new_ulid(at: Optional[datetime] = None) -> str:
+    """Return a 26-character ULID; monotonic within this process unless ``at`` is given"""
+    global _last_ms, _last_random
+    if at is not None:
+        if at.tzinfo is None:
+            at = at.replace(tzinfo=timezone.utc)
+        return _encode((int(at.timestamp() * 1000) << RANDOM_BITS) | _random())
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms, _last_random = now_ms, _random()
+        elif _last_random < RANDOM_MAX:
+            # Same millisecond, or the clock stepped back: keep counting up
+            _last_random += 1
+        else:
+            _last_ms, _last_random = _last_ms + 1, _random()
+        return _encode((_last_ms << RANDOM_BITS) | _last_random)
+
+
+def new_id(prefix: str, at: Optional[datetime] = None) -> str:
+    """Return a prefixed record ID such as CLM01J9Z3M6Q8V4K7T2X5R0N1B8C"""
+    return f"{prefix}{new_ulid(at)}"
+
+
+def id_timestamp(record_id: str) -> datetime:
+    """Creation time encoded in an ID produced by new_id"""
+    value = 0
+    for char in record_id[-ULID_LENGTH:]:
+        value = (value << 5) | ENCODING.index(char)
+    return datetime.fromtimestamp((value >> RANDOM_BITS) / 1000, timezone.utc).replace(tzinfo=None)
@@ -1,11 +1,14 @@
 from sqlalchemy.orm import Session
-from database import SessionLocal, User, Claim, FraudAlert, AuditLog, BlockchainRecord
-from passlib.context import CryptContext
+from database import SessionLocal, User, Claim, FraudAlert, AuditLog
+from security import pwd_context
+from scoring import score_claims
+from ids import new_id
+import rollups
+import features
+import blockchain
 from datetime import datetime, timedelta
-import uuid
 import random
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import pandas as pd
 
 def create_sample_data():
     db = SessionLocal()
@@ -141,41 +144,10 @@ def create_sample_data():
             }
         ]
         
+        # Claims entered over the past week, the oldest service date first
+        now = datetime.utcnow()
         claims = []
-        for claim_data in claims_data:
-            # Calculate risk score
-            base_score = 0.3
-            if claim_data["amount"] > 3000:
-                base_score += 0.4
-            elif claim_data["amount"] > 2000:
-                base_score += 0.2
-            elif claim_data["amount"] > 1000:
-                base_score += 0.1
-            
-            # Provider pattern risk
-            if claim_data["provider_name"] in ["Dr. Smith"]:
-                base_score += 0.2
-            
-            # Random factor
-            base_score += random.uniform(-0.1, 0.1)
-            risk_score = min(max(base_score, 0.0), 1.0)
-            
-            # Determine risk level
-            if risk_score > 0.7:
-                risk_level = "high"
-            elif risk_score > 0.4:
-                risk_level = "medium"
-            else:
-                risk_level = "low"
-            
-            # Determine status
-            if risk_score > 0.8:
-                status = "flagged"
-            elif risk_score > 0.6:
-                status = "investigation"
-            else:
-                status = random.choice(["pending", "approved"])
-            
+        for index, claim_data in enumerate(claims_data):
             claim = Claim(
                 id=claim_data["id"],
                 patient_id="USR005",  # Jane Patient
@@ -184,13 +156,29 @@ def create_sample_data():
                 provider_name=claim_data["provider_name"],
                 amount=claim_data["amount"],
                 date=claim_data["date"],
-                risk_score=risk_score,
-                risk_level=risk_level,
-                status=status,
-                description=claim_data["description"]
+                risk_score=0.0,
+                risk_level="low",
+                status="pending",
+                description=claim_data["description"],
+                scoring_history=features.scoring_history(True, True),
+                created_at=now - timedelta(days=index, hours=random.randint(0, 8))
             )
             claims.append(claim)
             db.add(claim)
+        db.flush()
+        
+        # Score all sample claims in one batch, each with the history as it stood when it was entered
+        history = features.point_in_time_frame(db, pd.DataFrame.from_records(
+            [(claim.provider_id, claim.patient_id, claim.created_at) for claim in claims],
+            columns=["provider_id", "patient_id", "created_at"]
+        ))
+        scores = score_claims(claims_data, features=history)
+        for claim, (risk_score, risk_level, status) in zip(
+            claims, scores[["risk_score", "risk_level", "status"]].itertuples(index=False)
+        ):
+            claim.risk_score = float(risk_score)
+            claim.risk_level = risk_level
+            claim.status = status
         
         db.commit()
         
@@ -278,43 +266,37 @@ def create_sample_data():
         ]
         
         for log_data in audit_logs:
+            created_at = datetime.utcnow() - timedelta(hours=random.randint(1, 24))
             audit_log = AuditLog(
-                id=str(uuid.uuid4()),
+                id=new_id("AUD", created_at),
                 user_id=log_data["user_id"],
                 action=log_data["action"],
                 resource_type=log_data["resource_type"],
                 resource_id=log_data["resource_id"],
                 details=log_data["details"],
-                created_at=datetime.utcnow() - timedelta(hours=random.randint(1, 24))
+                created_at=created_at
             )
             db.add(audit_log)
         
         db.commit()
         
-        # Create Blockchain Records
-        for claim in claims:
-            # Generate mock hash
-            import hashlib
-            hash_input = f"{claim.id}{claim.amount}{claim.date}{random.random()}"
-            hash_value = hashlib.sha256(hash_input.encode()).hexdigest()
-            
-            blockchain_record = BlockchainRecord(
-                id=str(uuid.uuid4()),
-                claim_id=claim.id,
-                hash_value=hash_value,
-                block_number=random.randint(1000, 9999),
-                is_verified=random.choice([True, False])
-            )
-            db.add(blockchain_record)
-        
+        # Anchor the sample claims on the chain and verify it
+        blockchain.anchor(db, claims)
         db.commit()
+        blockchain.verify_new_blocks()
+        
+        # Build dashboard rollups from the sample claims and alerts
+        rollups.rebuild(db)
+        
+        # Build provider and patient scoring features from the sample claims
+        features.backfill(db)
         
         print("Sample data created successfully!")
         print(f"Created {len(users)} users")
         print(f"Created {len(claims)} claims")
         print(f"Created {len(alerts_data)} fraud alerts")
         print(f"Created {len(audit_logs)} audit logs")
-        print(f"Created {len(claims)} blockchain records")
+        print(f"Anchored {len(claims)} claims on the blockchain")
         
     except Exception as e:
         print(f"Error creating sample data: {e}")
@@ -0,0 +1,236 @@
+"""
+Logging Pipeline for KMED Backend
+Queue-based logging with a background writer thread and rotating log files
+
+Request handlers only put records on a bounded queue; a QueueListener thread
+formats and writes them. When the queue is full, records below WARNING are
+dropped (and counted) rather than stalling the request, while warnings and
+errors wait up to LOG_QUEUE_BLOCK_SECONDS for space.
+
+With LOG_FORMAT=json (the default) every line is a JSON object with a fixed
+set of fields; LOG_SAMPLE_RATES keeps a fraction of each log category, e.g.
+"api_request=0.01,api_response=0.01". Unlisted categories are always logged.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson  # optional, faster serialization
+except ImportError:
+    orjson = None
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "kmed.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_QUEUE_BLOCK_SECONDS = float(os.getenv("LOG_QUEUE_BLOCK_SECONDS", "0.1"))
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Fields present on every structured record, null when not applicable
+STRUCTURED_FIELDS = ("category", "request_id", "user_id", "username", "method", "path", "status",
+                     "duration_ms", "action", "resource_id", "details")
+
+# Request-scoped values set by the request middleware
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+username_var: ContextVar[Optional[str]] = ContextVar("username", default=None)
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse "category=rate,..." into a dict of rates clamped to [0, 1]"""
+    rates = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        category, _, rate = item.partition("=")
+        rates[category.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+sample_rates = parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+def is_sampled(category: str, key: Optional[str] = None) -> bool:
+    """Decide whether to keep a record in ``category``
+
+    With a key (the request id) the decision is deterministic, so a request's
+    request and response lines are kept or dropped together.
+    """
+    rate = sample_rates.get(category, 1.0)
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    if key:
+        return zlib.crc32(key.encode()) / 0xFFFFFFFF < rate
+    return random.random() < rate
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode()
+    return json.dumps(data, separators=(",", ":"), default=str)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; runs on the listener thread"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        data = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for name in STRUCTURED_FIELDS:
+            data[name] = fields.get(name)
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return _dumps(data)
+
+
+class TextFormatter(logging.Formatter):
+    """Classic text lines with the structured fields appended"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " - " + " ".join(f"{name}={value}" for name, value in fields.items() if value is not None)
+        return line
+
+
+def build_formatter(fmt: str = LOG_FORMAT) -> logging.Formatter:
+    return JSONFormatter() if fmt == "json" else TextFormatter()
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler that applies backpressure by level instead of blocking forever"""
+
+    def __init__(self, log_queue: queue.Queue, block_seconds: float = LOG_QUEUE_BLOCK_SECONDS):
+        super().__init__(log_queue)
+        self.block_seconds = block_seconds
+        self.dropped = 0
+        self.dropped_by_level = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now so later mutation cannot change the message;
+        # formatting and traceback rendering happen on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        # The listener thread cannot see the request context, so capture it here
+        if not hasattr(record, "fields") and request_id_var.get() is not None:
+            record.fields = {"request_id": request_id_var.get(), "username": username_var.get()}
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=self.block_seconds)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self.dropped_by_level[record.levelname] = self.dropped_by_level.get(record.levelname, 0) + 1
+
+
+_handler: Optional[BoundedQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_targets: List[logging.Handler] = []
+_lock = threading.Lock()
+
+
+def build_handlers(log_file: Optional[str] = LOG_FILE, console: bool = LOG_CONSOLE) -> List[logging.Handler]:
+    """Handlers run by the listener thread"""
+    formatter = build_formatter()
+    handlers = []
+    if log_file:
+        handlers.append(RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT))
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(handlers: List[logging.Handler], level: str = LOG_LEVEL,
+                      queue_size: int = LOG_QUEUE_SIZE) -> BoundedQueueHandler:
+    """Route the root logger through a fresh queue to ``handlers``"""
+    global _handler, _listener, _targets
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        _handler = BoundedQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _targets = list(handlers)
+        root.addHandler(_handler)
+        root.setLevel(level)
+        _listener.start()
+        return _handler
+
+
+def setup_logging():
+    """Install the queue pipeline once per process"""
+    if _handler is None:
+        configure_logging(build_handlers())
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread
+
+    Anything logged afterwards is written directly by the target handlers.
+    """
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        root = logging.getLogger()
+        root.removeHandler(_handler)
+        for handler in _targets:
+            root.addHandler(handler)
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Queue depth and drop counters for the logging pipeline"""
+    if _handler is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "running": _listener is not None,
+        "queue_depth": _handler.queue.qsize(),
+        "queue_size": _handler.queue.maxsize,
+        "dropped": _handler.dropped,
+        "dropped_by_level": dict(_handler.dropped_by_level)
+    }
+
+
+atexit.register(stop_logging)
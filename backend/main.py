@@ -2,13 +2,13 @@ from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional
 from datetime import datetime, timedelta
 import jwt
 from passlib.context import CryptContext
 import hashlib
-import random
 import json
+import scoring
 
 # Initialize FastAPI app
 app = FastAPI(title="KMED Fraud Detection API", version="1.0.0")
@@ -225,28 +225,6 @@ def get_user(username: str) -> Optional[User]:
         return User(**user_data)
     return None
 
-def calculate_risk_score(claim: Dict[str, Any]) -> float:
-    """Simple risk calculation based on amount and patterns"""
-    base_score = 0.3
-    
-    # Amount-based risk
-    if claim["amount"] > 3000:
-        base_score += 0.4
-    elif claim["amount"] > 2000:
-        base_score += 0.2
-    elif claim["amount"] > 1000:
-        base_score += 0.1
-    
-    # Provider pattern risk (mock)
-    high_risk_providers = ["Dr. Smith"]
-    if claim["provider"] in high_risk_providers:
-        base_score += 0.2
-    
-    # Random factor for simulation
-    base_score += random.uniform(-0.1, 0.1)
-    
-    return min(max(base_score, 0.0), 1.0)
-
 # API Endpoints
 @app.get("/")
 async def root():
@@ -283,17 +261,12 @@ async def get_claims(username: str = Depends(verify_token)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Calculate risk scores for claims
+    # Calculate risk scores for claims in one batch
+    scores = scoring.score_claims(
+        {"amount": claim["amount"], "provider_name": claim["provider"]} for claim in MOCK_CLAIMS
+    )
     claims_with_risk = []
-    for claim in MOCK_CLAIMS:
-        risk_score = calculate_risk_score(claim)
-        if risk_score > 0.7:
-            risk_level = "high"
-        elif risk_score > 0.4:
-            risk_level = "medium"
-        else:
-            risk_level = "low"
-        
+    for claim, risk_level in zip(MOCK_CLAIMS, scores["risk_level"]):
         claim_copy = claim.copy()
         claim_copy["risk"] = risk_level
         claims_with_risk.append(Claim(**claim_copy))
@@ -1,16 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, Query, status, Request, Response, UploadFile, File, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 import jwt
-from passlib.context import CryptContext
 import hashlib
-import random
 import json
 import os
 import time
+import uuid
+import shutil
+import tempfile
 from dotenv import load_dotenv
 import logging
 
@@ -27,18 +29,33 @@ from error_handlers import (
 load_dotenv()
 
 # Database imports
+from sqlalchemy import insert
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import get_db, User, Claim, FraudAlert, AuditLog, BlockchainRecord
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('kmed.log'),
-        logging.StreamHandler()
-    ]
-)
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db, get_pool_status, User, Claim, FraudAlert, AuditLog, BlockchainRecord, ImportJob
+import scoring
+import model_serving
+from scoring_batcher import scoring_batcher
+import import_claims
+from pagination import paginate, NEXT_CURSOR_HEADER
+from security import verify_password
+from replicas import get_read_db, get_replica_status, track_writes
+from user_cache import user_cache
+from tokens import TokenVerifier, get_auth_context
+from logging_config import setup_logging, stop_logging, get_logging_stats, request_id_var, username_var
+from audit_writer import audit_writer
+import audit_partitions
+from audit_trail import audit_conditions, stream_export, AUDIT_READ_ROLES, AUDIT_PAGE_MAX_SIZE, EXPORT_MEDIA_TYPES
+from ids import new_id
+import rollups
+import features
+import blockchain
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Configure logging (queue pipeline with a background writer thread)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
@@ -58,14 +75,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REQUEST_ID_HEADER],
 )
 
 # Security
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
+token_verifier = TokenVerifier(SECRET_KEY, ALGORITHM)
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+CLAIM_BATCH_MAX_SIZE = int(os.getenv("CLAIM_BATCH_MAX_SIZE", "5000"))
+IMPORT_UPLOAD_DIR = os.getenv("IMPORT_UPLOAD_DIR", tempfile.gettempdir())
 
 # Pydantic Models
 class UserLogin(BaseModel):
@@ -105,6 +125,35 @@ class ClaimResponse(BaseModel):
     description: Optional[str]
     created_at: datetime
 
+class ClaimBatchCreate(BaseModel):
+    claims: List[ClaimCreate]
+
+class ClaimBatchItemResult(BaseModel):
+    index: int
+    success: bool
+    claim: Optional[ClaimResponse] = None
+    error: Optional[str] = None
+
+class ClaimBatchResponse(BaseModel):
+    total: int
+    created: int
+    failed: int
+    results: List[ClaimBatchItemResult]
+
+class ImportJobResponse(BaseModel):
+    id: str
+    source: str
+    format: str
+    status: str
+    rows_committed: int
+    chunks_committed: int
+    claims_created: int
+    alerts_created: int
+    rows_rejected: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 class FraudAlertResponse(BaseModel):
     id: str
     claim_id: str
@@ -115,31 +164,41 @@ class FraudAlertResponse(BaseModel):
     is_resolved: bool
     created_at: datetime
 
+class AuditLogResponse(BaseModel):
+    id: str
+    user_id: str
+    action: str
+    resource_type: str
+    resource_id: str
+    details: Optional[str]
+    created_at: datetime
+
+# Pin a client's reads to the primary right after it writes
+app.middleware("http")(track_writes)
+
 # Middleware for logging
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Log all requests and responses"""
     start_time = time.time()
     
-    # Get user info if available
-    user_id = None
-    if "authorization" in request.headers:
-        try:
-            token = request.headers["authorization"].replace("Bearer ", "")
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id = payload.get("sub")
-        except:
-            pass
+    # Correlate every log line of this request
+    request_id = request.headers.get(REQUEST_ID_HEADER, "")[:64] or uuid.uuid4().hex
+    request_id_var.set(request_id)
     
-    log_api_request(request, user_id)
+    # Verify the token once; verify_token and the logging helpers reuse the result
+    auth = get_auth_context(request, token_verifier)
+    username_var.set(auth.username if auth else None)
     
-    response = await call_next(request)
+    log_api_request(request)
     
-    log_api_response(request, response.status_code, user_id)
+    response = await call_next(request)
     
     # Add processing time header
     process_time = time.time() - start_time
+    log_api_response(request, response.status_code, duration_ms=round(1000 * process_time, 2))
     response.headers["X-Process-Time"] = str(process_time)
+    response.headers[REQUEST_ID_HEADER] = request_id
     
     return response
 
@@ -159,29 +218,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         log_system_error("Token creation failed", {"error": str(e)})
         raise KMEDException("Failed to create authentication token", "TOKEN_ERROR")
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def verify_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token"""
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            log_security_event("Invalid token - no username", details={"token": credentials.credentials[:20] + "..."})
-            raise AuthenticationError("Invalid authentication credentials")
-        return username
-    except jwt.ExpiredSignatureError:
+    auth = get_auth_context(request, token_verifier, credentials.credentials)
+    if isinstance(auth.error, jwt.ExpiredSignatureError):
         log_security_event("Token expired", details={"token": credentials.credentials[:20] + "..."})
         raise AuthenticationError("Authentication token has expired")
-    except jwt.PyJWTError as e:
-        log_security_event("Invalid token", details={"error": str(e), "token": credentials.credentials[:20] + "..."})
+    if auth.error is not None:
+        log_security_event("Invalid token", details={"error": str(auth.error), "token": credentials.credentials[:20] + "..."})
         raise AuthenticationError("Invalid authentication token")
+    if auth.username is None:
+        log_security_event("Invalid token - no username", details={"token": credentials.credentials[:20] + "..."})
+        raise AuthenticationError("Invalid authentication credentials")
+    return auth.username
 
-def get_current_user(username: str = Depends(verify_token), db: Session = Depends(get_db)):
+async def get_current_user(username: str = Depends(verify_token), db: AsyncSession = Depends(get_async_db)):
     """Get current user from database"""
     try:
-        user = db.query(User).filter(User.username == username).first()
+        user = user_cache.get(username)
         if user is None:
-            log_security_event("User not found", details={"username": username})
-            raise AuthenticationError("User not found")
+            db_user = (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
+            if db_user is None:
+                log_security_event("User not found", details={"username": username})
+                raise AuthenticationError("User not found")
+            user = user_cache.put(db_user)
         
         if not user.is_active:
             log_security_event("Inactive user attempted access", details={"username": username, "user_id": user.id})
@@ -194,6 +254,14 @@ def get_current_user(username: str = Depends(verify_token), db: Session = Depend
         log_system_error("Database error getting user", {"username": username, "error": str(e)})
         raise DatabaseError("Failed to retrieve user information")
 
+def validate_claim(claim_data: ClaimCreate):
+    """Validate claim business rules"""
+    if claim_data.amount <= 0:
+        raise ValidationError("Claim amount must be positive")
+    
+    if claim_data.date > datetime.utcnow():
+        raise ValidationError("Claim date cannot be in the future")
+
 def check_role_permission(required_role: str, current_role: str):
     """Check if user has required role permission"""
     role_hierarchy = {
@@ -212,42 +280,24 @@ def check_role_permission(required_role: str, current_role: str):
         })
         raise AuthorizationError(f"Insufficient permissions. Required role: {required_role}")
 
-def calculate_risk_score(claim_data: Dict[str, Any]) -> float:
+def calculate_risk_score(claim_data: Dict[str, Any], claim_features: Optional[Dict[str, float]] = None) -> float:
     """Calculate risk score for claim"""
     try:
-        base_score = 0.3
-        
-        # Amount-based risk
-        amount = claim_data.get("amount", 0)
-        if amount > 3000:
-            base_score += 0.4
-        elif amount > 2000:
-            base_score += 0.2
-        elif amount > 1000:
-            base_score += 0.1
-        
-        # Provider pattern risk
-        high_risk_providers = ["Dr. Smith"]
-        provider_name = claim_data.get("provider_name", "")
-        if provider_name in high_risk_providers:
-            base_score += 0.2
-        
-        # Random factor for simulation
-        base_score += random.uniform(-0.1, 0.1)
-        
-        return min(max(base_score, 0.0), 1.0)
+        return scoring_batcher.score(claim_data, claim_features)
     except Exception as e:
         log_system_error("Risk calculation failed", {"claim_data": claim_data, "error": str(e)})
         raise BusinessLogicError("Failed to calculate risk score")
 
 # Authentication Endpoints
 @app.post("/auth/login", response_model=Token)
-async def login(user_credentials: UserLogin, request: Request, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Authenticate user and return JWT token"""
     try:
-        user = db.query(User).filter(User.username == user_credentials.username.lower()).first()
+        user = (await db.execute(
+            select(User).where(User.username == user_credentials.username.lower())
+        )).scalar_one_or_none()
         
-        if not user or not pwd_context.verify(user_credentials.password, user.password_hash):
+        if not user or not await verify_password(user_credentials.password, user.password_hash):
             log_security_event("Login failed", details={
                 "username": user_credentials.username,
                 "ip_address": request.client.host
@@ -269,7 +319,7 @@ async def login(user_credentials: UserLogin, request: Request, db: Session = Dep
         
         # Update last login
         user.last_login = datetime.utcnow()
-        db.commit()
+        await db.commit()
         
         # Log successful login
         log_business_action("user_login", user.id, details={
@@ -279,8 +329,7 @@ async def login(user_credentials: UserLogin, request: Request, db: Session = Dep
         })
         
         # Create audit log
-        audit_log = AuditLog(
-            id=f"AUD{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}",
+        await audit_writer.record_async(
             user_id=user.id,
             action="login",
             resource_type="user",
@@ -288,8 +337,6 @@ async def login(user_credentials: UserLogin, request: Request, db: Session = Dep
             details=f"User {user.username} logged in successfully",
             ip_address=request.client.host
         )
-        db.add(audit_log)
-        db.commit()
         
         return {
             "access_token": access_token,
@@ -312,7 +359,7 @@ async def login(user_credentials: UserLogin, request: Request, db: Session = Dep
         raise DatabaseError("Authentication service temporarily unavailable")
 
 @app.post("/auth/logout")
-async def logout(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def logout(request: Request, current_user: User = Depends(get_current_user)):
     """Logout user"""
     try:
         # Log the logout
@@ -321,8 +368,7 @@ async def logout(request: Request, current_user: User = Depends(get_current_user
             "ip_address": request.client.host
         })
         
-        audit_log = AuditLog(
-            id=f"AUD{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}",
+        audit_writer.record(
             user_id=current_user.id,
             action="logout",
             resource_type="user",
@@ -330,8 +376,6 @@ async def logout(request: Request, current_user: User = Depends(get_current_user
             details=f"User {current_user.username} logged out",
             ip_address=request.client.host
         )
-        db.add(audit_log)
-        db.commit()
         
         return create_success_response(message="Successfully logged out")
         
@@ -354,15 +398,20 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 
 # Claims Endpoints
 @app.get("/claims", response_model=List[ClaimResponse])
-async def get_claims(
+def get_claims(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     risk_level: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Get claims with optional filtering"""
+    """Get claims with optional filtering, newest first
+
+    Pass the X-Next-Cursor header of a page as ``cursor`` to fetch the next one.
+    """
     try:
         query = db.query(Claim)
         
@@ -378,7 +427,12 @@ async def get_claims(
         if risk_level:
             query = query.filter(Claim.risk_level == risk_level)
         
-        claims = query.offset(skip).limit(limit).all()
+        try:
+            claims, next_cursor = paginate(query, Claim, limit, skip=skip, cursor=cursor)
+        except ValueError as e:
+            raise ValidationError(str(e))
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         log_business_action("view_claims", current_user.id, details={
             "count": len(claims),
@@ -401,12 +455,14 @@ async def get_claims(
             for claim in claims
         ]
         
+    except KMEDException:
+        raise
     except Exception as e:
         log_system_error("Failed to retrieve claims", {"user_id": current_user.id, "error": str(e)})
         raise DatabaseError("Failed to retrieve claims")
 
 @app.post("/claims", response_model=ClaimResponse)
-async def create_claim(
+def create_claim(
     claim_data: ClaimCreate,
     request: Request,
     current_user: User = Depends(get_current_user),
@@ -423,28 +479,29 @@ async def create_claim(
             raise AuthorizationError("Not authorized to create claims")
         
         # Validate claim data
-        if claim_data.amount <= 0:
-            raise ValidationError("Claim amount must be positive")
-        
-        if claim_data.date > datetime.utcnow():
-            raise ValidationError("Claim date cannot be in the future")
+        validate_claim(claim_data)
         
         # Generate claim ID
-        claim_id = f"CLM{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}"
+        claim_id = new_id("CLM")
+        patient_id = "USR005"  # Default patient for demo
+        provider_id = current_user.id if current_user.role == "provider" else "USR004"
         
-        # Calculate risk score
+        # Calculate risk score from the claim and its provider's history. The demo
+        # defaults pool every claim, so their history would penalize all of them.
         claim_dict = claim_data.dict()
-        risk_score = calculate_risk_score(claim_dict)
+        own_provider = current_user.role == "provider"
+        history = features.claim_features(db, provider_id if own_provider else None, None)
+        risk_score = calculate_risk_score(claim_dict, history)
         
         # Determine risk level and status
-        risk_level = "high" if risk_score > 0.7 else "medium" if risk_score > 0.4 else "low"
-        status = "flagged" if risk_score > 0.8 else "investigation" if risk_score > 0.6 else "pending"
+        risk_level = scoring.get_risk_level(risk_score)
+        status = scoring.get_claim_status(risk_score, default_status="pending")
         
         # Create claim
         claim = Claim(
             id=claim_id,
-            patient_id="USR005",  # Default patient for demo
-            provider_id=current_user.id if current_user.role == "provider" else "USR004",
+            patient_id=patient_id,
+            provider_id=provider_id,
             patient_name=claim_data.patient_name,
             provider_name=claim_data.provider_name,
             amount=claim_data.amount,
@@ -452,16 +509,19 @@ async def create_claim(
             risk_score=risk_score,
             risk_level=risk_level,
             status=status,
-            description=claim_data.description
+            description=claim_data.description,
+            scoring_history=features.scoring_history(own_provider, False)
         )
         
         db.add(claim)
+        rollups.record_claim(db, claim)
+        features.record_claim(db, claim)
         db.commit()
         db.refresh(claim)
         
         # Create fraud alert if high risk
         if risk_score > 0.7:
-            alert_id = f"ALT{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}"
+            alert_id = new_id("ALT")
             fraud_alert = FraudAlert(
                 id=alert_id,
                 claim_id=claim.id,
@@ -472,6 +532,7 @@ async def create_claim(
                 confidence_score=risk_score
             )
             db.add(fraud_alert)
+            rollups.record_alert_opened(db, fraud_alert.severity)
             db.commit()
         
         # Log the action
@@ -482,8 +543,7 @@ async def create_claim(
             "status": status
         })
         
-        audit_log = AuditLog(
-            id=f"AUD{datetime.utcnow().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}",
+        audit_writer.record(
             user_id=current_user.id,
             action="create_claim",
             resource_type="claim",
@@ -491,8 +551,6 @@ async def create_claim(
             details=f"Created claim {claim.id} with risk score {risk_score:.2f}",
             ip_address=request.client.host
         )
-        db.add(audit_log)
-        db.commit()
         
         return ClaimResponse(
             id=claim.id,
@@ -513,6 +571,496 @@ async def create_claim(
         log_system_error("Claim creation failed", {"user_id": current_user.id, "error": str(e)})
         raise DatabaseError("Failed to create claim")
 
+@app.post("/claims/batch", response_model=ClaimBatchResponse)
+def create_claims_batch(
+    batch: ClaimBatchCreate,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Validate, score and insert a batch of claims in a single transaction"""
+    if current_user.role not in ["provider", "admin"]:
+        log_security_event("Unauthorized batch claim creation attempt", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to create claims")
+    
+    if len(batch.claims) > CLAIM_BATCH_MAX_SIZE:
+        raise ValidationError(
+            f"Batch exceeds maximum size of {CLAIM_BATCH_MAX_SIZE} claims",
+            details={"size": len(batch.claims)}
+        )
+    
+    try:
+        results = [ClaimBatchItemResult(index=index, success=False) for index in range(len(batch.claims))]
+        
+        # Validate each claim, keeping failures as per-item errors
+        valid = []
+        for index, claim_data in enumerate(batch.claims):
+            try:
+                validate_claim(claim_data)
+                valid.append((index, claim_data))
+            except ValidationError as e:
+                results[index].error = e.message
+        
+        if valid:
+            # Score all valid claims in one pass
+            now = datetime.utcnow()
+            provider_id = current_user.id if current_user.role == "provider" else "USR004"
+            patient_id = "USR005"  # Default patient for demo
+            claim_dicts = [
+                dict(claim_data.dict(), provider_id=provider_id, patient_id=patient_id) for _, claim_data in valid
+            ]
+            # As in create_claim, only the authenticated provider's history counts
+            own_provider = current_user.role == "provider"
+            history_ids = {"provider_id": provider_id if own_provider else None, "patient_id": None}
+            scores = model_serving.score_claims(
+                claim_dicts,
+                default_status="pending",
+                features=features.feature_frame(db, [history_ids] * len(claim_dicts))
+            )
+            
+            claim_rows, alert_rows, audit_rows = [], [], []
+            
+            for (index, claim_data), (risk_score, risk_level, claim_status) in zip(
+                valid, scores[["risk_score", "risk_level", "status"]].itertuples(index=False)
+            ):
+                risk_score = float(risk_score)
+                claim_row = {
+                    "id": new_id("CLM"),
+                    "patient_id": patient_id,
+                    "provider_id": provider_id,
+                    "patient_name": claim_data.patient_name,
+                    "provider_name": claim_data.provider_name,
+                    "amount": claim_data.amount,
+                    "date": claim_data.date,
+                    "risk_score": risk_score,
+                    "risk_level": risk_level,
+                    "status": claim_status,
+                    "description": claim_data.description,
+                    "scoring_history": features.scoring_history(own_provider, False),
+                    "created_at": now,
+                    "updated_at": now
+                }
+                claim_rows.append(claim_row)
+                
+                # Create fraud alert if high risk
+                if risk_score > 0.7:
+                    alert_rows.append({
+                        "id": new_id("ALT"),
+                        "claim_id": claim_row["id"],
+                        "user_id": "USR001",  # Analyst user
+                        "type": "fraud",
+                        "severity": "high" if risk_score > 0.8 else "medium",
+                        "description": f"High risk claim detected with score {risk_score:.2f}",
+                        "confidence_score": risk_score,
+                        "is_resolved": False,
+                        "created_at": now
+                    })
+                
+                audit_rows.append({
+                    "id": new_id("AUD"),
+                    "user_id": current_user.id,
+                    "action": "create_claim",
+                    "resource_type": "claim",
+                    "resource_id": claim_row["id"],
+                    "details": f"Created claim {claim_row['id']} with risk score {risk_score:.2f} (batch)",
+                    "ip_address": request.client.host,
+                    "created_at": now
+                })
+                
+                results[index] = ClaimBatchItemResult(
+                    index=index,
+                    success=True,
+                    claim=ClaimResponse(
+                        id=claim_row["id"],
+                        patient_name=claim_row["patient_name"],
+                        provider_name=claim_row["provider_name"],
+                        amount=claim_row["amount"],
+                        date=claim_row["date"],
+                        risk_score=risk_score,
+                        risk_level=risk_level,
+                        status=claim_status,
+                        description=claim_row["description"],
+                        created_at=now
+                    )
+                )
+            
+            # Bulk insert claims, alerts and audit rows in one transaction
+            db.execute(insert(Claim), claim_rows)
+            if alert_rows:
+                db.execute(insert(FraudAlert), alert_rows)
+            db.execute(insert(AuditLog), audit_rows)
+            rollups.record_claims(db, claim_rows)
+            features.record_claims(db, claim_rows)
+            rollups.record_alerts(db, alert_rows)
+            db.commit()
+        
+        created = len(valid)
+        log_business_action("create_claims_batch", current_user.id, details={
+            "total": len(batch.claims),
+            "created": created,
+            "failed": len(batch.claims) - created
+        })
+        
+        return ClaimBatchResponse(
+            total=len(batch.claims),
+            created=created,
+            failed=len(batch.claims) - created,
+            results=results
+        )
+        
+    except KMEDException:
+        raise
+    except Exception as e:
+        db.rollback()
+        log_system_error("Batch claim creation failed", {"user_id": current_user.id, "error": str(e)})
+        raise DatabaseError("Failed to create claims batch")
+
+def run_claim_import(path: str, fmt: str, job_id: str, user_id: str):
+    """Run an uploaded claim import and remove the spooled file when it completes"""
+    try:
+        result = import_claims.import_claims(path, fmt=fmt, job_id=job_id, user_id=user_id)
+        log_business_action("import_claims", user_id, job_id, details={
+            "rows": result["rows"],
+            "claims": result["claims"],
+            "rejected": result["rejected"],
+            "rejects_path": result["rejects_path"],
+            "rows_per_sec": round(result["rows_per_sec"])
+        })
+        os.remove(path)
+    except Exception as e:
+        # Keep the spooled file so the job can be resumed from the CLI
+        log_system_error("Claim import failed", {"job_id": job_id, "path": path, "error": str(e)})
+
+@app.post("/claims/import", response_model=ImportJobResponse, status_code=202)
+def upload_claim_import(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Upload an NDJSON or CSV claim file and import it in the background"""
+    if current_user.role != "admin":
+        log_security_event("Unauthorized claim import attempt", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to import claims")
+    
+    try:
+        # The format becomes part of the spool file name, so only known values are accepted
+        fmt = import_claims.check_format(format) if format else import_claims.detect_format(file.filename or "")
+    except import_claims.ClaimImportError as e:
+        raise ValidationError(str(e))
+    
+    job_id = new_id("IMP")
+    path = os.path.join(IMPORT_UPLOAD_DIR, f"{job_id}.{fmt}")
+    
+    try:
+        # Spool the upload to disk in fixed-size blocks
+        with open(path, "wb") as spool:
+            shutil.copyfileobj(file.file, spool, 1024 * 1024)
+        
+        job = import_claims.load_job(job_id, file.filename or path, fmt, current_user.id)
+    except Exception as e:
+        log_system_error("Claim import upload failed", {"user_id": current_user.id, "error": str(e)})
+        raise DatabaseError("Failed to start claim import")
+    
+    background_tasks.add_task(run_claim_import, path, fmt, job_id, current_user.id)
+    log_business_action("upload_claim_import", current_user.id, job_id, details={"source": file.filename})
+    
+    return ImportJobResponse(
+        id=job.id,
+        source=job.source,
+        format=job.format,
+        status=job.status,
+        rows_committed=job.rows_committed,
+        chunks_committed=job.chunks_committed,
+        claims_created=job.claims_created,
+        alerts_created=job.alerts_created,
+        rows_rejected=job.rows_rejected,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@app.get("/claims/import/{job_id}", response_model=ImportJobResponse)
+def get_claim_import(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Get progress of a claim import job"""
+    if current_user.role != "admin":
+        raise AuthorizationError("Not authorized to view claim imports")
+    
+    job = db.query(ImportJob).filter(ImportJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    
+    return ImportJobResponse(
+        id=job.id,
+        source=job.source,
+        format=job.format,
+        status=job.status,
+        rows_committed=job.rows_committed,
+        chunks_committed=job.chunks_committed,
+        claims_created=job.claims_created,
+        alerts_created=job.alerts_created,
+        rows_rejected=job.rows_rejected,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@app.get("/audit", response_model=List[AuditLogResponse])
+def get_audit_logs(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Get audit log entries matching the filters, newest first (admin and regulator)
+
+    Pass the X-Next-Cursor header of a page as ``cursor`` to fetch the next one.
+    """
+    if current_user.role not in AUDIT_READ_ROLES:
+        log_security_event("Unauthorized audit trail access", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to access the audit trail")
+    
+    try:
+        query = db.query(AuditLog).filter(*audit_conditions(user_id, action, resource_type, resource_id, start, end))
+        try:
+            logs, next_cursor = paginate(query, AuditLog, max(1, min(limit, AUDIT_PAGE_MAX_SIZE)), cursor=cursor)
+        except ValueError as e:
+            raise ValidationError(str(e))
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        
+        return [
+            AuditLogResponse(
+                id=log.id,
+                user_id=log.user_id,
+                action=log.action,
+                resource_type=log.resource_type,
+                resource_id=log.resource_id,
+                details=log.details,
+                created_at=log.created_at
+            )
+            for log in logs
+        ]
+        
+    except KMEDException:
+        raise
+    except Exception as e:
+        log_system_error("Failed to retrieve audit logs", {"user_id": current_user.id, "error": str(e)})
+        raise DatabaseError("Failed to retrieve audit logs")
+
+@app.get("/audit/export")
+def export_audit_logs(
+    export_format: str = Query("ndjson", alias="format"),
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Stream every matching audit log entry as NDJSON or CSV, oldest first (admin and regulator)"""
+    if current_user.role not in AUDIT_READ_ROLES:
+        log_security_event("Unauthorized audit trail export", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to export the audit trail")
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise ValidationError("format must be ndjson or csv")
+    
+    filters = {
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "start": start,
+        "end": end
+    }
+    log_business_action("export_audit_log", current_user.id, details={"format": export_format, "filters": filters})
+    
+    # Exports are themselves audited
+    audit_writer.record(
+        user_id=current_user.id,
+        action="export_audit_log",
+        resource_type="audit_log",
+        resource_id="export",
+        details=json.dumps({name: value for name, value in filters.items() if value is not None}, default=str)
+    )
+    
+    return StreamingResponse(
+        stream_export(db.get_bind(), audit_conditions(**filters), export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="audit_logs.{export_format}"'}
+    )
+
+@app.get("/claims/{claim_id}/proof")
+def get_claim_proof(
+    claim_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Get the Merkle inclusion proof anchoring a claim in the blockchain"""
+    try:
+        claim = db.query(Claim).filter(Claim.id == claim_id).first()
+        if not claim or (current_user.role == "provider" and claim.provider_id != current_user.id) or (
+            current_user.role == "patient" and claim.patient_id != current_user.id
+        ):
+            raise HTTPException(status_code=404, detail="Claim not found")
+        
+        proof = blockchain.get_claim_proof(db, claim_id)
+        if proof is None:
+            raise HTTPException(status_code=404, detail="Claim has not been anchored yet")
+        return create_success_response(data=proof)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_system_error("Failed to build claim proof", {"user_id": current_user.id, "claim_id": claim_id, "error": str(e)})
+        raise DatabaseError("Failed to build claim proof")
+
+@app.get("/blockchain/verify")
+def get_blockchain_verification(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Get the chain verification checkpoint and last run throughput"""
+    if current_user.role not in ["admin", "investigator", "regulator"]:
+        log_security_event("Unauthorized blockchain verification access", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to access blockchain verification")
+    
+    try:
+        return create_success_response(data=blockchain.get_verification_status(db))
+    except Exception as e:
+        log_system_error("Failed to read blockchain verification status", {"user_id": current_user.id, "error": str(e)})
+        raise DatabaseError("Failed to read blockchain verification status")
+
+@app.get("/admin/db-pool")
+async def get_db_pool_stats(current_user: User = Depends(get_current_user)):
+    """Get live database connection pool statistics (admin only)"""
+    if current_user.role != "admin":
+        log_security_event("Unauthorized pool statistics access", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to access pool statistics")
+    
+    return create_success_response(data={**get_pool_status(), "replicas": get_replica_status()})
+
+@app.get("/admin/logging")
+async def get_logging_pipeline_stats(current_user: User = Depends(get_current_user)):
+    """Get logging queue depth and dropped record counts (admin only)"""
+    if current_user.role != "admin":
+        log_security_event("Unauthorized logging statistics access", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to access logging statistics")
+    
+    return create_success_response(data=get_logging_stats())
+
+@app.get("/admin/audit-writer")
+async def get_audit_writer_stats(current_user: User = Depends(get_current_user)):
+    """Get audit writer queue depth and flush latency (admin only)"""
+    if current_user.role != "admin":
+        log_security_event("Unauthorized audit writer statistics access", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to access audit writer statistics")
+    
+    return create_success_response(data=audit_writer.stats())
+
+@app.get("/analytics/model-metrics")
+async def get_model_metrics(current_user: User = Depends(get_current_user)):
+    """Get the live scoring engine, its holdout metrics and per-model latency"""
+    if current_user.role not in ["admin", "analyst", "investigator", "regulator"]:
+        log_security_event("Unauthorized model metrics access", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to access model metrics")
+    
+    return create_success_response(data={
+        **model_serving.model_engine.status(),
+        "batcher": scoring_batcher.stats()
+    })
+
+@app.get("/admin/audit-archive")
+def query_audit_archive(
+    user_id: Optional[str] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 1000,
+    current_user: User = Depends(get_current_user)
+):
+    """Search audit logs archived by audit_partitions.py (admin only)"""
+    if current_user.role != "admin":
+        log_security_event("Unauthorized audit archive access", details={
+            "user_id": current_user.id,
+            "role": current_user.role
+        })
+        raise AuthorizationError("Not authorized to access audit archives")
+    
+    limit = max(1, min(limit, 10000))
+    filters = {
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "start": start,
+        "end": end
+    }
+    records = list(audit_partitions.query_archives(limit=limit, **filters))
+    
+    # Archive searches are themselves audited
+    audit_writer.record(
+        user_id=current_user.id,
+        action="query_audit_archive",
+        resource_type="audit_log",
+        resource_id="archive",
+        details=json.dumps({name: value for name, value in filters.items() if value is not None}, default=str)
+    )
+    
+    return create_success_response(data={
+        "records": records,
+        "count": len(records),
+        "truncated": len(records) == limit
+    })
+
+@app.on_event("shutdown")
+def flush_on_shutdown():
+    """Write out queued audit rows and log records before the worker exits"""
+    audit_writer.flush()
+    stop_logging()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
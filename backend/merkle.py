@@ -0,0 +1,84 @@
+"""
+Merkle Trees for KMED Backend
+Binary SHA-256 Merkle trees with compact inclusion proofs
+
+Leaves and interior nodes are hashed with distinct prefixes (0x00 and 0x01,
+as in RFC 6962) so a leaf can never pass for a node. A node without a
+sibling is promoted to the next level unchanged rather than paired with a
+copy of itself. A proof is the concatenation of the 32-byte sibling hashes
+from leaf to root; which side each sibling is on follows from the leaf index
+and the tree size.
+"""
+
+import hashlib
+from typing import Dict, List, Sequence
+
+HASH_SIZE = 32
+
+
+def leaf_hash(content_hash: str) -> bytes:
+    """Leaf for a hex content digest"""
+    return hashlib.sha256(b"\x00" + bytes.fromhex(content_hash)).digest()
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def build_levels(leaves: Sequence[bytes]) -> List[List[bytes]]:
+    """Every level of the tree, leaves first and the root last"""
+    if not leaves:
+        raise ValueError("A Merkle tree needs at least one leaf")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def build_proof(levels: List[List[bytes]], index: int) -> bytes:
+    """Sibling hashes for leaf ``index``, leaf level first"""
+    siblings = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            siblings.append(level[sibling])
+        index //= 2
+    return b"".join(siblings)
+
+
+def proof_steps(proof: bytes, index: int, tree_size: int) -> List[Dict[str, str]]:
+    """Expand a compact proof into {"position", "hash"} steps from leaf to root"""
+    steps = []
+    offset = 0
+    size = tree_size
+    while size > 1:
+        sibling = index ^ 1
+        if sibling < size:
+            steps.append({
+                "position": "left" if index % 2 else "right",
+                "hash": proof[offset:offset + HASH_SIZE].hex()
+            })
+            offset += HASH_SIZE
+        index //= 2
+        size = (size + 1) // 2
+    return steps
+
+
+def root_from_proof(leaf: bytes, proof: bytes, index: int, tree_size: int) -> bytes:
+    """Recompute the root from a leaf and its proof in O(log n) hashes"""
+    node = leaf
+    for step in proof_steps(proof, index, tree_size):
+        sibling = bytes.fromhex(step["hash"])
+        node = node_hash(sibling, node) if step["position"] == "left" else node_hash(node, sibling)
+    return node
+
+
+def verify_proof(content_hash: str, proof: bytes, index: int, tree_size: int, root: str) -> bool:
+    """Whether ``content_hash`` is leaf ``index`` of the tree with hex ``root``"""
+    if not 0 <= index < tree_size or len(proof) % HASH_SIZE:
+        return False
+    return root_from_proof(leaf_hash(content_hash), proof, index, tree_size).hex() == root
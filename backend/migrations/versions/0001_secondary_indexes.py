@@ -0,0 +1,61 @@
+"""Add secondary indexes for claim, alert and dashboard queries
+
+Revision ID: 0001_secondary_indexes
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_secondary_indexes'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ("ix_claims_created_at_id", "claims", ["created_at", "id"], None),
+    ("ix_claims_provider_id_created_at_id", "claims", ["provider_id", "created_at", "id"], None),
+    ("ix_claims_patient_id_created_at_id", "claims", ["patient_id", "created_at", "id"], None),
+    ("ix_claims_provider_id_status", "claims", ["provider_id", "status"], None),
+    ("ix_claims_patient_id_status", "claims", ["patient_id", "status"], None),
+    ("ix_claims_status", "claims", ["status"], None),
+    ("ix_claims_risk_level", "claims", ["risk_level"], None),
+    ("ix_fraud_alerts_created_at_id", "fraud_alerts", ["created_at", "id"], None),
+    ("ix_fraud_alerts_claim_id", "fraud_alerts", ["claim_id"], None),
+    ("ix_fraud_alerts_user_id_is_resolved_resolved_at", "fraud_alerts", ["user_id", "is_resolved", "resolved_at"], None),
+    ("ix_fraud_alerts_is_resolved_created_at_id", "fraud_alerts", ["is_resolved", "created_at", "id"], None),
+    ("ix_fraud_alerts_unresolved_severity", "fraud_alerts", ["severity", "created_at"], False),
+    ("ix_fraud_alerts_resolved_at", "fraud_alerts", ["resolved_at"], True),
+]
+
+
+def _partial_kwargs(is_resolved):
+    if is_resolved is None:
+        return {}
+    return {
+        "postgresql_where": sa.text(f"is_resolved = {'true' if is_resolved else 'false'}"),
+        "sqlite_where": sa.text(f"is_resolved = {1 if is_resolved else 0}"),
+    }
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns, is_resolved in INDEXES:
+            op.create_index(
+                name, table, columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **_partial_kwargs(is_resolved)
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, is_resolved in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
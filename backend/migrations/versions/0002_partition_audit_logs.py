@@ -0,0 +1,104 @@
+"""Partition audit_logs by month on created_at
+
+Revision ID: 0002_partition_audit_logs
+Revises: 0001_secondary_indexes
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_partition_audit_logs'
+down_revision = '0001_secondary_indexes'
+branch_labels = None
+depends_on = None
+
+
+# Months of empty partitions created ahead of the current one
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, user_id, action, resource_type, resource_id, details, ip_address, user_agent, created_at"
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partition(month: date):
+    name = f"audit_logs_y{month.year:04d}m{month.month:02d}"
+    op.execute(
+        f"CREATE TABLE {name} PARTITION OF audit_logs "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        # Declarative partitioning is PostgreSQL-only; other databases keep the
+        # plain table and audit_partitions.py archives by deleting rows instead
+        return
+
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+    op.execute("ALTER INDEX audit_logs_pkey RENAME TO audit_logs_unpartitioned_pkey")
+
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE audit_logs (
+            id VARCHAR NOT NULL,
+            user_id VARCHAR NOT NULL REFERENCES users (id),
+            action VARCHAR NOT NULL,
+            resource_type VARCHAR NOT NULL,
+            resource_id VARCHAR NOT NULL,
+            details TEXT,
+            ip_address VARCHAR,
+            user_agent TEXT,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    oldest = op.get_bind().execute(sa.text("SELECT min(created_at) FROM audit_logs_unpartitioned")).scalar()
+    current = datetime.utcnow().date().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        _create_partition(month)
+        month = _add_months(month, 1)
+    # Catches rows outside every monthly range so an insert never fails
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+
+    op.execute(f"""
+        INSERT INTO audit_logs ({COLUMNS})
+        SELECT id, user_id, action, resource_type, resource_id, details, ip_address, user_agent,
+               COALESCE(created_at, now() AT TIME ZONE 'utc')
+        FROM audit_logs_unpartitioned
+    """)
+    op.execute("DROP TABLE audit_logs_unpartitioned")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_partitioned")
+    op.execute("ALTER INDEX audit_logs_pkey RENAME TO audit_logs_partitioned_pkey")
+    op.execute("""
+        CREATE TABLE audit_logs (
+            id VARCHAR NOT NULL PRIMARY KEY,
+            user_id VARCHAR NOT NULL REFERENCES users (id),
+            action VARCHAR NOT NULL,
+            resource_type VARCHAR NOT NULL,
+            resource_id VARCHAR NOT NULL,
+            details TEXT,
+            ip_address VARCHAR,
+            user_agent TEXT,
+            created_at TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+    op.execute(f"INSERT INTO audit_logs ({COLUMNS}) SELECT {COLUMNS} FROM audit_logs_partitioned")
+    # Dropping the parent drops every attached partition; archived ones are gone already
+    op.execute("DROP TABLE audit_logs_partitioned")
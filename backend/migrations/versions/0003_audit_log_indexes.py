@@ -0,0 +1,71 @@
+"""Add composite indexes for audit trail queries
+
+Revision ID: 0003_audit_log_indexes
+Revises: 0002_partition_audit_logs
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_audit_log_indexes'
+down_revision = '0002_partition_audit_logs'
+branch_labels = None
+depends_on = None
+
+
+INDEX_PREFIX = "ix_audit_logs_"
+
+# (name, columns)
+INDEXES = [
+    ("ix_audit_logs_created_at_id", ["created_at", "id"]),
+    ("ix_audit_logs_user_id_created_at_id", ["user_id", "created_at", "id"]),
+    ("ix_audit_logs_resource_type_resource_id_created_at_id", ["resource_type", "resource_id", "created_at", "id"]),
+    ("ix_audit_logs_action_created_at_id", ["action", "created_at", "id"]),
+]
+
+
+def _partitions():
+    """Partitions of audit_logs, or None when it is not a partitioned table"""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+    partitioned = bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'audit_logs'::regclass)"
+    )).scalar()
+    if not partitioned:
+        return None
+    return bind.execute(sa.text(
+        "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'audit_logs'::regclass"
+    )).scalars().all()
+
+
+def upgrade() -> None:
+    partitions = _partitions()
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            if partitions is None:
+                op.create_index(name, "audit_logs", columns, postgresql_concurrently=True, if_not_exists=True)
+                continue
+            # A partitioned index cannot be built concurrently: create it on the
+            # parent only, build each partition's index concurrently and attach it
+            column_list = ", ".join(columns)
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY audit_logs ({column_list})")
+            for partition in partitions:
+                child = f"ix_{partition}_{name[len(INDEX_PREFIX):]}"
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} ({column_list})")
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+
+def downgrade() -> None:
+    partitions = _partitions()
+    with op.get_context().autocommit_block():
+        for name, columns in reversed(INDEXES):
+            if partitions is None:
+                op.drop_index(name, table_name="audit_logs", postgresql_concurrently=True, if_exists=True)
+            else:
+                # Dropping a partitioned index drops its attached partition indexes
+                op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,51 @@
+"""Add the blockchain verification checkpoint and unique block numbers
+
+Revision ID: 0004_blockchain_checkpoints
+Revises: 0003_audit_log_indexes
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_blockchain_checkpoints'
+down_revision = '0003_audit_log_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_tables() may already have created it
+    if not sa.inspect(op.get_bind()).has_table("blockchain_checkpoints"):
+        op.create_table(
+            "blockchain_checkpoints",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("block_number", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("hash_value", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=False, server_default="ok"),
+            sa.Column("failed_block_number", sa.Integer(), nullable=True),
+            sa.Column("failure_reason", sa.Text(), nullable=True),
+            sa.Column("last_run_mode", sa.String(), nullable=True),
+            sa.Column("last_run_blocks", sa.Integer(), nullable=True),
+            sa.Column("last_run_seconds", sa.Float(), nullable=True),
+            sa.Column("blocks_per_second", sa.Float(), nullable=True),
+            sa.Column("last_run_at", sa.DateTime(), nullable=True),
+        )
+
+    # Fails if existing records reuse a block number; those chains cannot verify anyway
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_blockchain_records_block_number", "blockchain_records", ["block_number"],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_blockchain_records_block_number", table_name="blockchain_records",
+            postgresql_concurrently=True, if_exists=True
+        )
+    op.drop_table("blockchain_checkpoints")
@@ -0,0 +1,65 @@
+"""Anchor claims in Merkle batch blocks with per-claim proofs
+
+Revision ID: 0005_merkle_blocks
+Revises: 0004_blockchain_checkpoints
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_merkle_blocks'
+down_revision = '0004_blockchain_checkpoints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("blockchain_records")}
+
+    # Batch blocks cover many claims and have no single claim_id
+    with op.batch_alter_table("blockchain_records") as batch:
+        batch.alter_column("claim_id", existing_type=sa.String(), nullable=True)
+        if "merkle_root" not in columns:
+            batch.add_column(sa.Column("merkle_root", sa.String(), nullable=True))
+        if "claim_count" not in columns:
+            batch.add_column(sa.Column("claim_count", sa.Integer(), nullable=True))
+
+    # create_tables() may already have created it
+    if not inspector.has_table("claim_proofs"):
+        op.create_table(
+            "claim_proofs",
+            sa.Column("claim_id", sa.String(), sa.ForeignKey("claims.id"), primary_key=True),
+            sa.Column("block_number", sa.Integer(), nullable=False),
+            sa.Column("leaf_index", sa.Integer(), nullable=False),
+            sa.Column("proof", sa.LargeBinary(), nullable=False),
+        )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_blockchain_records_claim_id", "blockchain_records", ["claim_id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_claim_proofs_block_number_leaf_index", "claim_proofs", ["block_number", "leaf_index"],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_claim_proofs_block_number_leaf_index", table_name="claim_proofs",
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_blockchain_records_claim_id", table_name="blockchain_records",
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_table("claim_proofs")
+
+    # Batch blocks cannot be represented without a claim_id
+    op.execute("DELETE FROM blockchain_records WHERE claim_id IS NULL")
+    with op.batch_alter_table("blockchain_records") as batch:
+        batch.drop_column("claim_count")
+        batch.drop_column("merkle_root")
+        batch.alter_column("claim_id", existing_type=sa.String(), nullable=False)
@@ -0,0 +1,35 @@
+"""Add per-day provider and patient counters for the scoring feature store
+
+Revision ID: 0006_claim_feature_days
+Revises: 0005_merkle_blocks
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_claim_feature_days'
+down_revision = '0005_merkle_blocks'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_tables() may already have created it; fill it with `python features.py backfill`
+    if not sa.inspect(op.get_bind()).has_table("claim_feature_days"):
+        op.create_table(
+            "claim_feature_days",
+            sa.Column("entity_type", sa.String(), primary_key=True),
+            sa.Column("entity_id", sa.String(), primary_key=True),
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("claim_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("amount_sum", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("amount_sq_sum", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("flagged_count", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("claim_feature_days")
@@ -0,0 +1,62 @@
+"""Record reviewer decisions on claims separately from the scored status
+
+Revision ID: 0007_claim_reviews
+Revises: 0006_claim_feature_days
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_claim_reviews'
+down_revision = '0006_claim_feature_days'
+branch_labels = None
+depends_on = None
+
+# Audit actions written when a user sets a claim's status
+REVIEW_ACTIONS = "('update_status', 'flag_claim')"
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("claims")}
+    with op.batch_alter_table("claims") as batch:
+        if "reviewed_status" not in columns:
+            batch.add_column(sa.Column("reviewed_status", sa.String(), nullable=True))
+        if "reviewed_by" not in columns:
+            batch.add_column(sa.Column("reviewed_by", sa.String(), nullable=True))
+            batch.create_foreign_key("fk_claims_reviewed_by_users", "users", ["reviewed_by"], ["id"])
+        if "reviewed_at" not in columns:
+            batch.add_column(sa.Column("reviewed_at", sa.DateTime(), nullable=True))
+
+    # Claims a user already changed keep their current status as the reviewer decision;
+    # run `python features.py backfill` afterwards to rebuild the flag counts
+    op.execute(f"""
+        UPDATE claims SET
+            reviewed_status = status,
+            reviewed_at = (
+                SELECT MAX(audit_logs.created_at) FROM audit_logs
+                WHERE audit_logs.resource_type = 'claim' AND audit_logs.resource_id = claims.id
+                  AND audit_logs.action IN {REVIEW_ACTIONS}
+            ),
+            reviewed_by = (
+                SELECT audit_logs.user_id FROM audit_logs
+                WHERE audit_logs.resource_type = 'claim' AND audit_logs.resource_id = claims.id
+                  AND audit_logs.action IN {REVIEW_ACTIONS}
+                ORDER BY audit_logs.created_at DESC LIMIT 1
+            )
+        WHERE reviewed_status IS NULL AND EXISTS (
+            SELECT 1 FROM audit_logs
+            WHERE audit_logs.resource_type = 'claim' AND audit_logs.resource_id = claims.id
+              AND audit_logs.action IN {REVIEW_ACTIONS}
+        )
+    """)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("claims") as batch:
+        batch.drop_constraint("fk_claims_reviewed_by_users", type_="foreignkey")
+        batch.drop_column("reviewed_at")
+        batch.drop_column("reviewed_by")
+        batch.drop_column("reviewed_status")
@@ -0,0 +1,41 @@
+"""Add the resumable claim import job table
+
+Revision ID: 0008_import_jobs
+Revises: 0007_claim_reviews
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_import_jobs'
+down_revision = '0007_claim_reviews'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_tables() may already have created it
+    if not sa.inspect(op.get_bind()).has_table("import_jobs"):
+        op.create_table(
+            "import_jobs",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("source", sa.String(), nullable=False),
+            sa.Column("format", sa.String(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False, server_default="running"),
+            sa.Column("rows_committed", sa.Integer(), server_default="0"),
+            sa.Column("chunks_committed", sa.Integer(), server_default="0"),
+            sa.Column("claims_created", sa.Integer(), server_default="0"),
+            sa.Column("alerts_created", sa.Integer(), server_default="0"),
+            sa.Column("rows_rejected", sa.Integer(), server_default="0"),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_by", sa.String(), sa.ForeignKey("users.id"), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("import_jobs")
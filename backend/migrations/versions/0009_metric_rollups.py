@@ -0,0 +1,60 @@
+"""Add the per-day dashboard rollups and their running totals
+
+Revision ID: 0009_metric_rollups
+Revises: 0008_import_jobs
+Create Date: 2026-10-18 22:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_metric_rollups'
+down_revision = '0008_import_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # create_tables() may already have created them; fill new ones with `python rollups.py rebuild`
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("claim_rollups"):
+        op.create_table(
+            "claim_rollups",
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("provider_id", sa.String(), primary_key=True),
+            sa.Column("status", sa.String(), primary_key=True),
+            sa.Column("risk_level", sa.String(), primary_key=True),
+            sa.Column("claim_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("amount_total", sa.Float(), nullable=False, server_default="0"),
+        )
+    if not inspector.has_table("alert_rollups"):
+        op.create_table(
+            "alert_rollups",
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("severity", sa.String(), primary_key=True),
+            sa.Column("opened_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("resolved_count", sa.Integer(), nullable=False, server_default="0"),
+        )
+    if not inspector.has_table("metric_totals"):
+        op.create_table(
+            "metric_totals",
+            sa.Column("metric", sa.String(), primary_key=True),
+            sa.Column("value", sa.Integer(), nullable=False, server_default="0"),
+        )
+        # Start the running totals from whatever the rollups already hold
+        op.execute(
+            "INSERT INTO metric_totals (metric, value) "
+            "SELECT 'total_claims', COALESCE(SUM(claim_count), 0) FROM claim_rollups "
+            "UNION ALL SELECT 'high_risk_claims', COALESCE(SUM(claim_count), 0) FROM claim_rollups "
+            "WHERE risk_level = 'high' "
+            "UNION ALL SELECT 'pending_alerts', COALESCE(SUM(opened_count) - SUM(resolved_count), 0) "
+            "FROM alert_rollups"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("metric_totals")
+    op.drop_table("alert_rollups")
+    op.drop_table("claim_rollups")
@@ -0,0 +1,29 @@
+"""Record which provider and patient histories each claim's score used
+
+Revision ID: 0010_claim_scoring_history
+Revises: 0009_metric_rollups
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010_claim_scoring_history'
+down_revision = '0009_metric_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing claims keep NULL: until now every path scored with both histories
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("claims")}
+    if "scoring_history" not in columns:
+        with op.batch_alter_table("claims") as batch:
+            batch.add_column(sa.Column("scoring_history", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("claims") as batch:
+        batch.drop_column("scoring_history")
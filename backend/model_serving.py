@@ -0,0 +1,557 @@
+"""
+Model Serving for KMED Backend
+Scores claims with a versioned scikit-learn model, hot-swapped without restarts
+
+Each model version lives in MODEL_DIR/<version>/ as model.joblib (anything with
+predict_proba) plus metadata.json (feature names and holdout metrics). The
+CURRENT file in MODEL_DIR names the live version. Every worker re-reads it at
+most every MODEL_RELOAD_INTERVAL_SECONDS, loads and warms up a new version on
+a background thread, and only then swaps its model reference; requests in
+flight finish on the model they started with. Until a model is live, or if
+one fails, claims are scored by the rule engine in scoring.py.
+
+Models are unpickled, so MODEL_DIR must only hold models you trained.
+
+Usage:
+    python model_serving.py train [--version v2] [--activate]
+    python model_serving.py list
+    python model_serving.py activate v2
+    python model_serving.py status
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import scoring
+
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+MODEL_ENGINE = os.getenv("MODEL_ENGINE", "auto")  # auto (model when one is active) or rules
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.getenv("MODEL_RELOAD_INTERVAL_SECONDS", "10"))
+MODEL_WARMUP_ROWS = int(os.getenv("MODEL_WARMUP_ROWS", "256"))
+SCORING_MEMO_SIZE = int(os.getenv("SCORING_MEMO_SIZE", "50000"))
+
+MODEL_FILE = "model.joblib"
+METADATA_FILE = "metadata.json"
+POINTER_FILE = "CURRENT"
+RULES_ENGINE = "rules"
+
+# Inputs a model may list in its metadata; history columns come from features.py
+MODEL_FEATURES = ["amount"] + scoring.FEATURE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoadError(Exception):
+    """Raised when a model version cannot be loaded or fails warm-up"""
+
+
+@dataclass
+class LoadedModel:
+    version: str
+    estimator: Any
+    features: List[str]
+    metadata: Dict[str, Any]
+    loaded_at: datetime
+    warmup_ms: float
+
+
+@dataclass
+class EngineStats:
+    """Latency and throughput counters for one engine or model version"""
+    calls: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    latencies_ms: deque = field(default_factory=lambda: deque(maxlen=2048))
+
+    def record(self, rows: int, seconds: float):
+        self.calls += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.latencies_ms.append(1000 * seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "rows_per_second": self.rows / self.seconds if self.seconds else 0.0,
+            "mean_batch_size": self.rows / self.calls if self.calls else 0.0,
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p99": float(np.percentile(latencies, 99))
+        }
+
+
+def _version_dir(version: str, model_dir: str) -> str:
+    if not version or os.sep in version or version.startswith("."):
+        raise ModelLoadError(f"Invalid model version: {version!r}")
+    return os.path.join(model_dir, version)
+
+
+def read_pointer(model_dir: str = MODEL_DIR) -> Optional[str]:
+    """The version named by CURRENT, if any"""
+    try:
+        with open(os.path.join(model_dir, POINTER_FILE)) as pointer:
+            return pointer.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_pointer(version: str, model_dir: str = MODEL_DIR):
+    """Point CURRENT at ``version``; the rename makes the switch atomic for readers"""
+    path = os.path.join(_version_dir(version, model_dir), MODEL_FILE)
+    if not os.path.exists(path):
+        raise ModelLoadError(f"Model version {version} not found in {model_dir}")
+    temp_path = os.path.join(model_dir, f".{POINTER_FILE}.{os.getpid()}")
+    with open(temp_path, "w") as pointer:
+        pointer.write(version + "\n")
+    os.replace(temp_path, os.path.join(model_dir, POINTER_FILE))
+
+
+def list_versions(model_dir: str = MODEL_DIR) -> List[Dict[str, Any]]:
+    versions = []
+    if not os.path.isdir(model_dir):
+        return versions
+    for name in sorted(os.listdir(model_dir)):
+        metadata_path = os.path.join(model_dir, name, METADATA_FILE)
+        if not name.startswith(".") and os.path.exists(metadata_path):
+            with open(metadata_path) as metadata:
+                versions.append(json.load(metadata))
+    return versions
+
+
+def feature_matrix(claims: pd.DataFrame, history: Optional[pd.DataFrame], names: List[str]) -> np.ndarray:
+    """Model inputs in ``names`` order; missing history counts as none"""
+    matrix = np.zeros((len(claims), len(names)))
+    # One conversion for the whole history frame; per-column pandas access dominates single-claim calls
+    positions = {name: index for index, name in enumerate(history.columns)} if history is not None else {}
+    values = history.to_numpy(dtype=float) if positions else None
+    for index, name in enumerate(names):
+        if name == "amount":
+            matrix[:, index] = claims["amount"].to_numpy(dtype=float)
+        elif name in positions:
+            matrix[:, index] = values[:, positions[name]]
+        elif name not in scoring.FEATURE_COLUMNS:
+            raise ModelLoadError(f"Unknown model feature: {name}")
+    return np.nan_to_num(matrix, copy=False)
+
+
+def load_version(version: str, model_dir: str = MODEL_DIR, warmup_rows: int = MODEL_WARMUP_ROWS) -> LoadedModel:
+    """Load a model version and warm it up on synthetic claims before it serves traffic"""
+    import joblib
+
+    path = _version_dir(version, model_dir)
+    try:
+        with open(os.path.join(path, METADATA_FILE)) as metadata_file:
+            metadata = json.load(metadata_file)
+        estimator = joblib.load(os.path.join(path, MODEL_FILE))
+    except Exception as e:
+        raise ModelLoadError(f"Cannot load model {version}: {e}") from e
+
+    names = metadata.get("features", [])
+    unknown = set(names) - set(MODEL_FEATURES)
+    if unknown:
+        raise ModelLoadError(f"Model {version} uses unknown features: {sorted(unknown)}")
+
+    # Warm-up runs predict_proba at single-claim and batch sizes and checks the output
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for rows in sorted({1, max(warmup_rows, 1)}):
+        sample = pd.DataFrame({"amount": rng.uniform(100, 5000, rows)})
+        history = pd.DataFrame({column: rng.uniform(0, 1, rows) for column in scoring.FEATURE_COLUMNS})
+        try:
+            probabilities = estimator.predict_proba(feature_matrix(sample, history, names))
+        except Exception as e:
+            raise ModelLoadError(f"Model {version} failed warm-up: {e}") from e
+        if probabilities.shape != (rows, 2) or not np.all(np.isfinite(probabilities)):
+            raise ModelLoadError(f"Model {version} returned invalid probabilities during warm-up")
+    warmup_ms = 1000 * (time.perf_counter() - start)
+
+    return LoadedModel(version=version, estimator=estimator, features=names, metadata=metadata,
+                       loaded_at=datetime.utcnow(), warmup_ms=warmup_ms)
+
+
+class ScoreMemo:
+    """LRU map from (model version, model input row) to the model's score"""
+
+    def __init__(self, max_entries: int = SCORING_MEMO_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[float]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class ModelEngine:
+    """Per-worker model reference with pointer polling, background swaps and a rules fallback"""
+
+    def __init__(self, model_dir: str = MODEL_DIR, engine: str = MODEL_ENGINE,
+                 reload_interval: float = MODEL_RELOAD_INTERVAL_SECONDS):
+        self.model_dir = model_dir
+        self.engine = engine
+        self.reload_interval = reload_interval
+        self.fallbacks = 0
+        self.last_error = None
+        self._model: Optional[LoadedModel] = None
+        self._target = None  # version being loaded or live
+        self._checked_at = float("-inf")
+        self._loading = False
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EngineStats] = {}
+        self.memo = ScoreMemo()
+
+    @property
+    def model(self) -> Optional[LoadedModel]:
+        return self._model
+
+    def _check_pointer(self):
+        """Start loading the version named by CURRENT when it changes"""
+        if self.engine == RULES_ENGINE:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if self._loading or now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            version = read_pointer(self.model_dir)
+            if version is None or version == self._target:
+                return
+            self._target = version
+            self._loading = True
+
+        if self._model is None:
+            # Nothing is live yet, so load in line rather than serve the first claims from the rules
+            self._load(version)
+        else:
+            threading.Thread(target=self._load, args=(version,), name="model-loader", daemon=True).start()
+
+    def _load(self, version: str):
+        try:
+            model = load_version(version, self.model_dir)
+            self._model = model  # a single reference assignment; callers hold the model they read
+            self.last_error = None
+            logger.info("Model %s is live (warm-up %.1f ms)", version, model.warmup_ms)
+        except ModelLoadError as e:
+            # Keep serving the previous model; a new CURRENT value is retried
+            self.last_error = str(e)
+            logger.error("Model swap to %s failed: %s", version, e)
+        finally:
+            with self._lock:
+                self._loading = False
+
+    def reload(self):
+        """Re-read CURRENT now and wait for any swap to finish"""
+        self._checked_at = float("-inf")
+        self._target = None if self._model is None else self._model.version
+        self._check_pointer()
+        while self._loading:
+            time.sleep(0.01)
+
+    def _record(self, name: str, rows: int, seconds: float):
+        with self._lock:
+            self._stats.setdefault(name, EngineStats()).record(rows, seconds)
+
+    def predict(self, claims: pd.DataFrame, history: Optional[pd.DataFrame] = None,
+                rng: Optional[np.random.Generator] = None, hashes: Optional[List[str]] = None) -> np.ndarray:
+        """Fraud probability per claim from the live model, or rule scores without one
+
+        ``claims`` holds amount and provider_name columns; ``history`` is the
+        row-aligned frame from features.feature_frame(). In deterministic mode
+        the rules draw their jitter from the claims' content ``hashes``,
+        derived from ``claims`` when not given.
+        """
+        self._check_pointer()
+        model = self._model if self.engine != RULES_ENGINE else None
+        if model is not None:
+            scores = self._predict_model(model, claims, history)
+            if scores is not None:
+                return scores
+
+        start = time.perf_counter()
+        draws = None
+        if scoring.deterministic(rng):
+            draws = scoring.seeded_draws(hashes if hashes is not None else scoring.content_hashes(claims))
+        scores = scoring.score_arrays(
+            claims["amount"].to_numpy(), claims["provider_name"].to_numpy(), rng, history, draws
+        )
+        self._record(RULES_ENGINE, len(claims), time.perf_counter() - start)
+        return scores
+
+    def _predict_model(self, model: LoadedModel, claims: pd.DataFrame,
+                       history: Optional[pd.DataFrame]) -> Optional[np.ndarray]:
+        """Model scores, memoized by version and input row; None if the model fails
+
+        A model's score depends only on its input row, so a memoized score is
+        exactly what the model would return, in every worker. The rules are
+        not memoized: they cost less to rerun than a lookup.
+        """
+        start = time.perf_counter()
+        try:
+            inputs = feature_matrix(claims, history, model.features)
+            scores = np.empty(len(inputs))
+            missing = list(range(len(inputs)))
+            keys = None
+            if self.memo.max_entries > 0:
+                keys = [(model.version,) + tuple(row) for row in inputs.tolist()]
+                missing = []
+                for index, key in enumerate(keys):
+                    cached = self.memo.get(key)
+                    if cached is None:
+                        missing.append(index)
+                    else:
+                        scores[index] = cached
+            if missing:
+                fresh = np.clip(model.estimator.predict_proba(inputs[missing])[:, 1], 0.0, 1.0)
+                scores[missing] = fresh
+                if keys is not None:
+                    for index, score in zip(missing, fresh):
+                        self.memo.put(keys[index], float(score))
+        except Exception as e:
+            self.fallbacks += 1
+            self.last_error = str(e)
+            logger.error("Model %s failed to score, using rules: %s", model.version, e)
+            return None
+        self._record(model.version, len(claims), time.perf_counter() - start)
+        return scores
+
+    def status(self) -> Dict[str, Any]:
+        model = self._model if self.engine != RULES_ENGINE else None
+        with self._lock:
+            stats = {name: engine_stats.summary() for name, engine_stats in self._stats.items()}
+        return {
+            "engine": model.version if model else RULES_ENGINE,
+            "configured_engine": self.engine,
+            "model_dir": self.model_dir,
+            "pointer": read_pointer(self.model_dir),
+            "loaded_at": model.loaded_at.isoformat() if model else None,
+            "warmup_ms": model.warmup_ms if model else None,
+            "holdout_metrics": model.metadata.get("metrics", {}) if model else {},
+            "fallbacks": self.fallbacks,
+            "last_error": self.last_error,
+            "scoring_mode": scoring.SCORING_MODE,
+            "memo": self.memo.stats(),
+            "engines": stats
+        }
+
+    def accuracy(self) -> Optional[float]:
+        """Holdout accuracy of the live model; None while the rules are scoring"""
+        model = self._model if self.engine != RULES_ENGINE else None
+        return model.metadata.get("metrics", {}).get("accuracy") if model else None
+
+
+model_engine = ModelEngine()
+
+
+# Drop-in replacements for the scoring.py entry points
+def score_claims(claims: scoring.ClaimBatch, rng: Optional[np.random.Generator] = None,
+                 default_status: Optional[str] = None,
+                 features: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Score a batch of claims with the live engine; same result shape as scoring.score_claims"""
+    if not isinstance(claims, pd.DataFrame):
+        claims = list(claims)
+    frame = scoring.to_frame(claims)
+    hashes = scoring.content_hashes(claims) if scoring.deterministic(rng) else None
+    scores = model_engine.predict(frame, features, rng, hashes)
+    draws = scoring.seeded_draws(hashes) if hashes is not None else None
+    return pd.DataFrame({
+        "risk_score": scores,
+        "risk_level": scoring.get_risk_levels(scores),
+        "status": scoring.get_claim_statuses(scores, rng, default_status, draws)
+    }, index=frame.index)
+
+
+def calculate_risk_score(claim_data: Dict[str, Any], features: Optional[Dict[str, float]] = None) -> float:
+    """Calculate the risk score for a single claim with the live engine"""
+    frame = pd.DataFrame({
+        "amount": [float(claim_data.get("amount", 0) or 0)],
+        "provider_name": [claim_data.get("provider_name", "") or ""]
+    })
+    history = pd.DataFrame({column: [value] for column, value in features.items()}) if features else None
+    return float(model_engine.predict(frame, history, hashes=[scoring.content_hash(claim_data)])[0])
+
+
+# Training
+def train(db, version: Optional[str] = None, model_dir: str = MODEL_DIR,
+          holdout_fraction: float = 0.25) -> Dict[str, Any]:
+    """Fit a model on reviewed claims and publish it as a new version
+
+    Labels are reviewer decisions (reviewed_status), never the status the
+    engine assigned at creation; claims no one reviewed are left out. Inputs
+    are point-in-time features, and the holdout is the most recently created
+    claims, so holdout metrics reflect scoring claims the model has not seen.
+    """
+    import sklearn
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sqlalchemy import select
+
+    from database import Claim
+    import features
+
+    columns = ["amount", "provider_id", "patient_id", "created_at", "reviewed_status"]
+    rows = db.execute(
+        select(*[getattr(Claim, column) for column in columns])
+        .where(Claim.reviewed_status.is_not(None))
+        .order_by(Claim.created_at, Claim.id)
+    ).all()
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    labels = frame["reviewed_status"].isin(features.FLAGGED_STATUSES).astype(int).to_numpy()
+    split = int(len(frame) * (1 - holdout_fraction))
+    if len(frame) < 20 or len(set(labels[:split])) < 2:
+        raise ModelLoadError(
+            "Training needs at least 20 reviewed claims, with both flagged and cleared decisions "
+            "among the older ones"
+        )
+
+    frame["amount"] = pd.to_numeric(frame["amount"], errors="coerce").fillna(0.0)
+    inputs = feature_matrix(frame, features.point_in_time_frame(db, frame), MODEL_FEATURES)
+    train_x, test_x, train_y, test_y = inputs[:split], inputs[split:], labels[:split], labels[split:]
+    estimator = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000, class_weight="balanced"))
+    estimator.fit(train_x, train_y)
+
+    predicted = estimator.predict(test_x)
+    probabilities = estimator.predict_proba(test_x)[:, 1]
+    version = version or datetime.utcnow().strftime("v%Y%m%dT%H%M%S")
+    metadata = {
+        "version": version,
+        "features": MODEL_FEATURES,
+        "labels": "reviewer decisions",
+        "trained_at": datetime.utcnow().isoformat(),
+        "training_rows": len(train_y),
+        "holdout_rows": len(test_y),
+        "holdout_from": frame["created_at"].iloc[split].isoformat(),
+        "sklearn_version": sklearn.__version__,
+        "metrics": {
+            "accuracy": accuracy_score(test_y, predicted),
+            "precision": precision_score(test_y, predicted, zero_division=0),
+            "recall": recall_score(test_y, predicted, zero_division=0),
+            "f1_score": f1_score(test_y, predicted, zero_division=0),
+            "auc_roc": roc_auc_score(test_y, probabilities) if len(set(test_y)) > 1 else None
+        }
+    }
+
+    publish(estimator, metadata, model_dir)
+    return metadata
+
+
+def publish(estimator, metadata: Dict[str, Any], model_dir: str = MODEL_DIR):
+    """Write a model version to a hidden directory and rename it into place"""
+    import joblib
+
+    final_dir = _version_dir(metadata["version"], model_dir)
+    if os.path.exists(final_dir):
+        raise ModelLoadError(f"Model version {metadata['version']} already exists")
+    temp_dir = os.path.join(model_dir, f".{metadata['version']}.partial")
+    os.makedirs(temp_dir, exist_ok=True)
+    try:
+        joblib.dump(estimator, os.path.join(temp_dir, MODEL_FILE))
+        with open(os.path.join(temp_dir, METADATA_FILE), "w") as metadata_file:
+            json.dump(metadata, metadata_file, indent=2)
+        os.rename(temp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train, list and activate scoring models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Fit a model on reviewed claims")
+    train_parser.add_argument("--version", help="Version name (default: a timestamp)")
+    train_parser.add_argument("--activate", action="store_true", help="Make the new version live")
+    subparsers.add_parser("list", help="List model versions")
+    activate_parser = subparsers.add_parser("activate", help="Point CURRENT at a version")
+    activate_parser.add_argument("version")
+    subparsers.add_parser("status", help="Load the live version and report warm-up")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "train":
+            from database import SessionLocal
+            db = SessionLocal()
+            try:
+                metadata = train(db, args.version)
+            finally:
+                db.close()
+            metrics = metadata["metrics"]
+            print(f"✅ Trained model {metadata['version']} on {metadata['training_rows']} reviewed claims")
+            print(f"Holdout accuracy {metrics['accuracy']:.3f}, precision {metrics['precision']:.3f}, "
+                  f"recall {metrics['recall']:.3f}")
+            if args.activate:
+                load_version(metadata["version"])
+                write_pointer(metadata["version"])
+                print(f"✅ Model {metadata['version']} is now live")
+        elif args.command == "list":
+            current = read_pointer()
+            versions = list_versions()
+            if not versions:
+                print(f"No model versions in {MODEL_DIR}; claims are scored by the rules")
+            for metadata in versions:
+                marker = "*" if metadata["version"] == current else " "
+                print(f"{marker} {metadata['version']}  trained {metadata['trained_at']}  "
+                      f"accuracy {metadata['metrics']['accuracy']:.3f}")
+        elif args.command == "activate":
+            # Load first so a broken model never becomes CURRENT
+            model = load_version(args.version)
+            write_pointer(args.version)
+            print(f"✅ Model {args.version} is live; workers switch within {MODEL_RELOAD_INTERVAL_SECONDS:g}s "
+                  f"(warm-up {model.warmup_ms:.1f} ms)")
+        else:
+            model_engine.reload()
+            print(json.dumps(model_engine.status(), indent=2, default=str))
+    except ModelLoadError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
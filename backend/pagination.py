@@ -0,0 +1,56 @@
+"""
+Keyset Pagination for KMED Backend
+Opaque (created_at, id) cursors for stable, constant-time paging
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import literal, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, record_id: str) -> str:
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    payload = json.dumps([created_at.isoformat(), record_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(record_id)
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def paginate(query, model, limit: int, skip: int = 0, cursor: Optional[str] = None):
+    """Return one page of ``query`` newest first and the cursor for the next page
+
+    With a cursor the page starts strictly after the cursor's (created_at, id)
+    key, which the (created_at, id) index serves without scanning skipped rows.
+    Without one, ``skip`` is applied as a plain offset.
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(model.created_at, model.id)
+            < tuple_(literal(created_at, model.created_at.type), literal(record_id, model.id.type))
+        )
+    elif skip:
+        query = query.offset(skip)
+
+    items = query.limit(limit).all()
+
+    next_cursor = None
+    if limit and len(items) == limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return items, next_cursor
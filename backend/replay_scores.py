@@ -0,0 +1,145 @@
+"""
+Score Replay for KMED Backend
+Re-scores historical claims with the current engine and diffs the outcomes
+
+Claims are streamed from the claims table in chunks and scored with the
+provider and patient history as it stood when each claim was created
+(features.point_in_time_frame), limited to the histories recorded in
+Claim.scoring_history, so replaying with an unchanged engine reproduces the
+stored scores and any difference comes from the engine. Scoring must be
+deterministic (SCORING_MODE=deterministic) for a replay to mean anything, so
+each chunk is scored twice and any disagreement is reported.
+
+Only the statuses the score decides (flagged, investigation) are compared:
+below the investigation threshold the status depends on the creation path
+(a simulated review status or a fixed "pending"). Claims a reviewer decided
+keep the reviewer's status and are not compared either.
+
+Usage:
+    python replay_scores.py
+    python replay_scores.py --since 2026-10-01 --limit 10000 --output diffs.csv
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import SessionLocal, Claim
+import features
+import model_serving
+import scoring
+
+REPLAY_COLUMNS = [
+    "id", "patient_id", "provider_id", "patient_name", "provider_name", "amount", "date",
+    "description", "risk_score", "risk_level", "status", "reviewed_status", "scoring_history", "created_at"
+]
+SCORE_TOLERANCE = 1e-9
+# Statuses set by the risk thresholds; lower scores get the creation path's default
+SCORED_STATUSES = ["flagged", "investigation"]
+DEFAULT_STATUS = "default"
+
+
+def replay(db, since=None, limit=None, chunk_size=5000):
+    """Re-score stored claims; returns (diff frame, summary dict)"""
+    query = select(*[getattr(Claim, column) for column in REPLAY_COLUMNS]).order_by(Claim.created_at, Claim.id)
+    if since is not None:
+        query = query.where(Claim.created_at >= since)
+    if limit is not None:
+        query = query.limit(limit)
+
+    diffs = []
+    summary = {"claims": 0, "reviewed": 0, "score_changes": 0, "level_changes": 0, "status_changes": 0,
+               "nondeterministic": 0, "max_abs_delta": 0.0, "level_transitions": None}
+    transitions = []
+    start = time.perf_counter()
+    result = db.execute(query.execution_options(yield_per=chunk_size))
+    for rows in result.partitions():
+        stored = pd.DataFrame.from_records(rows, columns=REPLAY_COLUMNS)
+        history = features.point_in_time_frame(db, stored)
+        # Bypass the memo for the second pass so the comparison really recomputes
+        first = model_serving.score_claims(stored, default_status=DEFAULT_STATUS, features=history)
+        model_serving.model_engine.memo.clear()
+        second = model_serving.score_claims(stored, default_status=DEFAULT_STATUS, features=history)
+        summary["nondeterministic"] += int((~np.isclose(first["risk_score"], second["risk_score"],
+                                                        rtol=0, atol=SCORE_TOLERANCE)).sum())
+
+        frame = stored.assign(
+            new_risk_score=first["risk_score"].to_numpy(),
+            new_risk_level=first["risk_level"].to_numpy(),
+            new_status=first["status"].to_numpy()
+        )
+        frame["delta"] = frame["new_risk_score"] - frame["risk_score"].astype(float)
+        score_changed = frame["delta"].abs() > SCORE_TOLERANCE
+        level_changed = frame["new_risk_level"] != frame["risk_level"]
+        reviewed = frame["reviewed_status"].notna()
+        stored_status = frame["status"].where(frame["status"].isin(SCORED_STATUSES), DEFAULT_STATUS)
+        status_changed = (frame["new_status"] != stored_status) & ~reviewed
+
+        summary["claims"] += len(frame)
+        summary["reviewed"] += int(reviewed.sum())
+        summary["score_changes"] += int(score_changed.sum())
+        summary["level_changes"] += int(level_changed.sum())
+        summary["status_changes"] += int(status_changed.sum())
+        if len(frame):
+            summary["max_abs_delta"] = max(summary["max_abs_delta"], float(frame["delta"].abs().max()))
+        transitions.append(frame[["risk_level", "new_risk_level"]])
+        changed = frame[score_changed | level_changed | status_changed]
+        diffs.append(changed[["id", "created_at", "risk_score", "new_risk_score", "delta",
+                              "risk_level", "new_risk_level", "status", "new_status"]])
+
+    summary["seconds"] = time.perf_counter() - start
+    if transitions:
+        levels = pd.concat(transitions)
+        summary["level_transitions"] = pd.crosstab(levels["risk_level"], levels["new_risk_level"])
+    diff_frame = pd.concat(diffs) if diffs else pd.DataFrame()
+    return diff_frame, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score historical claims and diff the outcomes")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only claims created at or after this time")
+    parser.add_argument("--limit", type=int, help="Maximum number of claims to replay")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--output", help="Write changed claims to this CSV file")
+    parser.add_argument("--top", type=int, default=10, help="Largest score changes to print")
+    args = parser.parse_args()
+
+    if not scoring.deterministic():
+        print("⚠️ SCORING_MODE is not deterministic; replayed scores include random jitter")
+
+    db = SessionLocal()
+    try:
+        diffs, summary = replay(db, args.since, args.limit, args.chunk_size)
+    finally:
+        db.close()
+
+    engine = model_serving.model_engine.status()["engine"]
+    print(f"Replayed {summary['claims']:,} claims with engine {engine} in {summary['seconds']:.2f}s")
+    print(f"Score changes:  {summary['score_changes']:,} (max |delta| {summary['max_abs_delta']:.4f})")
+    print(f"Level changes:  {summary['level_changes']:,}")
+    print(f"Status changes: {summary['status_changes']:,} "
+          f"(flagged/investigation only; {summary['reviewed']:,} claims with reviewer decisions not compared)")
+    if summary["level_transitions"] is not None and summary["level_changes"]:
+        print("\nRisk level transitions (stored -> replayed):")
+        print(summary["level_transitions"].to_string())
+    if len(diffs) and args.top:
+        print("\nChanged claims, largest score changes first:")
+        print(diffs.sort_values("delta", key=lambda delta: delta.abs(), ascending=False)
+              .head(args.top).to_string(index=False))
+    if args.output:
+        diffs.to_csv(args.output, index=False)
+        print(f"\n✅ Wrote {len(diffs):,} changed claims to {args.output}")
+
+    if summary["nondeterministic"]:
+        print(f"❌ {summary['nondeterministic']:,} claims scored differently on a second pass")
+        return 1
+    print("✅ Replay is deterministic")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,178 @@
+"""
+Read Replica Routing for KMED Backend
+Round-robin read sessions over REPLICA_DATABASE_URLS with health-based ejection
+
+GET handlers depend on get_read_db instead of get_db. Writes always use the
+primary, and a client that has just written keeps reading from the primary for
+READ_AFTER_WRITE_SECONDS so it sees its own changes despite replica lag. Recent
+writers are tracked per worker process, keyed by the bearer token.
+"""
+
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+
+from database import SessionLocal, get_pool_options, track_pool, describe_pool
+
+REPLICA_DATABASE_URLS = [url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
+REPLICA_EJECT_SECONDS = float(os.getenv("REPLICA_EJECT_SECONDS", "30"))
+READ_AFTER_WRITE_SECONDS = float(os.getenv("READ_AFTER_WRITE_SECONDS", "5"))
+READ_AFTER_WRITE_MAX_CLIENTS = 10000
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class Replica:
+    """One read replica and its health state"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.engine = create_engine(url, **get_pool_options(url))
+        self.ejected_until = 0.0
+        self.failures = 0
+        self.reads = 0
+        track_pool(name, self.engine)
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def session(self):
+        return SessionLocal(bind=self.engine)
+
+
+class ReplicaRouter:
+    """Hands out replica sessions round-robin, skipping ejected replicas"""
+
+    def __init__(self, urls: List[str], eject_seconds: float = REPLICA_EJECT_SECONDS):
+        self.replicas = [Replica(f"replica{index}", url) for index, url in enumerate(urls)]
+        self.eject_seconds = eject_seconds
+        self.primary_fallbacks = 0
+        self._cursor = itertools.count()
+        self._lock = threading.Lock()
+
+    def candidates(self) -> List[Replica]:
+        """Healthy replicas in round-robin order for this request"""
+        with self._lock:
+            start = next(self._cursor)
+        count = len(self.replicas)
+        ordered = [self.replicas[(start + offset) % count] for offset in range(count)]
+        return [replica for replica in ordered if replica.healthy]
+
+    def eject(self, replica: Replica):
+        """Stop routing reads to a failing replica until its cooldown passes"""
+        replica.failures += 1
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    def open_session(self):
+        """Return (session, replica) for a healthy replica, or (primary session, None)"""
+        for replica in self.candidates():
+            db = replica.session()
+            try:
+                # Check out a connection now so a dead replica fails before the handler runs
+                db.connection()
+            except DBAPIError:
+                db.close()
+                self.eject(replica)
+                continue
+            replica.reads += 1
+            return db, replica
+
+        self.primary_fallbacks += 1
+        return SessionLocal(), None
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "primary_fallbacks": self.primary_fallbacks,
+            "replicas": [
+                {
+                    **describe_pool(replica.name, replica.engine.pool),
+                    "healthy": replica.healthy,
+                    "ejected_for": max(replica.ejected_until - now, 0.0),
+                    "failures": replica.failures,
+                    "reads": replica.reads
+                }
+                for replica in self.replicas
+            ]
+        }
+
+
+class RecentWriters:
+    """Clients that wrote within the read-after-write window"""
+
+    def __init__(self, window: float = READ_AFTER_WRITE_SECONDS, max_clients: int = READ_AFTER_WRITE_MAX_CLIENTS):
+        self.window = window
+        self.max_clients = max_clients
+        self._writes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, key: str):
+        with self._lock:
+            self._writes[key] = time.monotonic() + self.window
+            self._writes.move_to_end(key)
+            while len(self._writes) > self.max_clients:
+                self._writes.popitem(last=False)
+
+    def is_recent(self, key: str) -> bool:
+        with self._lock:
+            expires_at = self._writes.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._writes[key]
+                return False
+            return True
+
+
+replica_router = ReplicaRouter(REPLICA_DATABASE_URLS) if REPLICA_DATABASE_URLS else None
+recent_writers = RecentWriters()
+
+
+def client_key(request: Request) -> Optional[str]:
+    """Identify the client by a digest of its bearer token"""
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+async def track_writes(request: Request, call_next):
+    """HTTP middleware that pins a client's reads to the primary after it writes"""
+    response = await call_next(request)
+    if request.method in WRITE_METHODS and response.status_code < 400:
+        key = client_key(request)
+        if key:
+            recent_writers.record(key)
+    return response
+
+
+def get_read_db(request: Request):
+    """Database session for read-only handlers, served by a replica when possible"""
+    key = client_key(request)
+    if replica_router is None or (key and recent_writers.is_recent(key)):
+        db, replica = SessionLocal(), None
+    else:
+        db, replica = replica_router.open_session()
+    try:
+        yield db
+    except DBAPIError as e:
+        if replica is not None and e.connection_invalidated:
+            replica_router.eject(replica)
+        raise
+    finally:
+        db.close()
+
+
+def get_replica_status() -> Optional[Dict[str, Any]]:
+    """Replica health and pool statistics, or None when no replicas are configured"""
+    return replica_router.status() if replica_router else None
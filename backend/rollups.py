@@ -0,0 +1,243 @@
+"""
+Metric Rollups for KMED Backend
+Incrementally maintained per-day claim and alert counters for the dashboards
+
+All-time dashboard numbers are kept as running totals in metric_totals, so
+the overview never sums the per-day rows.
+
+Usage:
+    python rollups.py rebuild
+"""
+
+import sys
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import select, func, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import SessionLocal, Claim, FraudAlert, User, ClaimRollup, AlertRollup, MetricTotal
+
+
+def _day(value) -> date:
+    if value is None:
+        return datetime.utcnow().date()
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _insert(db):
+    """The dialect's INSERT construct, which supports ON CONFLICT DO UPDATE"""
+    dialect = db.dialect if hasattr(db, "dialect") else db.get_bind().dialect
+    if dialect.name == "postgresql":
+        return postgresql.insert
+    if dialect.name == "sqlite":
+        return sqlite.insert
+    raise ValueError(f"Counter upserts are not supported on {dialect.name}")
+
+
+def upsert_counters(db, model, key: Dict[str, Any], increments: Dict[str, Any]):
+    """Atomically add ``increments`` to the rollup row identified by ``key``
+
+    ``db`` may be a Session or a Connection; the update joins its transaction.
+    """
+    insert = _insert(db)
+    statement = insert(model).values(**key, **increments)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key),
+        set_={column: getattr(model, column) + statement.excluded[column] for column in increments}
+    )
+    db.execute(statement)
+
+
+def upsert_counters_many(db, model, key: List[str], rows: List[Dict[str, Any]]):
+    """Add every row's non-key columns to its counter row in a single executemany"""
+    if not rows:
+        return
+    insert = _insert(db)
+    table = model.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key,
+        set_={column: table.c[column] + statement.excluded[column] for column in rows[0] if column not in key}
+    )
+    db.execute(statement, rows)
+
+
+def add_totals(db, **increments: int):
+    """Add to the running dashboard totals, skipping zero increments"""
+    upsert_counters_many(db, MetricTotal, ["metric"], [
+        {"metric": metric, "value": value} for metric, value in increments.items() if value
+    ])
+
+
+def _record_claim_bucket(db, claim, delta: int, status: str = None):
+    upsert_counters(db, ClaimRollup, {
+        "day": _day(claim.created_at),
+        "provider_id": claim.provider_id,
+        "status": status or claim.status,
+        "risk_level": claim.risk_level
+    }, {
+        "claim_count": delta,
+        "amount_total": delta * claim.amount
+    })
+
+
+def record_claim(db, claim, delta: int = 1):
+    """Count a claim into (or with ``delta=-1`` out of) its rollup bucket and the totals"""
+    _record_claim_bucket(db, claim, delta)
+    add_totals(db, total_claims=delta, high_risk_claims=delta if claim.risk_level == "high" else 0)
+
+
+def record_claims(db, claims: Iterable[Dict[str, Any]]):
+    """Count a batch of claim rows, one upsert per distinct bucket"""
+    buckets = defaultdict(lambda: [0, 0.0])
+    high_risk = 0
+    for claim in claims:
+        key = (_day(claim["created_at"]), claim["provider_id"], claim["status"], claim["risk_level"])
+        buckets[key][0] += 1
+        buckets[key][1] += claim["amount"]
+        high_risk += claim["risk_level"] == "high"
+
+    for (day, provider_id, status, risk_level), (count, amount) in buckets.items():
+        upsert_counters(db, ClaimRollup, {
+            "day": day, "provider_id": provider_id, "status": status, "risk_level": risk_level
+        }, {
+            "claim_count": count, "amount_total": amount
+        })
+    add_totals(db, total_claims=sum(count for count, _ in buckets.values()), high_risk_claims=high_risk)
+
+
+def record_claim_status_change(db, claim, old_status: str):
+    """Move a claim between status buckets"""
+    if old_status == claim.status:
+        return
+    _record_claim_bucket(db, claim, -1, status=old_status)
+    _record_claim_bucket(db, claim, 1)
+
+
+def record_alert_opened(db, severity: str, opened_at=None, count: int = 1):
+    upsert_counters(db, AlertRollup, {"day": _day(opened_at), "severity": severity}, {"opened_count": count})
+    add_totals(db, pending_alerts=count)
+
+
+def record_alert_resolved(db, alert):
+    upsert_counters(db, AlertRollup, {"day": _day(alert.resolved_at), "severity": alert.severity}, {"resolved_count": 1})
+    add_totals(db, pending_alerts=-1)
+
+
+def record_alerts(db, alerts: Iterable[Dict[str, Any]]):
+    """Count a batch of newly opened alert rows"""
+    buckets = defaultdict(int)
+    for alert in alerts:
+        buckets[(_day(alert["created_at"]), alert["severity"])] += 1
+    for (day, severity), count in buckets.items():
+        record_alert_opened(db, severity, day, count)
+
+
+def _parse_day(value) -> date:
+    # SQLite returns date() as text
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return _day(value)
+
+
+def rebuild(db):
+    """Recompute every rollup row and running total from the claims and fraud_alerts tables"""
+    db.execute(delete(ClaimRollup))
+    db.execute(delete(AlertRollup))
+    db.execute(delete(MetricTotal))
+
+    claim_day = func.date(Claim.created_at)
+    rows = db.execute(
+        select(
+            claim_day, Claim.provider_id, Claim.status, Claim.risk_level,
+            func.count(), func.coalesce(func.sum(Claim.amount), 0.0)
+        ).group_by(claim_day, Claim.provider_id, Claim.status, Claim.risk_level)
+    ).all()
+    for day, provider_id, status, risk_level, count, amount in rows:
+        db.add(ClaimRollup(day=_parse_day(day), provider_id=provider_id, status=status,
+                           risk_level=risk_level, claim_count=count, amount_total=amount))
+
+    alert_counts = defaultdict(lambda: [0, 0])
+    opened_day = func.date(FraudAlert.created_at)
+    for day, severity, count in db.execute(
+        select(opened_day, FraudAlert.severity, func.count()).group_by(opened_day, FraudAlert.severity)
+    ):
+        alert_counts[(_parse_day(day), severity)][0] += count
+
+    resolved_day = func.date(FraudAlert.resolved_at)
+    for day, severity, count in db.execute(
+        select(resolved_day, FraudAlert.severity, func.count())
+        .where(FraudAlert.is_resolved == True, FraudAlert.resolved_at.isnot(None))
+        .group_by(resolved_day, FraudAlert.severity)
+    ):
+        alert_counts[(_parse_day(day), severity)][1] += count
+
+    for (day, severity), (opened, resolved) in alert_counts.items():
+        db.add(AlertRollup(day=day, severity=severity, opened_count=opened, resolved_count=resolved))
+
+    totals = {
+        "total_claims": sum(row[4] for row in rows),
+        "high_risk_claims": sum(row[4] for row in rows if row[3] == "high"),
+        "pending_alerts": sum(opened - resolved for opened, resolved in alert_counts.values())
+    }
+    for metric, value in totals.items():
+        db.add(MetricTotal(metric=metric, value=value))
+
+    db.commit()
+    return len(rows), len(alert_counts)
+
+
+def _total(metric: str):
+    return func.coalesce(
+        select(MetricTotal.value).where(MetricTotal.metric == metric).scalar_subquery(), 0
+    ).label(metric)
+
+
+def overview_metrics(db) -> Dict[str, Any]:
+    """Read the admin, investigator and regulator dashboard numbers from the rollups
+
+    Every part is a primary key lookup or today's few alert buckets, so the
+    cost does not grow with history.
+    """
+    today = datetime.utcnow().date()
+    resolved_today = select(
+        func.coalesce(func.sum(AlertRollup.resolved_count), 0)
+    ).where(AlertRollup.day == today).scalar_subquery()
+    active_users = select(func.count()).select_from(User).where(User.is_active == True).scalar_subquery()
+
+    metrics = db.execute(
+        select(
+            _total("total_claims"),
+            _total("high_risk_claims"),
+            _total("pending_alerts"),
+            resolved_today.label("resolved_today"),
+            active_users.label("active_users")
+        )
+    ).one()
+    return dict(metrics._mapping)
+
+
+def main():
+    if sys.argv[1:] != ["rebuild"]:
+        print(__doc__)
+        return 1
+
+    print("🔄 Rebuilding metric rollups")
+    db = SessionLocal()
+    try:
+        claim_buckets, alert_buckets = rebuild(db)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rebuild failed: {e}")
+        return 1
+    finally:
+        db.close()
+
+    print(f"✅ Rebuilt {claim_buckets} claim buckets and {alert_buckets} alert buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,232 @@
+"""
+Scoring Micro-Batcher for KMED Backend
+Coalesces concurrent single-claim scoring calls into one vectorized engine call
+
+Callers submit a claim and get a future. A background thread collects requests
+until SCORING_BATCH_MAX_SIZE claims are waiting or SCORING_BATCH_MAX_WAIT_MS
+has passed since the oldest one arrived, scores them with a single
+model_engine.predict() call and resolves every future. A batch that fails is
+re-scored one claim at a time, so only the failing claims get the error. A
+full queue or a disabled batcher scores the claim in the caller's thread
+instead.
+"""
+
+import asyncio
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from model_serving import model_engine
+import scoring
+
+SCORING_BATCH_ENABLED = os.getenv("SCORING_BATCH_ENABLED", "true").lower() == "true"
+SCORING_BATCH_MAX_SIZE = int(os.getenv("SCORING_BATCH_MAX_SIZE", "32"))
+SCORING_BATCH_MAX_WAIT_MS = float(os.getenv("SCORING_BATCH_MAX_WAIT_MS", "2"))
+SCORING_BATCH_QUEUE_SIZE = int(os.getenv("SCORING_BATCH_QUEUE_SIZE", "10000"))
+SCORING_BATCH_TIMEOUT_SECONDS = float(os.getenv("SCORING_BATCH_TIMEOUT_SECONDS", "10"))
+
+_STOP = object()
+
+
+class _Request:
+    __slots__ = ("claim", "features", "future", "enqueued_at")
+
+    def __init__(self, claim: Dict[str, Any], features: Optional[Dict[str, float]]):
+        self.claim = claim
+        self.features = features
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def _predict(claims: pd.DataFrame, history: Optional[pd.DataFrame], hashes: Optional[List[str]]) -> np.ndarray:
+    return model_engine.predict(claims, history, hashes=hashes)
+
+
+def _resolve(future: Future, result: Optional[float] = None, exception: Optional[BaseException] = None):
+    """Complete a future unless its caller already cancelled it"""
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class ScoringBatcher:
+    """Queues scoring requests and scores them in batches from a background thread"""
+
+    def __init__(self, max_size: int = SCORING_BATCH_MAX_SIZE, max_wait_ms: float = SCORING_BATCH_MAX_WAIT_MS,
+                 queue_size: int = SCORING_BATCH_QUEUE_SIZE, enabled: bool = SCORING_BATCH_ENABLED,
+                 predict: Callable[..., np.ndarray] = _predict):
+        self.max_size = max(max_size, 1)
+        self.max_wait = max_wait_ms / 1000
+        self.enabled = enabled
+        self.predict = predict
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.direct = 0
+        self.batches = 0
+        self.scored = 0
+        self.failed = 0
+        self._fill_total = 0.0
+        self._score_ms_total = 0.0
+        self._wait_ms = deque(maxlen=4096)
+
+    def submit(self, claim: Dict[str, Any], features: Optional[Dict[str, float]] = None) -> Future:
+        """Queue a claim for scoring; the future resolves to its risk score"""
+        request = _Request(claim, features)
+        if self.enabled:
+            self._ensure_started()
+            try:
+                self._queue.put_nowait(request)
+                self.submitted += 1
+                return request.future
+            except queue.Full:
+                pass
+        self.direct += 1
+        self._score([request], record=False)
+        return request.future
+
+    def score(self, claim: Dict[str, Any], features: Optional[Dict[str, float]] = None,
+              timeout: Optional[float] = SCORING_BATCH_TIMEOUT_SECONDS) -> float:
+        """Score one claim, blocking the calling thread until its batch is done
+
+        Raises concurrent.futures.TimeoutError if no result arrives within ``timeout`` seconds.
+        """
+        return self.submit(claim, features).result(timeout)
+
+    async def score_async(self, claim: Dict[str, Any], features: Optional[Dict[str, float]] = None) -> float:
+        """Score one claim without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(claim, features))
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="scoring-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._drain()
+                return
+            batch = [item]
+            deadline = item.enqueued_at + self.max_wait
+            stop = False
+            while len(batch) < self.max_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._score(batch)
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.max_size:
+                self._score(batch)
+                batch = []
+        if batch:
+            self._score(batch)
+
+    def _score(self, batch: List[_Request], record: bool = True):
+        """Score a batch in one engine call and resolve its futures"""
+        start = time.perf_counter()
+        try:
+            # Any failure, including a malformed claim, fails the batch's futures instead of the thread
+            claims = pd.DataFrame({
+                "amount": [float(request.claim.get("amount", 0) or 0) for request in batch],
+                "provider_name": [request.claim.get("provider_name", "") or "" for request in batch]
+            })
+            history = None
+            if any(request.features for request in batch):
+                history = pd.DataFrame.from_records([request.features or {} for request in batch]).fillna(0.0)
+            hashes = [scoring.content_hash(request.claim) for request in batch] if scoring.deterministic() else None
+            scores = [float(score) for score in self.predict(claims, history, hashes)]
+            if len(scores) != len(batch):
+                raise ValueError(f"Engine returned {len(scores)} scores for {len(batch)} claims")
+        except Exception as e:
+            if len(batch) > 1:
+                # Score the claims one by one so only the claims that fail see the error
+                for request in batch:
+                    self._score([request], record=False)
+                return
+            self.failed += 1
+            _resolve(batch[0].future, exception=e)
+            return
+        for request, score in zip(batch, scores):
+            _resolve(request.future, score)
+
+        if record:
+            with self._lock:
+                self.batches += 1
+                self.scored += len(batch)
+                self._fill_total += len(batch) / self.max_size
+                self._score_ms_total += 1000 * (time.perf_counter() - start)
+                self._wait_ms.extend(1000 * (start - request.enqueued_at) for request in batch)
+
+    def stop(self, timeout: float = 10.0):
+        """Score everything queued so far and stop the batcher thread"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            self._drain()
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = np.array(self._wait_ms) if self._wait_ms else np.zeros(1)
+            return {
+                "enabled": self.enabled,
+                "max_batch_size": self.max_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "scored_directly": self.direct,
+                "batches": self.batches,
+                "scored": self.scored,
+                "failed": self.failed,
+                "mean_batch_size": self.scored / self.batches if self.batches else 0.0,
+                "fill_ratio": self._fill_total / self.batches if self.batches else 0.0,
+                "avg_batch_score_ms": self._score_ms_total / self.batches if self.batches else 0.0,
+                "queue_wait_ms_p50": float(np.percentile(waits, 50)),
+                "queue_wait_ms_p99": float(np.percentile(waits, 99))
+            }
+
+
+scoring_batcher = ScoringBatcher()
+atexit.register(scoring_batcher.stop)
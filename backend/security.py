@@ -0,0 +1,24 @@
+"""
+Password Hashing for KMED Backend
+Runs bcrypt on a bounded thread pool so it never blocks the event loop
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt releases the GIL, so a few threads verify passwords in parallel
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+async def verify_password(plain_password: str, password_hash: str) -> bool:
+    """Check a password against its bcrypt hash off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, pwd_context.verify, plain_password, password_hash)
+
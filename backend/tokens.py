@@ -0,0 +1,101 @@
+"""
+JWT Verification for KMED Backend
+Request-scoped auth context and an LRU of recently verified tokens
+
+A token is verified once per request (the result lives on request.state.auth)
+and valid tokens are cached per worker until they expire, so repeat requests
+skip the signature check.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import jwt
+from fastapi import Request
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass
+class AuthContext:
+    """Outcome of verifying one bearer token"""
+    token: str
+    payload: Optional[Dict[str, Any]] = None
+    error: Optional[jwt.PyJWTError] = None
+
+    @property
+    def username(self) -> Optional[str]:
+        return self.payload.get("sub") if self.payload else None
+
+
+class TokenVerifier:
+    """Verifies JWTs and remembers valid ones until they expire
+
+    Entries are keyed by the whole token rather than its signature segment,
+    so a cached signature can never vouch for a different header or payload.
+    """
+
+    def __init__(self, secret_key: str, algorithm: str, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Return the token's claims, raising jwt.PyJWTError if it is invalid or expired"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                payload, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return payload
+                del self._entries[token]
+            self.misses += 1
+
+        payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        if self.max_entries > 0:
+            with self._lock:
+                self._entries[token] = (payload, payload.get("exp"))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+    def authenticate(self, token: str) -> AuthContext:
+        """Verify a token and capture the result instead of raising"""
+        try:
+            return AuthContext(token, payload=self.decode(token))
+        except jwt.PyJWTError as e:
+            return AuthContext(token, error=e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def bearer_token(request: Request) -> Optional[str]:
+    """Extract the bearer token from the Authorization header"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token
+
+
+def get_auth_context(request: Request, verifier: TokenVerifier, token: str = None) -> Optional[AuthContext]:
+    """Return the request's auth context, verifying the token on first use"""
+    token = token or bearer_token(request)
+    if token is None:
+        return None
+    auth = getattr(request.state, "auth", None)
+    if auth is None or auth.token != token:
+        auth = verifier.authenticate(token)
+        request.state.auth = auth
+    return auth
@@ -0,0 +1,149 @@
+"""
+Authenticated User Cache for KMED Backend
+Bounded TTL/LRU cache of user snapshots keyed by username
+
+Entries are dropped when a transaction that updated or deleted a User row
+through the ORM in this process commits (role change, deactivation, login).
+Other workers pick the change up when their entry expires after
+USER_CACHE_TTL seconds.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from database import User
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Read-only copy of the User columns the endpoints use"""
+    id: str
+    username: str
+    email: str
+    role: str
+    name: str
+    is_active: bool
+    last_login: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            name=user.name,
+            is_active=user.is_active,
+            last_login=user.last_login
+        )
+
+
+class UserCache:
+    """Per-worker user snapshots with expiry and an entry cap"""
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_entries: int = USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, username: str) -> Optional[CachedUser]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user: User) -> CachedUser:
+        """Store a snapshot of ``user`` and return it"""
+        snapshot = CachedUser.from_user(user)
+        if not self.enabled:
+            return snapshot
+        with self._lock:
+            self._entries[snapshot.username] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(snapshot.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, username: str):
+        with self._lock:
+            if self._entries.pop(username, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+user_cache = UserCache()
+
+
+_PENDING_KEY = "dirty_usernames"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def collect_changed_user(mapper, connection, target):
+    """Remember a changed user row until its transaction commits
+
+    Invalidating at flush time would let another request re-cache the old
+    row before the change is committed.
+    """
+    session = object_session(target)
+    if session is None:
+        user_cache.invalidate(target.username)
+        return
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    pending.add(target.username)
+    # A renamed user must not stay cached under the old name
+    history = inspect(target).attrs.username.history
+    pending.update(history.deleted or ())
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_users(session):
+    for username in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate(username)
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_changed_users(session):
+    session.info.pop(_PENDING_KEY, None)